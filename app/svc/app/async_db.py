@@ -0,0 +1,142 @@
+"""Awaitable database access for the API event loop
+
+sqlite3 calls block, and a blocked event loop stalls every connection, so
+the API never queries SQLite from the loop thread. Reads run on a small
+thread pool, each thread with its own connection. Writes go through one
+writer thread, which commits whatever writes queued up meanwhile in a
+single transaction: under write pressure many requests share one lock
+acquisition and one commit instead of contending for the lock one by one.
+"""
+import asyncio
+import functools
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from . import config
+from .models import DBManager
+from .utils.metrics import DB_WRITE_BATCH_SIZE
+
+# DBManager methods that write; everything else is a read
+WRITE_METHODS = frozenset({
+    "insert_template", "insert_source", "insert_sources", "insert_plan", "update_plan_slide",
+    "insert_job", "add_job_event", "claim_job", "heartbeat_job", "complete_job", "fail_job",
+    "update_job", "set_job_artifact_digest", "delete_template", "delete_source",
+})
+
+# Queued write: function, arguments, and the future for its result
+_Write = Tuple[Callable[..., Any], tuple, dict, Future]
+
+
+class AsyncDBManager:
+    """DBManager with awaitable methods that never block the event loop.
+
+    Calls take the same arguments as DBManager's. A write resolves once it
+    is committed, so a read awaited after it sees its result.
+    """
+
+    def __init__(self, db: DBManager = None, read_threads: int = None, write_batch: int = None):
+        self.db = db or DBManager()
+        self.write_batch = write_batch or config.DB_WRITE_BATCH
+        self.read_threads = read_threads or config.DB_READ_THREADS
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._writes: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        method = getattr(self.db, name)
+        if not callable(method):
+            raise AttributeError(name)
+        run = self.write if name in WRITE_METHODS else self.read
+        return functools.partial(run, method)
+
+    async def read(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn on a reader thread"""
+        if self._readers is None:
+            self._readers = ThreadPoolExecutor(self.read_threads, thread_name_prefix="db-read")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(fn, *args, **kwargs))
+
+    async def write(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Queue fn for the writer thread and wait until it is committed"""
+        self._start_writer()
+        future: Future = Future()
+        self._writes.put((fn, args, kwargs, future))
+        return await asyncio.wrap_future(future)
+
+    def close(self) -> None:
+        """Finish queued writes and stop the threads; they restart on the next call"""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writes.put(None)
+                self._writer.join()
+                self._writer = None
+        if self._readers is not None:
+            self._readers.shutdown(wait=True)
+            self._readers = None
+
+    def _start_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="db-writer", daemon=True)
+                self._writer.start()
+
+    def _run_writer(self) -> None:
+        while True:
+            first = self._writes.get()
+            if first is None:
+                return
+            batch = [first]
+            stop = False
+            while len(batch) < self.write_batch:
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch: List[_Write]) -> None:
+        """Run a batch of writes in one transaction, each under its own savepoint
+
+        A write that raises is rolled back to its savepoint and fails alone;
+        the rest of the batch still commits.
+        """
+        # Writes whose caller was cancelled while queued are skipped
+        batch = [write for write in batch if write[3].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = []
+        try:
+            with self.db.transaction() as conn:
+                for fn, args, kwargs, future in batch:
+                    conn.execute("SAVEPOINT write")
+                    try:
+                        result = fn(*args, **kwargs)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write")
+                        conn.execute("RELEASE write")
+                        results.append((future, None, e))
+                        continue
+                    conn.execute("RELEASE write")
+                    results.append((future, result, None))
+        except Exception as e:
+            # The transaction could not start or commit: nothing was written
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+        DB_WRITE_BATCH_SIZE.observe(len(batch))
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
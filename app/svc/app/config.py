@@ -0,0 +1,116 @@
+"""Service configuration read from environment variables"""
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting, falling back to the default when unset or invalid"""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+# SQLite: how long a connection waits for another process's write lock, and
+# how many times a statement is retried when the wait still times out
+DB_BUSY_TIMEOUT_MS = max(0, _env_int("DB_BUSY_TIMEOUT_MS", 5000))
+DB_RETRY_ATTEMPTS = max(1, _env_int("DB_RETRY_ATTEMPTS", 5))
+
+# SQLite connection tuning: memory-mapped I/O size and prepared statements
+# kept per connection
+DB_MMAP_MB = max(0, _env_int("DB_MMAP_MB", 256))
+DB_CACHED_STATEMENTS = max(0, _env_int("DB_CACHED_STATEMENTS", 256))
+
+# Decoded template and source records cached per process: entries and size
+# of each cache
+DB_CACHE_ENTRIES = max(0, _env_int("DB_CACHE_ENTRIES", 256))
+DB_CACHE_MB = max(0, _env_int("DB_CACHE_MB", 64))
+
+# API database access off the event loop: reader threads, and the most queued
+# writes the writer thread commits in one transaction
+DB_READ_THREADS = max(1, _env_int("DB_READ_THREADS", 4))
+DB_WRITE_BATCH = max(1, _env_int("DB_WRITE_BATCH", 64))
+
+# How often the API samples event-loop lag
+LOOP_LAG_INTERVAL_MS = max(10, _env_int("LOOP_LAG_INTERVAL_MS", 250))
+
+# Parse pool: number of worker processes and max parses in flight per API process
+PARSE_WORKERS = max(1, _env_int("PARSE_WORKERS", os.cpu_count() or 1))
+PARSE_MAX_CONCURRENCY = max(1, _env_int("PARSE_MAX_CONCURRENCY", PARSE_WORKERS))
+PARSE_MP_CONTEXT = os.environ.get("PARSE_MP_CONTEXT", "spawn")
+
+# PDFs longer than PDF_PARSE_CHUNK_PAGES are split into ranges of that many
+# pages, up to PDF_PARSE_WORKERS of which are analyzed at once by parse pool
+# workers. Ranges count against PARSE_MAX_CONCURRENCY like whole documents;
+# the default leaves each PDF its share of the cores, so 1 (sequential)
+# unless PARSE_MAX_CONCURRENCY is below the core count
+PDF_PARSE_WORKERS = max(1, _env_int("PDF_PARSE_WORKERS", (os.cpu_count() or 1) // PARSE_MAX_CONCURRENCY))
+PDF_PARSE_CHUNK_PAGES = max(1, _env_int("PDF_PARSE_CHUNK_PAGES", 100))
+
+# Admission control: ingest requests processed at once, bytes they may hold,
+# and queued jobs; past these limits requests are rejected with Retry-After
+INGEST_MAX_INFLIGHT = max(1, _env_int("INGEST_MAX_INFLIGHT", PARSE_MAX_CONCURRENCY * 2))
+INGEST_MAX_MB = max(1, _env_int("INGEST_MAX_MB", 512))
+JOB_MAX_QUEUED = max(1, _env_int("JOB_MAX_QUEUED", 500))
+
+# Job queue: lease length, retry limit and polling interval for workers
+JOB_LEASE_SECONDS = max(5, _env_int("JOB_LEASE_SECONDS", 60))
+JOB_MAX_ATTEMPTS = max(1, _env_int("JOB_MAX_ATTEMPTS", 3))
+JOB_POLL_INTERVAL_MS = max(50, _env_int("JOB_POLL_INTERVAL_MS", 500))
+
+# Worker threads started inside the API process (0 when running app.worker separately)
+EMBEDDED_WORKERS = max(0, _env_int("EMBEDDED_WORKERS", 1))
+
+# Job events: how often streams re-check the database for events written by
+# other processes, and the minimum gap between stored progress events
+JOB_EVENTS_POLL_MS = max(50, _env_int("JOB_EVENTS_POLL_MS", 1000))
+JOB_PROGRESS_INTERVAL_MS = max(0, _env_int("JOB_PROGRESS_INTERVAL_MS", 250))
+
+# Batch source ingest: maximum documents per request (after expanding archives)
+BATCH_MAX_FILES = max(1, _env_int("BATCH_MAX_FILES", 500))
+
+# Bulk export: maximum job outputs per zip
+EXPORT_MAX_JOBS = max(1, _env_int("EXPORT_MAX_JOBS", 1000))
+
+# Admin token for privileged request options such as profiling (disabled when unset)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN") or None
+
+# Sampling interval of the opt-in profiler
+PROFILE_INTERVAL_MS = max(1, _env_int("PROFILE_INTERVAL_MS", 5))
+
+# Retention: hours after creation when finished jobs, plans, sources and
+# templates are deleted (0, the default, keeps them forever; retention is
+# opt-in). Plans with jobs, sources with plans and templates with sources or
+# plans are kept until those are gone.
+RETENTION_JOB_HOURS = max(0, _env_int("RETENTION_JOB_HOURS", 0))
+RETENTION_PLAN_HOURS = max(0, _env_int("RETENTION_PLAN_HOURS", 0))
+RETENTION_SOURCE_HOURS = max(0, _env_int("RETENTION_SOURCE_HOURS", 0))
+RETENTION_TEMPLATE_HOURS = max(0, _env_int("RETENTION_TEMPLATE_HOURS", 0))
+
+# Retention sweeper: seconds between sweeps (0 disables it), rows deleted per
+# transaction, and database pages returned to the filesystem per sweep
+RETENTION_SWEEP_SECONDS = max(0, _env_int("RETENTION_SWEEP_SECONDS", 300))
+RETENTION_BATCH = max(1, _env_int("RETENTION_BATCH", 200))
+RETENTION_VACUUM_PAGES = max(0, _env_int("RETENTION_VACUUM_PAGES", 2048))
+
+# Storage backend: "local" keeps files under data/; "s3" stores them in an
+# S3-compatible bucket (requires boto3; credentials come from the usual AWS
+# environment variables) and keeps data/ as a local cache of S3_CACHE_MB.
+# Downloads are redirected to presigned URLs valid for S3_URL_SECONDS.
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local").lower()
+S3_BUCKET = os.environ.get("S3_BUCKET") or None
+S3_PREFIX = os.environ.get("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") or None
+S3_REGION = os.environ.get("S3_REGION") or None
+S3_PART_MB = max(5, _env_int("S3_PART_MB", 16))
+S3_CACHE_MB = max(0, _env_int("S3_CACHE_MB", 2048))
+S3_URL_SECONDS = max(1, _env_int("S3_URL_SECONDS", 900))
+
+# Plans live in the database. Set PLAN_EXPORT=1 to also write each plan as
+# JSON under data/plans (for external tools and backups); writes happen in
+# the background, PLAN_EXPORT_DELAY_MS after a change, so a burst of swaps
+# produces one write
+PLAN_EXPORT = _env_int("PLAN_EXPORT", 0) > 0
+PLAN_EXPORT_DELAY_MS = max(0, _env_int("PLAN_EXPORT_DELAY_MS", 2000))
@@ -0,0 +1,103 @@
+"""Job event streaming for Server-Sent Events and WebSocket clients"""
+import asyncio
+import json
+import threading
+from typing import AsyncIterator, Dict, List, Set, Tuple
+
+from . import config
+from .async_db import AsyncDBManager
+
+# Events after which a job's stream ends
+TERMINAL_EVENTS = {"done", "error"}
+
+
+class JobEventBus:
+    """Wake event streams in this process as soon as a job gets new events.
+
+    Events are stored in the job_events table, so streams also pick up
+    events written by workers in other processes; those are found by
+    re-reading the table every JOB_EVENTS_POLL_MS instead of on notify.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def notify(self, job_id: str) -> None:
+        """Signal new events for job_id (safe to call from any thread)"""
+        with self._lock:
+            waiters = list(self._waiters.get(job_id, ()))
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def subscribe(self, job_id: str) -> Tuple[asyncio.AbstractEventLoop, asyncio.Event]:
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(job_id, set()).add(waiter)
+        return waiter
+
+    def unsubscribe(self, job_id: str, waiter: Tuple[asyncio.AbstractEventLoop, asyncio.Event]) -> None:
+        with self._lock:
+            waiters = self._waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[job_id]
+
+
+job_event_bus = JobEventBus()
+
+
+async def stream_job_events(db: AsyncDBManager, job_id: str, after_id: int = 0,
+                            poll_interval: float = None) -> AsyncIterator[Dict]:
+    """Yield a job's events after after_id until it reaches a final state.
+
+    Yields None when nothing happened for a while, so callers can send
+    keepalives.
+    """
+    poll_interval = poll_interval or config.JOB_EVENTS_POLL_MS / 1000
+    waiter = job_event_bus.subscribe(job_id)
+    try:
+        while True:
+            waiter[1].clear()
+            events = await db.get_job_events(job_id, after_id)
+            for event in events:
+                after_id = event["id"]
+                yield event
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+
+            if events:
+                continue
+
+            if after_id == 0:
+                # Jobs finished before events were recorded have no terminal
+                # event; report their final state from the jobs row instead
+                job = await db.get_job(job_id)
+                if job is None:
+                    return
+                if job["status"] in TERMINAL_EVENTS:
+                    yield {"id": 0, "event": job["status"], "data": {
+                        "status": job["status"],
+                        "artifact_url": job["artifact_url"],
+                        "report": job["report"],
+                        "error": job["error"]
+                    }}
+                    return
+
+            try:
+                await asyncio.wait_for(waiter[1].wait(), poll_interval)
+            except asyncio.TimeoutError:
+                yield None
+    finally:
+        job_event_bus.unsubscribe(job_id, waiter)
+
+
+def format_sse(event: Dict) -> str:
+    """Format an event as a Server-Sent Events message"""
+    lines: List[str] = []
+    if event["id"]:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'])}")
+    return "\n".join(lines) + "\n\n"
@@ -1,21 +1,42 @@
 """Main FastAPI application"""
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import Depends, FastAPI, Query, Request, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from typing import Optional
-import os
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from typing import Dict, List, Literal, Optional, Set, Tuple
+import base64
+import hmac
+import json
+import time
 import asyncio
+import tarfile
+import uuid
+import zipfile
 from pathlib import Path
 
 from .models import DBManager
+from .async_db import AsyncDBManager
+from .plan_export import PlanExporter
 from .schemas import (
     TemplateIngestResponse, SourceIngestResponse, 
-    PlanResponse, PlanRequest, SwapRequest,
-    ExecuteResponse, JobStatus
+    PlanResponse, PlanSlidesResponse, PlanRequest, SwapRequest,
+    ExecuteResponse, JobStatus, ExportRequest,
+    TemplateList, SourceList, PlanList, JobList
 )
-from .parsers import TemplateParser, PPTXParser, PDFParser
-from .transformers import TransformationPlanner, TransformationExecutor
-from .utils import StorageManager, validate_file_type
+from .parsers import ParsePool, parse_template
+from .transformers import TransformationPlanner
+from .worker import start_embedded_workers
+from .events import stream_job_events, format_sse
+from . import config
+from .utils import (
+    StorageManager, validate_file_type,
+    SpooledUpload, UploadError, UploadReceiver, receive_upload,
+    file_digest, file_download, immutable_file, stream_zip
+)
+from .utils.uploads import UPLOAD_OPENAPI, BATCH_UPLOAD_OPENAPI, expand_archive
+from .utils.metrics import PLAN_SECONDS, REQUESTS_REJECTED, LoopLagMonitor, render_metrics
+from .utils.admission import AdmissionController, Overloaded, retry_after_seconds
+from .utils.profiling import get_profile_path, profiled, valid_profile_id
+from .utils.pagination import decode_cursor, encode_cursor
 
 # Initialize app
 app = FastAPI(title="PPTX Restyler API", version="1.0.0")
@@ -31,17 +52,171 @@ app.add_middleware(
 )
 
 # Initialize database and storage
-db = DBManager()
+db = AsyncDBManager(DBManager())
 StorageManager.ensure_directories()
 
+# Optional write-behind export of plans as JSON files (PLAN_EXPORT)
+plan_exporter = PlanExporter(db.db) if config.PLAN_EXPORT else None
+
+# Parsing is CPU-bound, so it runs in worker processes instead of the event loop
+parse_pool = ParsePool()
+
 # File size limit (50MB)
 MAX_FILE_SIZE = 50 * 1024 * 1024
 
+UNSUPPORTED_SOURCE_TYPE = "Invalid file type. Expected PPTX or PDF"
+
+# Caps ingest requests in progress (receiving and parsing) and the bytes they hold
+ingest_admission = AdmissionController(config.INGEST_MAX_INFLIGHT, config.INGEST_MAX_MB * 1024 * 1024)
+
+PPTX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+# Idle time after which SSE streams send a comment to keep proxies from closing them
+SSE_KEEPALIVE_SECONDS = 15
+
+# Set when embedded job workers run inside this process
+embedded_workers_stop = None
+
+# Blocking calls on the event loop delay every request; this measures by how much
+loop_lag = LoopLagMonitor(config.LOOP_LAG_INTERVAL_MS / 1000)
+loop_lag_task = None
+
+@app.on_event("startup")
+def start_job_workers():
+    """Start in-process job workers (set EMBEDDED_WORKERS=0 when running app.worker)"""
+    global embedded_workers_stop
+    embedded_workers_stop = start_embedded_workers(config.EMBEDDED_WORKERS, db.db)
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    """Sample event-loop lag for /metrics and /stats/parse"""
+    global loop_lag_task
+    loop_lag_task = asyncio.create_task(loop_lag.run())
+
+@app.on_event("shutdown")
+def shutdown_parse_pool():
+    """Stop parse worker processes, embedded job workers and database threads"""
+    parse_pool.shutdown()
+    if embedded_workers_stop is not None:
+        embedded_workers_stop.set()
+    if loop_lag_task is not None:
+        loop_lag_task.cancel()
+    if plan_exporter is not None:
+        plan_exporter.close()
+    db.close()
+
+async def spool_upload(request: Request, kind: str) -> SpooledUpload:
+    """Stream the request's file upload into the `kind` storage directory"""
+    try:
+        return await receive_upload(
+            request, lambda: StorageManager.new_spool_path(kind), MAX_FILE_SIZE
+        )
+    except UploadError as e:
+        raise HTTPException(400, str(e))
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    route = request.scope.get("route")
+    REQUESTS_REJECTED.labels(endpoint=route.path if route else request.url.path).inc()
+    return JSONResponse(
+        {"detail": exc.detail}, status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+async def ingest_slot(request: Request):
+    """Admit an ingest request, holding its slot until the response is sent
+    
+    Bytes are reserved from Content-Length before the body is read; without
+    one the per-file limit is assumed.
+    """
+    length = request.headers.get("content-length", "")
+    nbytes = int(length) if length.isdigit() else MAX_FILE_SIZE
+    with ingest_admission.admit(nbytes):
+        yield
+
+async def admit_job() -> None:
+    """Reject new jobs while the queue is full, estimating when it will have room"""
+    depth = await db.count_queued_jobs()
+    if depth < config.JOB_MAX_QUEUED:
+        return
+    stats = await db.queue_stats()
+    drain_rate = stats["completed_in_window"] / stats["window_seconds"]
+    raise Overloaded(
+        429, "Job queue is full, retry later",
+        retry_after_seconds(depth - config.JOB_MAX_QUEUED + 1, drain_rate,
+                            fallback=stats["avg_run_seconds"] or 30, maximum=600)
+    )
+
+def require_admin(request: Request) -> None:
+    """Reject callers without the configured X-Admin-Token"""
+    token = request.headers.get("x-admin-token", "")
+    if not config.ADMIN_TOKEN or not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+        raise HTTPException(403, "Admin token required")
+
+def profile_requested(request: Request) -> bool:
+    """Whether the caller asked to profile this request or job (?profile=1 or X-Profile: 1)"""
+    flag = request.query_params.get("profile") or request.headers.get("x-profile")
+    if not flag or flag.lower() in ("0", "false", "no"):
+        return False
+    require_admin(request)
+    return True
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"status": "healthy", "service": "PPTX Restyler API"}
 
+@app.get("/stats/parse")
+async def get_parse_stats():
+    """Parse pool queue-time and run-time statistics, ingest admission state and event-loop lag"""
+    return {**parse_pool.stats(), "admission": ingest_admission.stats(), "event_loop": loop_lag.stats()}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: stage latency histograms, page counts, jobs by status"""
+    body, content_type = await asyncio.to_thread(render_metrics, db.db.count_jobs_by_status)
+    return Response(body, media_type=content_type)
+
+@app.get("/stats/queue")
+async def get_queue_stats():
+    """Job queue depth, wait times and throughput"""
+    return await db.queue_stats()
+
+def listing(page: Tuple[List[Dict], Optional[Tuple[str, str]]]) -> Dict:
+    """Listing response for a page from DBManager.list_*"""
+    items, next_key = page
+    return {"items": items, "next_cursor": encode_cursor(next_key)}
+
+def cursor_key(cursor: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """Dependency: decode the ?cursor= of a listing request"""
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+@app.get("/templates", response_model=TemplateList)
+async def list_templates(after=Depends(cursor_key), limit: int = Query(50, ge=1, le=500)):
+    """List templates, newest first; pass next_cursor as ?cursor= for the next page"""
+    return listing(await db.list_templates(after, limit))
+
+@app.get("/sources", response_model=SourceList)
+async def list_sources(template_id: Optional[str] = None, after=Depends(cursor_key),
+                       limit: int = Query(50, ge=1, le=500)):
+    """List sources, newest first, optionally for one template"""
+    return listing(await db.list_sources(template_id, after, limit))
+
+@app.get("/plans", response_model=PlanList)
+async def list_plans(source_id: Optional[str] = None, after=Depends(cursor_key),
+                     limit: int = Query(50, ge=1, le=500)):
+    """List plans, newest first, optionally for one source"""
+    return listing(await db.list_plans(source_id, after, limit))
+
+@app.get("/jobs", response_model=JobList)
+async def list_jobs(status: Optional[Literal["queued", "running", "done", "error"]] = None,
+                    after=Depends(cursor_key), limit: int = Query(50, ge=1, le=500)):
+    """List jobs, newest first, optionally with one status"""
+    return listing(await db.list_jobs(status, after, limit))
+
 @app.get("/fixtures/{filename}")
 async def get_fixture(filename: str):
     """Serve fixture files for testing"""
@@ -58,49 +233,57 @@ async def get_fixture(filename: str):
         raise HTTPException(404, f"Fixture not found. Available: {list(fixtures_map.keys())}")
     
     file_path = fixtures_map[filename]
-    if not file_path.exists():
+    if not await asyncio.to_thread(file_path.exists):
         raise HTTPException(404, f"Fixture file not found: {filename}")
     
     return FileResponse(str(file_path), filename=filename)
 
-@app.post("/templates/ingest", response_model=TemplateIngestResponse)
-async def ingest_template(file: UploadFile = File(...)):
+@app.post("/templates/ingest", response_model=TemplateIngestResponse,
+          openapi_extra=UPLOAD_OPENAPI,
+          dependencies=[Depends(ingest_slot)])
+async def ingest_template(request: Request, response: Response):
     """Ingest a template PPTX file"""
+    profile_id = str(uuid.uuid4()) if profile_requested(request) else None
     try:
-        # Validate file size
-        content = await file.read()
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(400, f"File too large. Maximum size is 50MB")
+        # Stream to a spool file; size is checked and hashed chunk by chunk
+        upload = await spool_upload(request, "templates")
         
-        # Validate file type
-        is_valid, file_type = validate_file_type(content, ["pptx"])
-        if not is_valid:
-            raise HTTPException(400, f"Invalid file type. Expected PPTX, got {file_type}")
-        
-        # Save file temporarily for parsing
-        temp_path = Path("temp_template.pptx")
-        temp_path.write_bytes(content)
+        # Identical bytes were ingested before: return the stored parse result
+        # (unless profiling, which needs a real parse)
+        cached = None if profile_id else await db.find_template_by_hash(upload.sha256)
+        if cached and await asyncio.to_thread(StorageManager.template_exists, cached["id"]):
+            await asyncio.to_thread(upload.discard)
+            return {
+                "template_id": cached["id"],
+                "theme_meta": cached["theme_meta"],
+                "layout_catalog": cached["layout_catalog"]
+            }
         
         try:
-            parser = TemplateParser(temp_path)
-            result = parser.parse()
+            # Validate file type
+            is_valid, file_type = await asyncio.to_thread(validate_file_type, upload.path, ["pptx"])
+            if not is_valid:
+                raise HTTPException(400, f"Invalid file type. Expected PPTX, got {file_type}")
+            
+            result = await parse_pool.run(parse_template, str(upload.path), profile_id=profile_id)
+            if profile_id:
+                response.headers["X-Profile-Url"] = f"/profiles/{profile_id}"
             
             # Save to storage
             template_id = result["template_id"]
-            StorageManager.save_template(content, template_id)
-            
-            # Save to database
-            db.insert_template(
-                template_id,
-                result["theme_meta"],
-                result["layout_catalog"]
-            )
-            
-            return result
+            await asyncio.to_thread(StorageManager.commit_template, upload.path, template_id)
         finally:
-            # Clean up temp file
-            if temp_path.exists():
-                temp_path.unlink()
+            await asyncio.to_thread(upload.discard)
+        
+        # Save to database
+        await db.insert_template(
+            template_id,
+            result["theme_meta"],
+            result["layout_catalog"],
+            content_hash=upload.sha256
+        )
+        
+        return result
     except HTTPException:
         raise
     except Exception as e:
@@ -109,166 +292,450 @@ async def ingest_template(file: UploadFile = File(...)):
         traceback.print_exc()
         raise HTTPException(500, f"Internal error: {str(e)}")
 
-@app.post("/sources/ingest", response_model=SourceIngestResponse)
+@app.post("/sources/ingest", response_model=SourceIngestResponse,
+          openapi_extra=UPLOAD_OPENAPI,
+          dependencies=[Depends(ingest_slot)])
 async def ingest_source(
-    file: UploadFile = File(...),
+    request: Request,
+    response: Response,
     template_id: str = None
 ):
     """Ingest a source document (PPTX or PDF)"""
     if not template_id:
         raise HTTPException(400, "template_id is required")
+    profile_id = str(uuid.uuid4()) if profile_requested(request) else None
     
     # Check template exists
-    template = db.get_template(template_id)
+    template = await db.get_template(template_id)
     if not template:
         raise HTTPException(404, f"Template {template_id} not found")
     
-    # Validate file size
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(400, f"File too large. Maximum size is 50MB")
+    # Stream to a spool file; size is checked and hashed chunk by chunk
+    upload = await spool_upload(request, "sources")
     
-    # Validate file type
-    is_valid, file_type = validate_file_type(content, ["pptx", "pdf"])
-    if not is_valid:
-        raise HTTPException(400, f"Invalid file type. Expected PPTX or PDF")
+    result, row = await prepare_source(upload, template_id, profile_id)
+    if profile_id:
+        response.headers["X-Profile-Url"] = f"/profiles/{profile_id}"
     
-    # Save file temporarily for parsing
-    ext = "pptx" if "pptx" in file_type or "presentation" in file_type else "pdf"
-    temp_path = Path(f"temp_source.{ext}")
-    temp_path.write_bytes(content)
+    # Save to database
+    if row:
+        await db.insert_source(**row)
+    
+    return result
+
+async def prepare_source(upload: SpooledUpload, template_id: str,
+                         profile_id: str = None) -> Tuple[Dict, Optional[Dict]]:
+    """Parse a spooled source upload, or reuse an identical earlier one.
+    
+    Stores the file and returns the ingest response together with the
+    insert_source arguments for its database row, or None when an existing
+    source is returned as-is. Raises HTTPException for invalid files.
+    With profile_id the document is always parsed, under the profiler.
+    """
+    # Identical bytes were ingested before: reuse the stored parse result
+    cached = None if profile_id else await db.find_source_by_hash(upload.sha256, template_id)
+    if cached and cached["template_id"] == template_id:
+        # A source whose stored file is gone is parsed again
+        if await asyncio.to_thread(StorageManager.source_exists, cached["id"], cached["type"]):
+            await asyncio.to_thread(upload.discard)
+            return {"source_id": cached["id"], "type": cached["type"], "pages": cached["pages"]}, None
+    elif cached:
+        # Sources belong to one template, so mint a new ID sharing the stored file
+        source_id = str(uuid.uuid4())
+        if await asyncio.to_thread(StorageManager.link_source, cached["id"], source_id, cached["type"]):
+            await asyncio.to_thread(upload.discard)
+            result = {"source_id": source_id, "type": cached["type"], "pages": cached["pages"]}
+            return result, {
+                "source_id": source_id,
+                "template_id": template_id,
+                "doc_type": cached["type"],
+                "pages": cached["pages"],
+                "content_hash": upload.sha256
+            }
     
     try:
-        # Parse based on type
-        if ext == "pptx":
-            parser = PPTXParser(temp_path, template_id)
-        else:
-            parser = PDFParser(temp_path, template_id, enable_ocr=False)
+        # Validate file type
+        is_valid, file_type = await asyncio.to_thread(validate_file_type, upload.path, ["pptx", "pdf"])
+        if not is_valid:
+            raise HTTPException(400, UNSUPPORTED_SOURCE_TYPE)
         
-        result = parser.parse()
+        ext = file_type
+        result = await parse_pool.run_source(str(upload.path), template_id, ext, profile_id=profile_id)
         
         # Save to storage
-        source_id = result["source_id"]
-        StorageManager.save_source(content, source_id, ext)
+        await asyncio.to_thread(StorageManager.commit_source, upload.path, result["source_id"], ext)
+    finally:
+        await asyncio.to_thread(upload.discard)
+    
+    return result, {
+        "source_id": result["source_id"],
+        "template_id": template_id,
+        "doc_type": result["type"],
+        "pages": result["pages"],
+        "content_hash": upload.sha256
+    }
+
+@app.post("/sources/ingest:batch", openapi_extra=BATCH_UPLOAD_OPENAPI,
+          dependencies=[Depends(ingest_slot)])
+async def ingest_source_batch(
+    request: Request,
+    template_id: str = None
+):
+    """Ingest many source documents, or zip/tar archives of them, for one template
+    
+    Files are parsed concurrently in the parse pool. The response is NDJSON:
+    one line per file as soon as it is parsed, then a summary line once all
+    new sources are inserted in a single transaction. Source IDs are usable
+    after the summary line arrives.
+    """
+    if not template_id:
+        raise HTTPException(400, "template_id is required")
+    
+    # Check template exists (once for the whole batch)
+    template = await db.get_template(template_id)
+    if not template:
+        raise HTTPException(404, f"Template {template_id} not found")
+    
+    def new_spool_path():
+        return StorageManager.new_spool_path("sources")
+    
+    try:
+        uploads = await UploadReceiver(
+            request, new_spool_path, MAX_FILE_SIZE, config.BATCH_MAX_FILES
+        ).receive()
+    except UploadError as e:
+        raise HTTPException(400, str(e))
+    
+    def discard_all(spooled: List[SpooledUpload]):
+        for upload in spooled:
+            upload.discard()
+    
+    # Replace archives by the documents inside them
+    documents: List[SpooledUpload] = []
+    # Archive members that are not PPTX or PDF, reported as failed
+    skipped: List[str] = []
+    try:
+        for upload in uploads:
+            remaining = config.BATCH_MAX_FILES - len(documents)
+            expanded = await asyncio.to_thread(
+                expand_archive, upload, new_spool_path, MAX_FILE_SIZE, remaining
+            )
+            if expanded is None:
+                documents.append(upload)
+            else:
+                await asyncio.to_thread(upload.discard)
+                documents.extend(expanded[0])
+                skipped.extend(expanded[1])
+        if len(documents) > config.BATCH_MAX_FILES:
+            raise UploadError(f"Too many files. Maximum is {config.BATCH_MAX_FILES}")
+    except (UploadError, zipfile.BadZipFile, tarfile.TarError) as e:
+        await asyncio.to_thread(discard_all, uploads + documents)
+        raise HTTPException(400, f"Invalid batch: {e}")
+    
+    # Identical files in one batch are parsed once
+    groups: Dict[str, List[SpooledUpload]] = {}
+    for upload in documents:
+        groups.setdefault(upload.sha256, []).append(upload)
+    # Hashes of groups whose spool files ingest_group has taken over
+    claimed: Set[str] = set()
+    # Rows of the new sources stored so far, whether or not reported yet
+    rows: List[Dict] = []
+    
+    async def ingest_group(group: List[SpooledUpload]):
+        claimed.add(group[0].sha256)
+        await asyncio.to_thread(discard_all, group[1:])
+        try:
+            result, row = await prepare_source(group[0], template_id)
+            if row:
+                rows.append(row)
+            return group, result, None
+        except HTTPException as e:
+            return group, None, e.detail
+        except Exception as e:
+            return group, None, f"Internal error: {str(e)}"
+    
+    async def clean_up(tasks: List[asyncio.Future], committed: bool):
+        for task in tasks:
+            task.cancel()
+        # Let cancelled groups settle, so every stored source is in rows
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Groups whose task never started still have their spool files
+        unclaimed = [
+            upload for sha256, group in groups.items() if sha256 not in claimed
+            for upload in group
+        ]
         
-        # Save to database
-        db.insert_source(
-            source_id,
-            template_id,
-            result["type"],
-            result["pages"]
-        )
+        def remove_files():
+            discard_all(unclaimed)
+            if not committed:
+                # Client went away or the insert failed: drop the stored files
+                for row in rows:
+                    StorageManager.delete_source(row["source_id"])
         
-        return result
-    finally:
-        # Clean up temp file
-        if temp_path.exists():
-            temp_path.unlink()
+        await asyncio.to_thread(remove_files)
+    
+    async def results():
+        tasks = [asyncio.ensure_future(ingest_group(group)) for group in groups.values()]
+        committed = False
+        ingested = failed = 0
+        try:
+            for filename in skipped:
+                failed += 1
+                yield json.dumps({"filename": filename, "error": UNSUPPORTED_SOURCE_TYPE}) + "\n"
+            for next_done in asyncio.as_completed(tasks):
+                group, result, error = await next_done
+                for upload in group:
+                    if error is None:
+                        ingested += 1
+                        yield json.dumps({"filename": upload.filename, **result}) + "\n"
+                    else:
+                        failed += 1
+                        yield json.dumps({"filename": upload.filename, "error": error}) + "\n"
+            
+            # One transaction for the whole batch
+            summary = {"ingested": ingested, "failed": failed}
+            try:
+                await db.insert_sources(rows)
+                committed = True
+            except Exception as e:
+                summary = {"ingested": 0, "failed": ingested + failed, "error": f"Internal error: {str(e)}"}
+            yield json.dumps({"summary": summary}) + "\n"
+        finally:
+            # Shielded so a cancelled response still finishes the cleanup
+            await asyncio.shield(clean_up(tasks, committed))
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def run_planner(template: Dict, source: Dict, profile_id: Optional[str]) -> Dict:
+    """Create a plan; runs in a worker thread, which the profiler then samples"""
+    planner = TransformationPlanner(template, source)
+    with PLAN_SECONDS.time(), profiled(profile_id, config.PROFILE_INTERVAL_MS / 1000):
+        return planner.create_plan()
 
 @app.post("/transform/plan", response_model=PlanResponse)
-async def create_plan(request: PlanRequest):
+async def create_plan(request: PlanRequest, http_request: Request, response: Response):
     """Create transformation plan"""
+    profile_id = str(uuid.uuid4()) if profile_requested(http_request) else None
+    
     # Get template and source from database
-    template = db.get_template(request.template_id)
+    template = await db.get_template(request.template_id)
     if not template:
         raise HTTPException(404, f"Template {request.template_id} not found")
     
-    source = db.get_source(request.source_id)
+    source = await db.get_source(request.source_id)
     if not source:
         raise HTTPException(404, f"Source {request.source_id} not found")
     
-    # Create plan
-    planner = TransformationPlanner(template, source)
-    result = planner.create_plan()
+    # Create plan (CPU-bound, so off the event loop)
+    result = await asyncio.to_thread(run_planner, template, source, profile_id)
+    if profile_id:
+        response.headers["X-Profile-Url"] = f"/profiles/{profile_id}"
     
     # Save to database
-    db.insert_plan(
+    await db.insert_plan(
         result["plan_id"],
         request.template_id,
         request.source_id,
         result["slides"]
     )
     
-    # Save to storage
-    StorageManager.save_plan(result["plan_id"], result)
+    if plan_exporter is not None:
+        plan_exporter.schedule(result["plan_id"])
     
     return result
 
 @app.post("/transform/execute", response_model=ExecuteResponse)
-async def execute_transform(
-    plan_id: str,
-    background_tasks: BackgroundTasks
-):
-    """Execute transformation plan"""
-    # Get plan from database
-    plan = db.get_plan(plan_id)
+async def execute_transform(plan_id: str, request: Request):
+    """Queue a transformation plan for execution by a job worker
+    
+    Admins can pass ?profile=1 to run the job under the sampling profiler;
+    the job report then links to the profile.
+    """
+    profile = profile_requested(request)
+    await admit_job()
+    # Get plan from database, or from an export of a plan whose row is gone
+    plan = await db.get_plan(plan_id) or await asyncio.to_thread(StorageManager.get_plan, plan_id)
     if not plan:
         raise HTTPException(404, f"Plan {plan_id} not found")
     
-    # Create job
-    import uuid
+    # Create job; workers pick it up from the jobs table
     job_id = str(uuid.uuid4())
-    db.insert_job(job_id, plan_id)
-    
-    # Execute in background
-    background_tasks.add_task(execute_job, job_id, plan)
+    await db.insert_job(job_id, plan_id, profile=profile)
     
     return {"job_id": job_id}
 
-async def execute_job(job_id: str, plan: dict):
-    """Background task to execute transformation"""
-    try:
-        print(f"Starting job {job_id}")
-        db.update_job(job_id, "running")
-        
-        # Get paths
-        template_path = StorageManager.get_template_path(plan["template_id"])
-        source_path = StorageManager.get_source_path(plan["source_id"])
-        
-        print(f"Template path: {template_path}")
-        print(f"Source path: {source_path}")
-        
-        if not template_path or not source_path:
-            raise Exception(f"Files not found - Template: {template_path}, Source: {source_path}")
-        
-        # Execute transformation
-        executor = TransformationExecutor(plan, template_path, source_path)
-        result = executor.execute()
-        
-        print(f"Job {job_id} completed successfully")
-        
-        # Update job with results
-        db.update_job(
-            job_id,
-            "done",
-            result["artifact_url"],
-            result["preview_pngs"],
-            result["report"]
-        )
-    except Exception as e:
-        print(f"Job {job_id} failed with error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        db.update_job(job_id, "error")
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request):
+    """Download a profile as collapsed stacks (admin only)
+    
+    Open it in speedscope or pass it to flamegraph.pl for a flamegraph.
+    """
+    require_admin(request)
+    path = await asyncio.to_thread(StorageManager.fetch, get_profile_path(profile_id)) \
+        if valid_profile_id(profile_id) else None
+    if path is None:
+        raise HTTPException(404, f"Profile {profile_id} not found")
+    return FileResponse(str(path), media_type="text/plain", filename=f"{profile_id}.collapsed")
 
 @app.get("/jobs/{job_id}", response_model=JobStatus)
 async def get_job_status(job_id: str):
     """Get job status"""
-    job = db.get_job(job_id)
+    job = await db.get_job(job_id)
     if not job:
         raise HTTPException(404, f"Job {job_id} not found")
     
     return {
         "status": job["status"],
         "artifact_url": job["artifact_url"],
-        "preview_pngs": job["preview_pngs"],
-        "report": job["report"]
+        "preview_pngs": preview_urls(job_id, job["preview_pngs"]),
+        "report": job["report"],
+        "error": job["error"]
     }
 
+def preview_urls(job_id: str, previews: Optional[List[str]]) -> Optional[List[str]]:
+    """Map a job's stored preview hashes to their URLs
+    
+    Jobs completed before previews were stored as files hold data: URIs,
+    which are returned unchanged.
+    """
+    if previews is None:
+        return None
+    return [
+        preview if preview.startswith("data:") else f"/jobs/{job_id}/previews/{n}.png"
+        for n, preview in enumerate(previews)
+    ]
+
+@app.get("/jobs/{job_id}/previews/{n}.png")
+async def get_preview(job_id: str, n: int, request: Request):
+    """Serve a slide preview PNG
+    
+    Previews are stored by content hash, which doubles as the ETag, so
+    clients may cache them for good.
+    """
+    job = await db.get_job(job_id)
+    if not job:
+        raise HTTPException(404, f"Job {job_id} not found")
+    
+    previews = job["preview_pngs"] or []
+    if not 0 <= n < len(previews):
+        raise HTTPException(404, f"Preview {n} not found")
+    
+    preview = previews[n]
+    if preview.startswith("data:"):
+        return Response(base64.b64decode(preview.split(",", 1)[1]), media_type="image/png")
+    
+    path = StorageManager.get_preview_path(job_id, preview)
+    url = await asyncio.to_thread(StorageManager.download_url, path, content_type="image/png")
+    if url:
+        return RedirectResponse(url, status_code=307)
+    if not await asyncio.to_thread(path.exists):
+        raise HTTPException(404, f"Preview {n} not found")
+    return immutable_file(request, path, preview, "image/png")
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, after: int = 0):
+    """Stream job state transitions and progress as Server-Sent Events"""
+    if not await db.get_job(job_id):
+        raise HTTPException(404, f"Job {job_id} not found")
+    
+    # EventSource sends Last-Event-ID when it reconnects
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        after = int(last_event_id)
+    
+    async def event_stream():
+        last_sent = time.monotonic()
+        async for event in stream_job_events(db, job_id, after):
+            if event is not None:
+                yield format_sse(event)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/jobs/{job_id}/ws")
+async def job_events_ws(websocket: WebSocket, job_id: str, after: int = 0):
+    """Stream job events over a WebSocket as JSON messages"""
+    await websocket.accept()
+    if not await db.get_job(job_id):
+        await websocket.close(code=4404, reason=f"Job {job_id} not found")
+        return
+    
+    async def send_events():
+        try:
+            async for event in stream_job_events(db, job_id, after):
+                if event is not None:
+                    await websocket.send_text(json.dumps(event))
+            await websocket.close()
+        except WebSocketDisconnect:
+            pass
+
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    # Sending alone never notices a client that went away while its job is
+    # quiet, so stop streaming as soon as the client disconnects
+    sender = asyncio.create_task(send_events())
+    receiver = asyncio.create_task(wait_for_disconnect())
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        sender.cancel()
+        receiver.cancel()
+    if sender in done:
+        sender.result()
+
+@app.post("/jobs/export")
+async def export_outputs(request: ExportRequest):
+    """Download the outputs of several completed jobs as one zip
+    
+    The archive is streamed as it is written, one file chunk at a time,
+    with members named <job_id>.pptx in request order.
+    """
+    job_ids = list(dict.fromkeys(request.job_ids))
+    if not job_ids:
+        raise HTTPException(400, "job_ids must not be empty")
+    if len(job_ids) > config.EXPORT_MAX_JOBS:
+        raise HTTPException(400, f"Too many jobs. Maximum is {config.EXPORT_MAX_JOBS}")
+    
+    jobs = {job["id"]: job for job in await db.get_jobs(job_ids)}
+    missing = [job_id for job_id in job_ids if job_id not in jobs]
+    if missing:
+        raise HTTPException(404, f"Jobs not found: {', '.join(missing)}")
+    
+    not_done = [job_id for job_id in job_ids if jobs[job_id]["status"] != "done"]
+    if not_done:
+        raise HTTPException(400, f"Jobs not complete: {', '.join(not_done)}")
+    
+    paths = await asyncio.to_thread(lambda: [StorageManager.fetch_job_output(job_id) for job_id in job_ids])
+    entries = list(zip([f"{job_id}.pptx" for job_id in job_ids], paths))
+    absent = [name for name, path in entries if path is None]
+    if absent:
+        raise HTTPException(404, f"Output files not found: {', '.join(absent)}")
+    
+    # A sync generator, so Starlette reads and zips files in its threadpool
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="jobs-export.zip"'}
+    )
+
 @app.get("/jobs/{job_id}/download")
-async def download_output(job_id: str):
-    """Download job output file"""
-    job = db.get_job(job_id)
+async def download_output(job_id: str, request: Request):
+    """Download job output file
+    
+    Supports If-None-Match (304) against the output's content hash and
+    single byte ranges (206), so interrupted downloads can be resumed.
+    With object storage, redirects to a presigned URL instead.
+    """
+    job = await db.get_job(job_id)
     if not job:
         raise HTTPException(404, f"Job {job_id} not found")
     
@@ -276,41 +743,62 @@ async def download_output(job_id: str):
         raise HTTPException(400, f"Job {job_id} is not complete")
     
     output_path = StorageManager.get_job_output_path(job_id)
-    if not output_path.exists():
+    # Object storage serves the file itself, so the download bypasses the API
+    url = await asyncio.to_thread(
+        StorageManager.download_url, output_path, "transformed.pptx", PPTX_MEDIA_TYPE
+    )
+    if url:
+        return RedirectResponse(url, status_code=307)
+    if not await asyncio.to_thread(output_path.exists):
         raise HTTPException(404, f"Output file not found")
     
-    return FileResponse(
-        str(output_path),
-        media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    sha256, size = job["artifact_sha256"], job["artifact_size"]
+    if not sha256:
+        # Jobs completed before hashes were recorded: hash once and keep it
+        sha256, size = await asyncio.to_thread(file_digest, output_path)
+        await db.set_job_artifact_digest(job_id, sha256, size)
+    
+    return file_download(
+        request, output_path, sha256, size,
+        media_type=PPTX_MEDIA_TYPE,
         filename="transformed.pptx"
     )
 
+@app.get("/plans/{plan_id}/slides", response_model=PlanSlidesResponse)
+async def get_plan_slides(plan_id: str, start: int = Query(0, ge=0), end: Optional[int] = Query(None, ge=0)):
+    """Get the plan slides with start <= idx < end without loading the whole plan"""
+    page = await db.get_plan_slides_page(plan_id, start, end)
+    if page is None:
+        raise HTTPException(404, f"Plan {plan_id} not found")
+    
+    return {
+        "plan_id": plan_id,
+        "total": page["total"],
+        "start": start,
+        "slides": page["slides"]
+    }
+
 @app.post("/plans/{plan_id}/swap", response_model=PlanResponse)
 async def swap_layout(plan_id: str, request: SwapRequest):
-    """Swap layout for a specific slide"""
-    # Get plan from database
-    plan = db.get_plan(plan_id)
+    """Swap layout for a specific slide
+    
+    Only that slide's row is written; the response carries the whole plan
+    for clients that re-render it.
+    """
+    # Recalculate score if needed (simplified for now)
+    updated = await db.update_plan_slide(plan_id, request.idx, request.layout_id, 0.75)
+    
+    plan = await db.get_plan(plan_id)
     if not plan:
         raise HTTPException(404, f"Plan {plan_id} not found")
-    
-    # Update the specific slide's layout
-    slides = plan["slides"]
-    if request.idx < len(slides):
-        slides[request.idx]["chosen_layout_id"] = request.layout_id
-        
-        # Recalculate score if needed (simplified for now)
-        slides[request.idx]["score"] = 0.75
-        
-        # Update database
-        db.update_plan_slides(plan_id, slides)
-        
-        # Update storage
-        plan["slides"] = slides
-        StorageManager.save_plan(plan_id, plan)
+    if not updated:
+        raise HTTPException(400, f"Plan {plan_id} has no slide {request.idx}")
+    if plan_exporter is not None:
+        plan_exporter.schedule(plan_id)
     
     return {
         "plan_id": plan_id,
-        "slides": slides
+        "slides": plan["slides"]
     }
 
 if __name__ == "__main__":
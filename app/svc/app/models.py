@@ -2,18 +2,107 @@
 import sqlite3
 import json
 import os
-from typing import Dict, List, Any, Optional
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
+from . import config
+from .utils.cache import LRUCache
+from .utils.metrics import DB_QUERY_SECONDS
+from .utils.page_codec import PAGE_SIZE_ESTIMATE, decode_pages, encode_pages
+
 DB_PATH = Path("data/db.sqlite")
 
+# Bump when _create_schema changes so existing databases are migrated once
+SCHEMA_VERSION = 5
+
+# A page of listed rows and the (created_at, id) key after its last row,
+# or None on the last page
+Page = Tuple[List[Dict], Optional[Tuple[str, str]]]
+
+# Per-thread persistent connections (sqlite3 connections must stay on one thread)
+_local = threading.local()
+
+def connect(isolation_level: Optional[str] = "") -> sqlite3.Connection:
+    """Open a connection that waits for locks instead of failing immediately"""
+    conn = sqlite3.connect(
+        str(DB_PATH), timeout=config.DB_BUSY_TIMEOUT_MS / 1000, isolation_level=isolation_level,
+        cached_statements=config.DB_CACHED_STATEMENTS
+    )
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def thread_connection() -> sqlite3.Connection:
+    """This thread's persistent autocommit connection to DB_PATH
+    
+    Reused across queries to skip connection setup and keep prepared
+    statements cached. Reopened in forked children, which must not use
+    their parent's connections.
+    """
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.connections = {}
+    conn = _local.connections.get(DB_PATH)
+    if conn is None:
+        conn = connect(isolation_level=None)
+        # With WAL, NORMAL skips the fsync per commit but cannot corrupt the
+        # database; a power loss can only drop the latest commits
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={config.DB_MMAP_MB * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        _local.connections[DB_PATH] = conn
+    return conn
+
+def with_retry(fn: Callable[[], Any]) -> Any:
+    """Call fn, retrying with backoff while another process holds the write lock
+    
+    busy_timeout already waits for the lock; this covers waits longer than
+    that under heavy write load.
+    """
+    for attempt in range(config.DB_RETRY_ATTEMPTS):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            message = str(e).lower()
+            if ("locked" not in message and "busy" not in message) or attempt == config.DB_RETRY_ATTEMPTS - 1:
+                raise
+            time.sleep(min(1.0, 0.05 * 2 ** attempt) * random.uniform(0.5, 1.5))
+
 def init_db():
-    """Initialize database with tables"""
+    """Create or migrate the schema, once, even when many processes start together"""
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
-    c = conn.cursor()
-    
+    conn = connect(isolation_level=None)
+    try:
+        # Lets the retention sweeper return freed pages to the filesystem.
+        # Only takes effect on a new database, so it must precede WAL, which
+        # initializes the file; the sweeper converts older databases
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL lets readers proceed while a writer commits; the mode is stored
+        # in the database file, so this only changes it the first time
+        with_retry(lambda: conn.execute("PRAGMA journal_mode=WAL"))
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        
+        # The write lock serializes migrations across processes; those that
+        # waited find the schema already current
+        with_retry(lambda: conn.execute("BEGIN IMMEDIATE"))
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                _create_schema(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+def _create_schema(c: sqlite3.Cursor) -> None:
+    """Create tables, columns and indexes that do not exist yet"""
     # Templates table
     c.execute('''
         CREATE TABLE IF NOT EXISTS templates (
@@ -31,7 +120,7 @@ def init_db():
             template_id TEXT,
             type TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            pages TEXT,
+            pages TEXT,  -- now a blob encoded by utils.page_codec
             FOREIGN KEY (template_id) REFERENCES templates(id)
         )
     ''')
@@ -64,91 +153,578 @@ def init_db():
         )
     ''')
     
-    conn.commit()
-    conn.close()
+    # One row per plan slide, so a layout swap updates a single row and
+    # slide ranges are read without loading the whole plan
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS plan_slides (
+            plan_id TEXT,
+            idx INTEGER,
+            chosen_layout_id TEXT,
+            score REAL,
+            issues TEXT,
+            PRIMARY KEY (plan_id, idx),
+            FOREIGN KEY (plan_id) REFERENCES plans(id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Job state transitions and progress, streamed to clients in id order
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS job_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT,
+            event TEXT,
+            data TEXT,
+            created_at REAL,
+            FOREIGN KEY (job_id) REFERENCES jobs(id)
+        )
+    ''')
+    
+    # Columns added after the initial schema
+    _add_column(c, "templates", "content_hash", "TEXT")
+    _add_column(c, "sources", "content_hash", "TEXT")
+    
+    # Job queue bookkeeping (times are unix epoch seconds)
+    _add_column(c, "jobs", "enqueued_at", "REAL")
+    _add_column(c, "jobs", "started_at", "REAL")
+    _add_column(c, "jobs", "finished_at", "REAL")
+    _add_column(c, "jobs", "attempts", "INTEGER DEFAULT 0")
+    _add_column(c, "jobs", "lease_owner", "TEXT")
+    _add_column(c, "jobs", "lease_expires_at", "REAL")
+    _add_column(c, "jobs", "error", "TEXT")
+    
+    # Output file validators for conditional and ranged downloads
+    _add_column(c, "jobs", "artifact_sha256", "TEXT")
+    _add_column(c, "jobs", "artifact_size", "INTEGER")
+    
+    # Run the job under the sampling profiler (admin opt-in)
+    _add_column(c, "jobs", "profile", "INTEGER DEFAULT 0")
+    
+    # Move slides of plans stored as a JSON array into plan_slides
+    c.execute('''
+        INSERT OR IGNORE INTO plan_slides (plan_id, idx, chosen_layout_id, score, issues)
+        SELECT p.id, CAST(s.key AS INTEGER), json_extract(s.value, '$.chosen_layout_id'),
+               json_extract(s.value, '$.score'), COALESCE(json_extract(s.value, '$.issues'), '[]')
+        FROM plans p, json_each(p.slides) s
+        WHERE p.slides IS NOT NULL
+    ''')
+    c.execute("UPDATE plans SET slides = NULL WHERE slides IS NOT NULL")
+    
+    # Re-encode source pages stored as JSON text in the compact encoding
+    conn = c.connection
+    while True:
+        rows = conn.execute(
+            "SELECT id, pages FROM sources WHERE typeof(pages) = 'text' LIMIT 500"
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            "UPDATE sources SET pages = ? WHERE id = ?",
+            [(encode_pages(json.loads(pages)), id_) for id_, pages in rows]
+        )
+    
+    # Content hash lookups for upload deduplication
+    c.execute('CREATE INDEX IF NOT EXISTS idx_templates_content_hash ON templates(content_hash)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sources_content_hash ON sources(content_hash)')
+    
+    # Queue claims scan queued/running jobs in arrival order
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, enqueued_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events(job_id, id)')
+    
+    # Foreign key lookups and keyset-paginated listings, newest first by
+    # (created_at, id), optionally filtered by the leading column
+    c.execute('CREATE INDEX IF NOT EXISTS idx_templates_created ON templates(created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sources_created ON sources(created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sources_template ON sources(template_id, created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_plans_created ON plans(created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_plans_source ON plans(source_id, created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_plans_template ON plans(template_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_plan ON jobs(plan_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at, id)')
+    # Retention expires finished jobs by finishing time
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(status, finished_at)')
+
+def _add_column(c: sqlite3.Cursor, table: str, column: str, decl: str) -> None:
+    """Add a column to an existing table if it is not there yet"""
+    columns = [row[1] for row in c.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
 
 class DBManager:
-    """Simple database manager for SQLite operations"""
+    """Simple database manager for SQLite operations
+    
+    Decoded templates and sources are cached per manager; they never change
+    once inserted, so cache entries only go stale when a row is deleted.
+    Rows can be deleted by other managers and processes (the retention
+    sweeper), so a cache hit is only used after a primary key lookup
+    confirms the row still exists; that skips reading and decoding the
+    row itself. Returned records are shared with the cache and must not be
+    modified.
+    """
     
     def __init__(self):
         init_db()
+        cache_bytes = config.DB_CACHE_MB * 1024 * 1024
+        self.template_cache = LRUCache("templates", config.DB_CACHE_ENTRIES, cache_bytes)
+        self.source_cache = LRUCache("sources", config.DB_CACHE_ENTRIES, cache_bytes)
     
     def execute(self, query: str, params: tuple = ()) -> List[Any]:
-        """Execute a query and return results"""
-        conn = sqlite3.connect(str(DB_PATH))
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute(query, params)
-        result = c.fetchall()
-        conn.commit()
-        conn.close()
-        return result
+        """Execute a query and return results
+        
+        Outside a transaction each statement commits on its own (reads do
+        not commit at all); inside transaction() it joins the transaction.
+        """
+        conn = thread_connection()
+        with DB_QUERY_SECONDS.labels(operation="execute").time():
+            return with_retry(lambda: conn.execute(query, params).fetchall())
+    
+    @contextmanager
+    def transaction(self, write: bool = True) -> Iterator[sqlite3.Connection]:
+        """Run several statements in one transaction.
+        
+        For writes, BEGIN IMMEDIATE takes the write lock up front, so
+        read-then-update sequences (such as claiming a job) cannot interleave
+        across processes. Read transactions see one consistent snapshot.
+        Nested calls join the enclosing transaction.
+        """
+        conn = thread_connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        
+        started = time.perf_counter()
+        try:
+            with_retry(lambda: conn.execute("BEGIN IMMEDIATE" if write else "BEGIN"))
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            DB_QUERY_SECONDS.labels(operation="transaction").observe(time.perf_counter() - started)
+    
+    def _list_page(self, table: str, columns: str, filter_column: str = None, filter_value: Any = None,
+                   after: Tuple[str, str] = None, limit: int = 50) -> Page:
+        """One page of rows, newest first, and the key to pass as `after` for the next page.
+        
+        Keyset pagination seeks straight to `after` in the (created_at, id)
+        index, so every page costs the same however deep it is.
+        """
+        conditions, params = [], []
+        if filter_column is not None:
+            conditions.append(f"{filter_column} = ?")
+            params.append(filter_value)
+        if after is not None:
+            conditions.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT {columns} FROM {table} {where} ORDER BY created_at DESC, id DESC LIMIT ?"
+        rows = [dict(row) for row in self.execute(query, (*params, limit + 1))]
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, (rows[-1]["created_at"], rows[-1]["id"])
+    
+    def list_templates(self, after: Tuple[str, str] = None, limit: int = 50) -> Page:
+        """Page of template summaries, without theme or layout catalog"""
+        return self._list_page("templates", "id, created_at, content_hash", after=after, limit=limit)
+    
+    def list_sources(self, template_id: str = None, after: Tuple[str, str] = None, limit: int = 50) -> Page:
+        """Page of source summaries, without pages"""
+        return self._list_page(
+            "sources", "id, template_id, type, created_at, content_hash",
+            "template_id" if template_id is not None else None, template_id, after, limit
+        )
+    
+    def list_plans(self, source_id: str = None, after: Tuple[str, str] = None, limit: int = 50) -> Page:
+        """Page of plan summaries, without slides"""
+        return self._list_page(
+            "plans", "id, template_id, source_id, created_at",
+            "source_id" if source_id is not None else None, source_id, after, limit
+        )
     
-    def insert_template(self, template_id: str, theme_meta: Dict, layout_catalog: List[Dict]) -> None:
+    def list_jobs(self, status: str = None, after: Tuple[str, str] = None, limit: int = 50) -> Page:
+        """Page of job summaries, without previews or report"""
+        return self._list_page(
+            "jobs", "id, plan_id, status, created_at, updated_at, attempts, error, artifact_url",
+            "status" if status is not None else None, status, after, limit
+        )
+    
+    def insert_template(self, template_id: str, theme_meta: Dict, layout_catalog: List[Dict],
+                        content_hash: str = None) -> None:
         """Insert a new template"""
-        query = "INSERT INTO templates (id, theme_meta, layout_catalog) VALUES (?, ?, ?)"
-        self.execute(query, (template_id, json.dumps(theme_meta), json.dumps(layout_catalog)))
+        query = "INSERT INTO templates (id, theme_meta, layout_catalog, content_hash) VALUES (?, ?, ?, ?)"
+        self.execute(query, (template_id, json.dumps(theme_meta), json.dumps(layout_catalog), content_hash))
+    
+    def _exists(self, table: str, id_: str) -> bool:
+        """Whether a row with this id exists, read from the primary key index only"""
+        return bool(self.execute(f"SELECT 1 FROM {table} WHERE id = ?", (id_,)))
     
     def get_template(self, template_id: str) -> Optional[Dict]:
         """Get template by ID"""
+        template = self.template_cache.get(template_id)
+        if template is not None:
+            if self._exists("templates", template_id):
+                return template
+            self.template_cache.pop(template_id)
+            return None
         query = "SELECT * FROM templates WHERE id = ?"
         result = self.execute(query, (template_id,))
         if result:
             row = result[0]
-            return {
-                "id": row["id"],
-                "theme_meta": json.loads(row["theme_meta"]),
-                "layout_catalog": json.loads(row["layout_catalog"])
-            }
+            template = self._template_from_row(row)
+            self.template_cache.put(template_id, template, len(row["theme_meta"]) + len(row["layout_catalog"]))
+            return template
         return None
     
-    def insert_source(self, source_id: str, template_id: str, doc_type: str, pages: List[Dict]) -> None:
+    def find_template_by_hash(self, content_hash: str) -> Optional[Dict]:
+        """Get a previously ingested template with identical file content"""
+        # Newest first: it is the likeliest to still have its stored file
+        query = "SELECT id FROM templates WHERE content_hash = ? ORDER BY created_at DESC, rowid DESC LIMIT 1"
+        result = self.execute(query, (content_hash,))
+        if result:
+            return self.get_template(result[0]["id"])
+        return None
+    
+    def delete_template(self, template_id: str) -> None:
+        """Delete a template row"""
+        self.execute("DELETE FROM templates WHERE id = ?", (template_id,))
+        self.template_cache.pop(template_id)
+    
+    def _template_from_row(self, row: sqlite3.Row) -> Dict:
+        return {
+            "id": row["id"],
+            "theme_meta": json.loads(row["theme_meta"]),
+            "layout_catalog": json.loads(row["layout_catalog"])
+        }
+    
+    def insert_source(self, source_id: str, template_id: str, doc_type: str, pages: List[Dict],
+                      content_hash: str = None) -> None:
         """Insert a new source document"""
-        query = "INSERT INTO sources (id, template_id, type, pages) VALUES (?, ?, ?, ?)"
-        self.execute(query, (source_id, template_id, doc_type, json.dumps(pages)))
+        query = "INSERT INTO sources (id, template_id, type, pages, content_hash) VALUES (?, ?, ?, ?, ?)"
+        self.execute(query, (source_id, template_id, doc_type, encode_pages(pages), content_hash))
+    
+    def insert_sources(self, sources: List[Dict]) -> None:
+        """Insert many source documents in one transaction.
+        
+        Each dict has the insert_source arguments as keys.
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO sources (id, template_id, type, pages, content_hash) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (s["source_id"], s["template_id"], s["doc_type"], encode_pages(s["pages"]),
+                     s.get("content_hash"))
+                    for s in sources
+                ]
+            )
     
     def get_source(self, source_id: str) -> Optional[Dict]:
         """Get source by ID"""
+        source = self.source_cache.get(source_id)
+        if source is not None:
+            if self._exists("sources", source_id):
+                return source
+            self.source_cache.pop(source_id)
+            return None
         query = "SELECT * FROM sources WHERE id = ?"
         result = self.execute(query, (source_id,))
         if result:
             row = result[0]
-            return {
-                "id": row["id"],
-                "template_id": row["template_id"],
-                "type": row["type"],
-                "pages": json.loads(row["pages"])
-            }
+            source = self._source_from_row(row)
+            self.source_cache.put(source_id, source, len(source["pages"]) * PAGE_SIZE_ESTIMATE)
+            return source
+        return None
+    
+    def find_source_by_hash(self, content_hash: str, template_id: str = None) -> Optional[Dict]:
+        """Get a previously ingested source with identical file content.
+        
+        A source ingested for `template_id` is preferred, since it can be
+        returned as-is; otherwise any source with the same content is used.
+        Newer sources are preferred, being the likeliest to still have their
+        stored file.
+        """
+        query = """
+            SELECT id FROM sources WHERE content_hash = ?
+            ORDER BY template_id IS NOT ?, created_at DESC, rowid DESC LIMIT 1
+        """
+        result = self.execute(query, (content_hash, template_id))
+        if result:
+            return self.get_source(result[0]["id"])
         return None
     
+    def delete_source(self, source_id: str) -> None:
+        """Delete a source row"""
+        self.execute("DELETE FROM sources WHERE id = ?", (source_id,))
+        self.source_cache.pop(source_id)
+    
+    def _source_from_row(self, row: sqlite3.Row) -> Dict:
+        return {
+            "id": row["id"],
+            "template_id": row["template_id"],
+            "type": row["type"],
+            "pages": decode_pages(row["pages"])
+        }
+    
     def insert_plan(self, plan_id: str, template_id: str, source_id: str, slides: List[Dict]) -> None:
-        """Insert a new transformation plan"""
-        query = "INSERT INTO plans (id, template_id, source_id, slides) VALUES (?, ?, ?, ?)"
-        self.execute(query, (plan_id, template_id, source_id, json.dumps(slides)))
+        """Insert a new transformation plan and its slides"""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO plans (id, template_id, source_id) VALUES (?, ?, ?)",
+                (plan_id, template_id, source_id)
+            )
+            conn.executemany(
+                "INSERT INTO plan_slides (plan_id, idx, chosen_layout_id, score, issues) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (plan_id, idx, slide["chosen_layout_id"], slide["score"], json.dumps(slide.get("issues", [])))
+                    for idx, slide in enumerate(slides)
+                ]
+            )
     
     def get_plan(self, plan_id: str) -> Optional[Dict]:
-        """Get plan by ID"""
-        query = "SELECT * FROM plans WHERE id = ?"
-        result = self.execute(query, (plan_id,))
-        if result:
+        """Get plan by ID, with all its slides"""
+        with self.transaction(write=False):
+            result = self.execute("SELECT * FROM plans WHERE id = ?", (plan_id,))
+            if not result:
+                return None
             row = result[0]
             return {
                 "id": row["id"],
                 "template_id": row["template_id"],
                 "source_id": row["source_id"],
-                "slides": json.loads(row["slides"])
+                "slides": self.get_plan_slides(plan_id)
             }
-        return None
     
-    def update_plan_slides(self, plan_id: str, slides: List[Dict]) -> None:
-        """Update plan slides"""
-        query = "UPDATE plans SET slides = ? WHERE id = ?"
-        self.execute(query, (json.dumps(slides), plan_id))
+    def get_plan_slides(self, plan_id: str, start: int = 0, end: int = None) -> List[Dict]:
+        """Get a plan's slides with start <= idx < end, in order"""
+        query = """
+            SELECT idx, chosen_layout_id, score, issues FROM plan_slides
+            WHERE plan_id = ? AND idx >= ? AND idx < ? ORDER BY idx
+        """
+        # SQLite integers are 64-bit; a missing end reads to the last slide
+        end = 2 ** 63 - 1 if end is None else end
+        return [
+            {
+                "idx": row["idx"],
+                "chosen_layout_id": row["chosen_layout_id"],
+                "score": row["score"],
+                "issues": json.loads(row["issues"])
+            }
+            for row in self.execute(query, (plan_id, start, end))
+        ]
+    
+    def get_plan_slides_page(self, plan_id: str, start: int = 0, end: int = None) -> Optional[Dict]:
+        """A plan's slide count and its slides with start <= idx < end, or None if there is no such plan"""
+        with self.transaction(write=False):
+            total = self.count_plan_slides(plan_id)
+            if total is None:
+                return None
+            return {"total": total, "slides": self.get_plan_slides(plan_id, start, end)}
     
-    def insert_job(self, job_id: str, plan_id: str) -> None:
-        """Insert a new job"""
-        query = "INSERT INTO jobs (id, plan_id) VALUES (?, ?)"
-        self.execute(query, (job_id, plan_id))
+    def count_plan_slides(self, plan_id: str) -> Optional[int]:
+        """Number of slides in a plan, or None if there is no such plan"""
+        query = """
+            SELECT COUNT(s.idx) FROM plans p LEFT JOIN plan_slides s ON s.plan_id = p.id
+            WHERE p.id = ? GROUP BY p.id
+        """
+        result = self.execute(query, (plan_id,))
+        return result[0][0] if result else None
+    
+    def update_plan_slide(self, plan_id: str, idx: int, layout_id: str, score: float) -> bool:
+        """Change one slide's layout; returns False if the plan has no such slide"""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE plan_slides SET chosen_layout_id = ?, score = ? WHERE plan_id = ? AND idx = ?",
+                (layout_id, score, plan_id, idx)
+            )
+            return cursor.rowcount > 0
+    
+    def insert_job(self, job_id: str, plan_id: str, profile: bool = False) -> None:
+        """Insert a new job into the queue"""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, plan_id, status, enqueued_at, profile) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, plan_id, time.time(), int(profile))
+            )
+            self._add_job_event(conn, job_id, "queued", {"status": "queued"})
+    
+    def _add_job_event(self, conn: sqlite3.Connection, job_id: str, event: str, data: Dict) -> None:
+        conn.execute(
+            "INSERT INTO job_events (job_id, event, data, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, event, json.dumps(data), time.time())
+        )
+    
+    def add_job_event(self, job_id: str, event: str, data: Dict) -> None:
+        """Record a job event such as progress"""
+        with self.transaction() as conn:
+            self._add_job_event(conn, job_id, event, data)
+    
+    def get_job_events(self, job_id: str, after_id: int = 0, limit: int = 500) -> List[Dict]:
+        """Get a job's events with id greater than after_id, oldest first"""
+        query = """
+            SELECT id, event, data FROM job_events
+            WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?
+        """
+        return [
+            {"id": row["id"], "event": row["event"], "data": json.loads(row["data"])}
+            for row in self.execute(query, (job_id, after_id, limit))
+        ]
+    
+    def claim_job(self, worker_id: str, lease_seconds: float, max_attempts: int) -> Optional[Dict]:
+        """Lease the oldest runnable job to a worker.
+        
+        Runnable jobs are queued ones and running ones whose lease expired
+        (their worker died). Expired jobs that used up max_attempts are
+        marked as errors instead of being retried.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            exhausted = conn.execute("""
+                SELECT id, attempts FROM jobs
+                WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+                  AND attempts >= ?
+            """, (now, max_attempts)).fetchall()
+            for job in exhausted:
+                error = f"lease expired after {job['attempts']} attempts"
+                conn.execute("""
+                    UPDATE jobs
+                    SET status = 'error', error = ?, lease_owner = NULL, finished_at = ?, updated_at = ?
+                    WHERE id = ?
+                """, (error, now, datetime.now().isoformat(), job["id"]))
+                self._add_job_event(conn, job["id"], "error", {"status": "error", "error": error})
+            row = conn.execute("""
+                SELECT id FROM jobs
+                WHERE status = 'queued'
+                   OR (status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?))
+                ORDER BY enqueued_at
+                LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("""
+                UPDATE jobs
+                SET status = 'running', lease_owner = ?, lease_expires_at = ?,
+                    started_at = ?, attempts = COALESCE(attempts, 0) + 1, updated_at = ?
+                WHERE id = ?
+            """, (worker_id, now + lease_seconds, now, datetime.now().isoformat(), row["id"]))
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            self._add_job_event(conn, job["id"], "running", {
+                "status": "running", "attempt": job["attempts"], "worker": worker_id
+            })
+        return {
+            "id": job["id"],
+            "plan_id": job["plan_id"],
+            "attempts": job["attempts"],
+            "enqueued_at": job["enqueued_at"],
+            "started_at": job["started_at"],
+            "profile": bool(job["profile"])
+        }
+    
+    def heartbeat_job(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend a job lease; returns False if the worker no longer holds it"""
+        with self.transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET lease_expires_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = 'running'
+            """, (time.time() + lease_seconds, job_id, worker_id))
+            return cursor.rowcount > 0
+    
+    def complete_job(self, job_id: str, worker_id: str, artifact_url: str,
+                     preview_pngs: List[str], report: Dict,
+                     artifact_sha256: str = None, artifact_size: int = None) -> bool:
+        """Record a job's results if the worker still holds its lease"""
+        now = time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs
+                SET status = 'done', artifact_url = ?, preview_pngs = ?, report = ?,
+                    artifact_sha256 = ?, artifact_size = ?,
+                    lease_owner = NULL, lease_expires_at = NULL, finished_at = ?, updated_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = 'running'
+            """, (
+                artifact_url,
+                json.dumps(preview_pngs) if preview_pngs else None,
+                json.dumps(report) if report else None,
+                artifact_sha256,
+                artifact_size,
+                now,
+                datetime.now().isoformat(),
+                job_id,
+                worker_id
+            ))
+            if cursor.rowcount == 0:
+                return False
+            self._add_job_event(conn, job_id, "done", {
+                "status": "done", "artifact_url": artifact_url, "report": report
+            })
+            return True
+    
+    def fail_job(self, job_id: str, worker_id: str, error: str, retry: bool) -> bool:
+        """Release a failed job, re-queueing it when `retry` is set"""
+        now = time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs
+                SET status = ?, error = ?, lease_owner = NULL, lease_expires_at = NULL,
+                    finished_at = ?, updated_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = 'running'
+            """, (
+                "queued" if retry else "error",
+                error,
+                None if retry else now,
+                datetime.now().isoformat(),
+                job_id,
+                worker_id
+            ))
+            if cursor.rowcount == 0:
+                return False
+            status = "queued" if retry else "error"
+            self._add_job_event(conn, job_id, status, {"status": status, "error": error})
+            return True
+    
+    def count_jobs_by_status(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        return {
+            row["status"]: row["n"]
+            for row in self.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+        }
+    
+    def count_queued_jobs(self) -> int:
+        """Number of queued jobs, counted on the status index"""
+        return self.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'")[0][0]
+    
+    def queue_stats(self, window_seconds: float = 300) -> Dict[str, Any]:
+        """Queue depth, wait times and recent throughput"""
+        now = time.time()
+        since = now - window_seconds
+        with self.transaction(write=False):
+            counts = self.count_jobs_by_status()
+            queued = self.execute(
+                "SELECT MIN(enqueued_at) AS oldest FROM jobs WHERE status = 'queued'"
+            )[0]
+            recent = self.execute("""
+                SELECT COUNT(*) AS started, AVG(started_at - enqueued_at) AS avg_wait,
+                       MAX(started_at - enqueued_at) AS max_wait
+                FROM jobs WHERE started_at >= ? AND enqueued_at IS NOT NULL
+            """, (since,))[0]
+            finished = self.execute("""
+                SELECT COUNT(*) AS n, AVG(finished_at - started_at) AS avg_run
+                FROM jobs WHERE finished_at >= ? AND status = 'done'
+            """, (since,))[0]
+        return {
+            "depth": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "by_status": counts,
+            "oldest_wait_seconds": now - queued["oldest"] if queued["oldest"] else 0.0,
+            "window_seconds": window_seconds,
+            "started_in_window": recent["started"],
+            "avg_wait_seconds": recent["avg_wait"] or 0.0,
+            "max_wait_seconds": recent["max_wait"] or 0.0,
+            "completed_in_window": finished["n"],
+            "avg_run_seconds": finished["avg_run"] or 0.0,
+            "throughput_per_minute": finished["n"] * 60.0 / window_seconds
+        }
     
     def update_job(self, job_id: str, status: str, artifact_url: str = None, 
                    preview_pngs: List[str] = None, report: Dict = None) -> None:
@@ -179,6 +755,130 @@ class DBManager:
                 "status": row["status"],
                 "artifact_url": row["artifact_url"],
                 "preview_pngs": json.loads(row["preview_pngs"]) if row["preview_pngs"] else None,
-                "report": json.loads(row["report"]) if row["report"] else None
+                "report": json.loads(row["report"]) if row["report"] else None,
+                "error": row["error"],
+                "artifact_sha256": row["artifact_sha256"],
+                "artifact_size": row["artifact_size"]
             }
-        return None
\ No newline at end of file
+        return None
+    
+    def get_jobs(self, job_ids: List[str]) -> List[Dict]:
+        """Get several jobs by ID, in the order given; unknown IDs are skipped"""
+        if not job_ids:
+            return []
+        placeholders = ", ".join("?" for _ in job_ids)
+        query = f"SELECT id, status, artifact_sha256, artifact_size FROM jobs WHERE id IN ({placeholders})"
+        rows = {row["id"]: dict(row) for row in self.execute(query, tuple(job_ids))}
+        return [rows[job_id] for job_id in job_ids if job_id in rows]
+    
+    def _delete_expired(self, select: str, deletes: List[str], max_age_hours: int, limit: int) -> List[str]:
+        """Delete up to `limit` expired rows in one transaction; returns their IDs
+        
+        `select` picks up to :limit IDs of rows older than :age (a datetime()
+        modifier) or, for epoch timestamps, :cutoff, oldest first; each of
+        `deletes` is run once per ID.
+        """
+        params = {
+            "age": f"-{max_age_hours} hours",
+            "cutoff": time.time() - max_age_hours * 3600,
+            "limit": limit
+        }
+        with self.transaction() as conn:
+            ids = [row[0] for row in conn.execute(select, params)]
+            for delete in deletes:
+                conn.executemany(delete, [(id_,) for id_ in ids])
+        return ids
+    
+    def delete_expired_jobs(self, max_age_hours: int, limit: int) -> List[str]:
+        """Delete jobs and their events that finished more than max_age_hours ago
+        
+        Age counts from finishing, so a job that waited long in the queue is
+        still kept for max_age_hours to be downloaded. Jobs finished without
+        a recorded finished_at count from their creation.
+        """
+        return self._delete_expired("""
+            SELECT id FROM jobs
+            WHERE status IN ('done', 'error')
+              AND (finished_at < :cutoff
+                   OR (finished_at IS NULL AND created_at < datetime('now', :age)))
+            ORDER BY finished_at LIMIT :limit
+        """, [
+            "DELETE FROM job_events WHERE job_id = ?",
+            "DELETE FROM jobs WHERE id = ?",
+        ], max_age_hours, limit)
+    
+    def delete_expired_plans(self, max_age_hours: int, limit: int) -> List[str]:
+        """Delete plans older than max_age_hours that no job refers to"""
+        return self._delete_expired("""
+            SELECT id FROM plans p
+            WHERE created_at < datetime('now', :age)
+              AND NOT EXISTS (SELECT 1 FROM jobs j WHERE j.plan_id = p.id)
+            ORDER BY created_at LIMIT :limit
+        """, [
+            "DELETE FROM plan_slides WHERE plan_id = ?",
+            "DELETE FROM plans WHERE id = ?",
+        ], max_age_hours, limit)
+    
+    def delete_expired_sources(self, max_age_hours: int, limit: int) -> List[str]:
+        """Delete sources older than max_age_hours that no plan refers to"""
+        ids = self._delete_expired("""
+            SELECT id FROM sources s
+            WHERE created_at < datetime('now', :age)
+              AND NOT EXISTS (SELECT 1 FROM plans p WHERE p.source_id = s.id)
+            ORDER BY created_at LIMIT :limit
+        """, ["DELETE FROM sources WHERE id = ?"], max_age_hours, limit)
+        for source_id in ids:
+            self.source_cache.pop(source_id)
+        return ids
+    
+    def delete_expired_templates(self, max_age_hours: int, limit: int) -> List[str]:
+        """Delete templates older than max_age_hours that no source or plan refers to"""
+        ids = self._delete_expired("""
+            SELECT id FROM templates t
+            WHERE created_at < datetime('now', :age)
+              AND NOT EXISTS (SELECT 1 FROM sources s WHERE s.template_id = t.id)
+              AND NOT EXISTS (SELECT 1 FROM plans p WHERE p.template_id = t.id)
+            ORDER BY created_at LIMIT :limit
+        """, ["DELETE FROM templates WHERE id = ?"], max_age_hours, limit)
+        for template_id in ids:
+            self.template_cache.pop(template_id)
+        return ids
+    
+    def incremental_vacuum_enabled(self) -> bool:
+        """Whether the database file can be shrunk with incremental_vacuum"""
+        return thread_connection().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    
+    def enable_incremental_vacuum(self) -> bool:
+        """Convert a database created before incremental auto-vacuum; False if it already was
+        
+        This rewrites the whole file with a full VACUUM, holding the write
+        lock throughout, so it is a maintenance step (python -m
+        app.retention --enable-incremental-vacuum), never run by the service.
+        """
+        if self.incremental_vacuum_enabled():
+            return False
+        conn = thread_connection()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        with_retry(lambda: conn.execute("VACUUM"))
+        return True
+    
+    def incremental_vacuum(self, max_pages: int) -> int:
+        """Return up to max_pages free pages to the filesystem; returns the number freed
+        
+        Does nothing on databases created before incremental auto-vacuum
+        until enable_incremental_vacuum has converted them.
+        """
+        if not self.incremental_vacuum_enabled():
+            return 0
+        conn = thread_connection()
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # The pragma frees one page per step; executescript steps it to completion
+        with_retry(lambda: conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});"))
+        return free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    
+    def set_job_artifact_digest(self, job_id: str, artifact_sha256: str, artifact_size: int) -> None:
+        """Store output validators for jobs completed before they were recorded"""
+        self.execute(
+            "UPDATE jobs SET artifact_sha256 = ?, artifact_size = ? WHERE id = ?",
+            (artifact_sha256, artifact_size, job_id)
+        )
\ No newline at end of file
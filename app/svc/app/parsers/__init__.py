@@ -1,6 +1,28 @@
-"""Parsers for template and source documents"""
-from .template_parser import TemplateParser
-from .pptx_parser import PPTXParser
-from .pdf_parser import PDFParser
+"""Parsers for template and source documents
 
-__all__ = ["TemplateParser", "PPTXParser", "PDFParser"]
\ No newline at end of file
+The parser classes pull in python-pptx, pdfplumber and pdfminer, so they
+are imported on first access. The API process only needs ParsePool; the
+parsing itself happens in pool worker processes.
+"""
+import importlib
+
+from .pool import ParsePool, parse_template, parse_source
+
+_LAZY = {
+    "TemplateParser": ".template_parser",
+    "PPTXParser": ".pptx_parser",
+    "PDFParser": ".pdf_parser",
+}
+
+__all__ = [
+    "TemplateParser", "PPTXParser", "PDFParser",
+    "ParsePool", "parse_template", "parse_source"
+]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
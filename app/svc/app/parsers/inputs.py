@@ -0,0 +1,17 @@
+"""Helpers for accepting documents as paths or in-memory bytes"""
+import io
+from pathlib import Path
+from typing import BinaryIO, Union
+
+DocumentInput = Union[str, Path, bytes, bytearray, memoryview, BinaryIO]
+
+
+def open_input(file: DocumentInput) -> Union[str, BinaryIO]:
+    """Return something python-pptx / pdfplumber can open: a path string or a stream"""
+    if isinstance(file, (str, Path)):
+        return str(file)
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        # BytesIO shares the buffer of a bytes object instead of copying it
+        return io.BytesIO(file)
+    return file
+
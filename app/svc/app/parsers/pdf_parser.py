@@ -1,35 +1,31 @@
-"""PDF source document parser"""
+"""PDF source document parser
+
+Long PDFs can be analyzed in parallel: ParsePool splits the pages into
+ranges and has its workers analyze a range each with parse_range, each
+opening the document on its own. Pages are analyzed
+independently, so the merged result is identical to a sequential parse.
+"""
 import pdfplumber
-from pdfminer.high_level import extract_pages
 from pdfminer.layout import LTTextBox, LTFigure, LTImage, LTChar
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any
 import uuid
 from pathlib import Path
-import pytesseract
-from PIL import Image
-import io
+
+from .inputs import DocumentInput, open_input
 
 class PDFParser:
     """Parse PDF to extract page signatures with medium/low reliability"""
     
-    def __init__(self, file_path: Path, template_id: str, enable_ocr: bool = False):
-        self.file_path = file_path
+    def __init__(self, file: DocumentInput, template_id: str, enable_ocr: bool = False):
+        self.file = open_input(file)
         self.template_id = template_id
         self.source_id = str(uuid.uuid4())
         self.enable_ocr = enable_ocr
     
     def parse(self) -> Dict[str, Any]:
         """Extract signatures from all pages"""
-        pages = []
-        
-        with pdfplumber.open(self.file_path) as pdf:
-            for idx, page in enumerate(pdf.pages):
-                signature, warnings = self._analyze_page(page, idx)
-                pages.append({
-                    "idx": idx,
-                    "signature": signature,
-                    "warnings": warnings
-                })
+        with pdfplumber.open(self.file) as pdf:
+            pages = self._analyze_pages(pdf.pages)
         
         return {
             "source_id": self.source_id,
@@ -37,6 +33,28 @@ class PDFParser:
             "pages": pages
         }
     
+    def parse_range(self, page_range: range) -> List[Dict[str, Any]]:
+        """Signatures of the pages with indexes in page_range"""
+        # pdfplumber numbers pages from 1
+        with pdfplumber.open(self.file, pages=[idx + 1 for idx in page_range]) as pdf:
+            return self._analyze_pages(pdf.pages)
+    
+    def _analyze_pages(self, pdf_pages) -> List[Dict[str, Any]]:
+        """Signatures of the given pdfplumber pages, in order"""
+        pages = []
+        for page in pdf_pages:
+            idx = page.page_number - 1
+            signature, warnings = self._analyze_page(page, idx)
+            # Drop the page's parsed layout and objects, so memory does
+            # not grow with the page count
+            page.flush_cache()
+            pages.append({
+                "idx": idx,
+                "signature": signature,
+                "warnings": warnings
+            })
+        return pages
+    
     def _analyze_page(self, page, page_idx: int) -> tuple[Dict[str, Any], List[str]]:
         """Analyze a single PDF page"""
         warnings = []
@@ -51,11 +69,14 @@ class PDFParser:
         
         # Extract text with coordinates
         text_blocks = []
-        text = page.extract_text()
         
-        # If no text found and OCR is enabled, try OCR
-        if not text and self.enable_ocr:
+        # If no text found and OCR is enabled, try OCR (the text itself is
+        # only needed for this check, so it is not extracted otherwise)
+        if self.enable_ocr and not page.extract_text():
             try:
+                # Imported here: OCR is optional and pytesseract is slow to load
+                import pytesseract
+                
                 # Convert page to image for OCR
                 pil_image = page.to_image(resolution=150).original
                 text = pytesseract.image_to_string(pil_image)
@@ -68,9 +89,11 @@ class PDFParser:
         page_height = page.height
         total_area = page_width * page_height
         
-        # Extract text blocks with positions using pdfminer
+        # Walk the pdfminer layout pdfplumber already built for this page
+        # (and reuses for chars and table finding), instead of parsing the
+        # page again from the file
         try:
-            page_layout = list(extract_pages(str(self.file_path), page_numbers=[page_idx]))[0]
+            page_layout = page.layout
             
             max_font_size = 0
             title_y_threshold = page_height * 0.25
@@ -154,4 +177,12 @@ class PDFParser:
         """Extract characters from text box"""
         for element in self._flatten_layout(text_box):
             if isinstance(element, LTChar):
-                yield element
\ No newline at end of file
+                yield element
+
+
+
+def count_pages(file: DocumentInput) -> int:
+    """Number of pages in a PDF"""
+    with pdfplumber.open(open_input(file)) as pdf:
+        return len(pdf.pages)
+
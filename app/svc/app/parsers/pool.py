@@ -0,0 +1,232 @@
+"""Process pool for running CPU-bound parsers off the event loop"""
+import asyncio
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .. import config
+from ..utils.metrics import DOCUMENT_PAGES, PAGES_PARSED, PARSE_SECONDS
+from ..utils.profiling import profiled
+from .inputs import DocumentInput
+
+
+def parse_template(file: DocumentInput) -> Dict[str, Any]:
+    """Parse a template from a path or bytes (runs inside a pool worker)"""
+    from .template_parser import TemplateParser
+    return TemplateParser(file).parse()
+
+
+def parse_source(file: DocumentInput, template_id: str, ext: str) -> Dict[str, Any]:
+    """Parse a PPTX or PDF source from a path or bytes (runs inside a pool worker)"""
+    if ext == "pptx":
+        from .pptx_parser import PPTXParser
+        parser = PPTXParser(file, template_id)
+    else:
+        from .pdf_parser import PDFParser
+        parser = PDFParser(file, template_id, enable_ocr=False)
+    return parser.parse()
+
+
+def count_pdf_pages(file: DocumentInput) -> int:
+    """Page count of a PDF (runs inside a pool worker)"""
+    from .pdf_parser import count_pages
+    return count_pages(file)
+
+
+def parse_pdf_range(file: DocumentInput, page_range: range) -> List[Dict[str, Any]]:
+    """Signatures of one page range of a PDF (runs inside a pool worker)"""
+    from .pdf_parser import PDFParser
+    return PDFParser(file, template_id=None).parse_range(page_range)
+
+
+def _page_ranges(page_count: int, chunk_pages: int) -> List[range]:
+    """Consecutive page index ranges of at most chunk_pages pages"""
+    return [
+        range(start, min(start + chunk_pages, page_count))
+        for start in range(0, page_count, chunk_pages)
+    ]
+
+
+def _parser_name(fn: Callable, args: tuple) -> Optional[str]:
+    """Parser class a pool call runs, used to label its metrics"""
+    if fn is parse_template:
+        return "TemplateParser"
+    if fn is parse_source:
+        return "PPTXParser" if args[2] == "pptx" else "PDFParser"
+    return None
+
+
+def _observe_parse(fn: Callable, args: tuple, result: Any, run_seconds: float) -> None:
+    """Record parse metrics in the calling process, where /metrics is served"""
+    parser = _parser_name(fn, args)
+    if parser is None:
+        return
+    PARSE_SECONDS.labels(parser=parser).observe(run_seconds)
+    if isinstance(result, dict) and "pages" in result:
+        pages = len(result["pages"])
+        DOCUMENT_PAGES.labels(parser=parser).observe(pages)
+        PAGES_PARSED.labels(parser=parser).inc(pages)
+
+
+def _timed_call(fn: Callable, args: tuple, profile_id: str = None) -> Tuple[Any, float, float]:
+    """Run fn in the worker and report when it started and how long it ran"""
+    started_at = time.time()
+    with profiled(profile_id, config.PROFILE_INTERVAL_MS / 1000):
+        result = fn(*args)
+    return result, started_at, time.time() - started_at
+
+
+class ParsePool:
+    """Bounded process pool with queue-time and run-time statistics"""
+
+    def __init__(self, max_workers: int = None, max_concurrency: int = None,
+                 mp_context: str = None, pdf_workers: int = None, pdf_chunk_pages: int = None):
+        self.max_workers = max_workers or config.PARSE_WORKERS
+        self.max_concurrency = max_concurrency or config.PARSE_MAX_CONCURRENCY
+        self.mp_context = mp_context or config.PARSE_MP_CONTEXT
+        self.pdf_workers = pdf_workers or config.PDF_PARSE_WORKERS
+        self.pdf_chunk_pages = pdf_chunk_pages or config.PDF_PARSE_CHUNK_PAGES
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "waiting": 0,
+            "running": 0,
+            "queue_seconds_total": 0.0,
+            "queue_seconds_max": 0.0,
+            "run_seconds_total": 0.0,
+            "run_seconds_max": 0.0,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start worker processes on first use"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.mp_context)
+                )
+            return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _record(self, key: str, value: float) -> None:
+        self._stats[f"{key}_total"] += value
+        self._stats[f"{key}_max"] = max(self._stats[f"{key}_max"], value)
+
+    async def run(self, fn: Callable, *args, profile_id: str = None) -> Any:
+        """Run fn(*args) in a worker process without blocking the event loop
+        
+        With profile_id, the call is profiled inside the worker process and
+        its collapsed stacks saved under data/profiles/<profile_id>.
+        """
+        result, _, run_seconds = await self._run_timed(fn, args, profile_id)
+        _observe_parse(fn, args, result, run_seconds)
+        return result
+
+    async def run_source(self, file: DocumentInput, template_id: str, ext: str,
+                         profile_id: str = None) -> Dict[str, Any]:
+        """Run parse_source, splitting long PDFs into page ranges parsed in parallel
+        
+        PDFs longer than pdf_chunk_pages are split into ranges of that many
+        pages, up to pdf_workers of which run at once. Ranges are pool calls
+        like any other, so they share its workers and concurrency limit.
+        Profiled parses are not split.
+        """
+        if ext != "pdf" or self.pdf_workers == 1 or profile_id:
+            return await self.run(parse_source, file, template_id, ext, profile_id=profile_id)
+        ranges = _page_ranges(await self.run(count_pdf_pages, file), self.pdf_chunk_pages)
+        if len(ranges) <= 1:
+            return await self.run(parse_source, file, template_id, ext)
+
+        limit = asyncio.Semaphore(self.pdf_workers)
+
+        async def run_range(page_range: range):
+            async with limit:
+                return await self._run_timed(parse_pdf_range, (file, page_range), None)
+
+        tasks = [asyncio.ensure_future(run_range(page_range)) for page_range in ranges]
+        try:
+            chunks = await asyncio.gather(*tasks)
+        finally:
+            # After a failed range the others are of no use
+            for task in tasks:
+                task.cancel()
+        result = {
+            "source_id": str(uuid.uuid4()),
+            "type": "pdf",
+            "pages": [page for pages, _, _ in chunks for page in pages]
+        }
+        # Observed as one document, from its first range starting to its last finishing
+        started_at = min(started for _, started, _ in chunks)
+        finished_at = max(started + seconds for _, started, seconds in chunks)
+        _observe_parse(parse_source, (file, template_id, ext), result, finished_at - started_at)
+        return result
+
+    async def _run_timed(self, fn: Callable, args: tuple,
+                         profile_id: Optional[str]) -> Tuple[Any, float, float]:
+        """run() without parse metrics, also returning when the call started and how long it ran"""
+        submitted_at = time.time()
+        self._stats["submitted"] += 1
+        self._stats["waiting"] += 1
+        waiting = True
+        try:
+            async with self._get_semaphore():
+                self._stats["waiting"] -= 1
+                waiting = False
+                self._stats["running"] += 1
+                executor = self._get_executor()
+                try:
+                    loop = asyncio.get_running_loop()
+                    result, started_at, run_seconds = await loop.run_in_executor(
+                        executor, _timed_call, fn, args, profile_id
+                    )
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM); replace the pool for later calls
+                    self._discard_executor(executor)
+                    raise
+                finally:
+                    self._stats["running"] -= 1
+        except BaseException:
+            if waiting:
+                self._stats["waiting"] -= 1
+            self._stats["failed"] += 1
+            raise
+
+        self._stats["completed"] += 1
+        self._record("queue_seconds", max(0.0, started_at - submitted_at))
+        self._record("run_seconds", run_seconds)
+        return result, started_at, run_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool configuration and timing counters"""
+        stats = dict(self._stats)
+        finished = stats["completed"]
+        stats["queue_seconds_avg"] = stats["queue_seconds_total"] / finished if finished else 0.0
+        stats["run_seconds_avg"] = stats["run_seconds_total"] / finished if finished else 0.0
+        stats["max_workers"] = self.max_workers
+        stats["max_concurrency"] = self.max_concurrency
+        return stats
+
+    def shutdown(self) -> None:
+        """Stop worker processes"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
@@ -5,11 +5,13 @@ from typing import Dict, List, Any
 import uuid
 from pathlib import Path
 
+from .inputs import DocumentInput, open_input
+
 class PPTXParser:
     """Parse source PPTX to extract page signatures"""
     
-    def __init__(self, file_path: Path, template_id: str):
-        self.prs = Presentation(str(file_path))
+    def __init__(self, file: DocumentInput, template_id: str):
+        self.prs = Presentation(open_input(file))
         self.template_id = template_id
         self.source_id = str(uuid.uuid4())
     
@@ -5,11 +5,13 @@ from typing import Dict, List, Any
 import uuid
 from pathlib import Path
 
+from .inputs import DocumentInput, open_input
+
 class TemplateParser:
     """Parse PPTX template to extract theme metadata and layout catalog"""
     
-    def __init__(self, file_path: Path):
-        self.prs = Presentation(str(file_path))
+    def __init__(self, file: DocumentInput):
+        self.prs = Presentation(open_input(file))
         self.template_id = str(uuid.uuid4())
     
     def parse(self) -> Dict[str, Any]:
@@ -0,0 +1,89 @@
+"""Write-behind JSON export of plans
+
+The database is the only store plans are read from and written to. When
+PLAN_EXPORT is set, changed plans are also exported as JSON files by a
+background thread, off the request path. A plan is exported
+PLAN_EXPORT_DELAY_MS after its first change since the last export, as it
+is in the database at that moment, so a burst of swaps produces one write
+and the file never holds a state the database did not.
+"""
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+from . import config
+from .models import DBManager
+from .utils import StorageManager
+
+
+class PlanExporter:
+    """Export changed plans to StorageManager, coalescing changes within `delay` seconds"""
+
+    def __init__(self, db: DBManager = None, delay: float = None):
+        self.db = db or DBManager()
+        self.delay = config.PLAN_EXPORT_DELAY_MS / 1000 if delay is None else delay
+        self.exported = 0
+        # Plan ID -> monotonic time it is due for export
+        self._pending: Dict[str, float] = {}
+        self._changed = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def schedule(self, plan_id: str) -> None:
+        """Export the plan once the delay has passed; does not block"""
+        with self._changed:
+            # Keep the first due time, so a plan swapped continuously is still
+            # exported every `delay` seconds
+            self._pending.setdefault(plan_id, time.monotonic() + self.delay)
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="plan-export", daemon=True)
+                self._thread.start()
+            self._changed.notify()
+
+    def flush(self) -> None:
+        """Export every pending plan now"""
+        with self._changed:
+            plan_ids = list(self._pending)
+            self._pending.clear()
+        for plan_id in plan_ids:
+            self._export(plan_id)
+
+    def close(self) -> None:
+        """Stop the thread and export what is pending; the thread restarts on the next schedule"""
+        with self._changed:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._changed.notify()
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._changed:
+                while not self._stopping:
+                    now = time.monotonic()
+                    due = [plan_id for plan_id, at in self._pending.items() if at <= now]
+                    if due:
+                        break
+                    timeout = min(self._pending.values()) - now if self._pending else None
+                    self._changed.wait(timeout)
+                if self._stopping:
+                    return
+                for plan_id in due:
+                    del self._pending[plan_id]
+            for plan_id in due:
+                self._export(plan_id)
+
+    def _export(self, plan_id: str) -> None:
+        try:
+            plan = self.db.get_plan(plan_id)
+            # Deleted meanwhile: there is nothing to export
+            if plan is not None:
+                StorageManager.save_plan(plan_id, plan)
+                self.exported += 1
+        except Exception:
+            # A failed export must not stop later ones; the database still has the plan
+            traceback.print_exc()
@@ -0,0 +1,121 @@
+"""Retention: delete expired jobs, plans, sources and templates
+
+The sweeper runs next to the job workers. Each sweep deletes expired rows
+in batches of RETENTION_BATCH, one short transaction per batch so it never
+holds the write lock for long, removes the deleted records' files once the
+transaction commits, then returns freed database pages to the filesystem.
+
+Records are deleted children first (jobs, plans, sources, templates), so
+a record still referenced by a younger one waits for that one to expire.
+
+Databases created before incremental auto-vacuum only shrink after a
+one-time conversion, which rewrites the file under the write lock and so
+is run by hand while the service is stopped:
+
+    python -m app.retention --enable-incremental-vacuum
+"""
+import argparse
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Tuple
+
+from . import config
+from .models import DBManager
+from .utils import StorageManager
+from .utils.metrics import RETENTION_DELETED
+
+
+class RetentionSweeper:
+    """Delete records older than their retention period, with their files"""
+
+    def __init__(self, db: DBManager = None, hours: Dict[str, int] = None,
+                 batch: int = None, vacuum_pages: int = None):
+        self.db = db or DBManager()
+        self.hours = hours or {
+            "jobs": config.RETENTION_JOB_HOURS,
+            "plans": config.RETENTION_PLAN_HOURS,
+            "sources": config.RETENTION_SOURCE_HOURS,
+            "templates": config.RETENTION_TEMPLATE_HOURS,
+        }
+        self.batch = batch or config.RETENTION_BATCH
+        self.vacuum_pages = config.RETENTION_VACUUM_PAGES if vacuum_pages is None else vacuum_pages
+
+    def _kinds(self) -> List[Tuple[str, Callable[[int, int], List[str]], Callable[[str], None]]]:
+        # Children before parents, so one sweep can clear a whole chain
+        return [
+            ("jobs", self.db.delete_expired_jobs, StorageManager.delete_job),
+            ("plans", self.db.delete_expired_plans, StorageManager.delete_plan),
+            ("sources", self.db.delete_expired_sources, StorageManager.delete_source),
+            ("templates", self.db.delete_expired_templates, StorageManager.delete_template),
+        ]
+
+    def sweep(self) -> Dict[str, int]:
+        """Delete everything expired; returns the number deleted per kind"""
+        deleted = {}
+        for kind, delete_rows, delete_files in self._kinds():
+            deleted[kind] = 0
+            hours = self.hours.get(kind, 0)
+            if hours <= 0:
+                continue
+            while True:
+                ids = delete_rows(hours, self.batch)
+                for id_ in ids:
+                    delete_files(id_)
+                deleted[kind] += len(ids)
+                RETENTION_DELETED.labels(kind=kind).inc(len(ids))
+                if len(ids) < self.batch:
+                    break
+        if self.vacuum_pages:
+            deleted["vacuumed_pages"] = self.db.incremental_vacuum(self.vacuum_pages)
+        return deleted
+
+    def run_forever(self, stop: threading.Event, interval: float = None) -> None:
+        """Sweep every `interval` seconds until `stop` is set"""
+        interval = interval or config.RETENTION_SWEEP_SECONDS
+        if self.vacuum_pages and not self.db.incremental_vacuum_enabled():
+            print("Retention: database file will not shrink until converted with "
+                  "`python -m app.retention --enable-incremental-vacuum` (service stopped)")
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                deleted = self.sweep()
+                if any(deleted.values()):
+                    print(f"Retention sweep in {time.perf_counter() - started:.2f}s: {deleted}")
+            except Exception:
+                # A locked or busy database should not stop future sweeps
+                traceback.print_exc()
+            stop.wait(interval)
+
+
+def start_retention_sweeper(stop: threading.Event, db: DBManager = None) -> bool:
+    """Run the sweeper in a daemon thread until `stop` is set (unless disabled)
+    
+    Pass the process's DBManager, if it has one, so deletions also evict
+    its caches right away.
+    """
+    if config.RETENTION_SWEEP_SECONDS <= 0:
+        return False
+    threading.Thread(
+        target=RetentionSweeper(db).run_forever, args=(stop,), name="retention-sweeper", daemon=True
+    ).start()
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Retention maintenance")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="convert an older database so sweeps can shrink it (full VACUUM; stop the service first)")
+    parser.add_argument("--sweep", action="store_true", help="run one retention sweep now")
+    args = parser.parse_args()
+
+    db = DBManager()
+    if args.enable_incremental_vacuum:
+        converted = db.enable_incremental_vacuum()
+        print("Converted to incremental auto-vacuum" if converted else "Incremental auto-vacuum already enabled")
+    if args.sweep:
+        print(RetentionSweeper(db).sweep())
+
+
+if __name__ == "__main__":
+    main()
@@ -56,6 +56,12 @@ class PlanResponse(BaseModel):
     plan_id: str
     slides: List[SlideMapping]
 
+class PlanSlidesResponse(BaseModel):
+    plan_id: str
+    total: int
+    start: int
+    slides: List[SlideMapping]
+
 class SwapRequest(BaseModel):
     idx: int
     layout_id: str
@@ -66,10 +72,59 @@ class JobStatus(BaseModel):
     artifact_url: Optional[str] = None
     preview_pngs: Optional[List[str]] = None
     report: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
 
 class ExecuteResponse(BaseModel):
     job_id: str
 
+class ExportRequest(BaseModel):
+    job_ids: List[str]
+
+# Listing schemas: summaries leave out the large JSON columns
+class TemplateSummary(BaseModel):
+    id: str
+    created_at: str
+    content_hash: Optional[str] = None
+
+class SourceSummary(BaseModel):
+    id: str
+    template_id: Optional[str] = None
+    type: str
+    created_at: str
+    content_hash: Optional[str] = None
+
+class PlanSummary(BaseModel):
+    id: str
+    template_id: str
+    source_id: str
+    created_at: str
+
+class JobSummary(BaseModel):
+    id: str
+    plan_id: str
+    status: Literal["queued", "running", "done", "error"]
+    created_at: str
+    updated_at: Optional[str] = None
+    attempts: Optional[int] = None
+    error: Optional[str] = None
+    artifact_url: Optional[str] = None
+
+class TemplateList(BaseModel):
+    items: List[TemplateSummary]
+    next_cursor: Optional[str] = None
+
+class SourceList(BaseModel):
+    items: List[SourceSummary]
+    next_cursor: Optional[str] = None
+
+class PlanList(BaseModel):
+    items: List[PlanSummary]
+    next_cursor: Optional[str] = None
+
+class JobList(BaseModel):
+    items: List[JobSummary]
+    next_cursor: Optional[str] = None
+
 # Transform request schemas
 class PlanRequest(BaseModel):
     template_id: str
@@ -1,5 +1,22 @@
-"""Transformation planning and execution modules"""
+"""Transformation planning and execution modules
+
+TransformationExecutor needs python-pptx and PIL, which only job workers
+use, so it is imported on first access.
+"""
+import importlib
+
 from .planner import TransformationPlanner
-from .executor import TransformationExecutor
 
-__all__ = ["TransformationPlanner", "TransformationExecutor"]
\ No newline at end of file
+_LAZY = {
+    "TransformationExecutor": ".executor",
+}
+
+__all__ = ["TransformationPlanner", "TransformationExecutor"]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,40 +3,50 @@ from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
 from pptx.dml.color import RGBColor
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 from pathlib import Path
 import uuid
 import json
 from PIL import Image, ImageDraw, ImageFont
 import io
-import base64
+
+from ..utils import StorageManager, file_digest
+from ..utils.metrics import EXECUTOR_STAGE_SECONDS, StageTimer
 
 class TransformationExecutor:
     """Execute transformation plan to generate output PPTX"""
     
-    def __init__(self, plan: Dict, template_path: Path, source_path: Path):
+    def __init__(self, plan: Dict, template_path: Path, source_path: Path, job_id: str = None):
         self.plan = plan
-        self.template_prs = Presentation(str(template_path))
-        self.source_prs = Presentation(str(source_path))
-        self.job_id = str(uuid.uuid4())
-        self.output_prs = Presentation(str(template_path))
+        self.job_id = job_id or str(uuid.uuid4())
+        self.timer = StageTimer(EXECUTOR_STAGE_SECONDS)
         
-        # Clear template slides
-        while len(self.output_prs.slides) > 0:
-            rId = self.output_prs.slides._sldIdLst[0].rId
-            self.output_prs.part.drop_rel(rId)
-            del self.output_prs.slides._sldIdLst[0]
+        with self.timer.stage("load"):
+            self.template_prs = Presentation(str(template_path))
+            self.source_prs = Presentation(str(source_path))
+            self.output_prs = Presentation(str(template_path))
+            
+            # Clear template slides
+            while len(self.output_prs.slides) > 0:
+                rId = self.output_prs.slides._sldIdLst[0].rId
+                self.output_prs.part.drop_rel(rId)
+                del self.output_prs.slides._sldIdLst[0]
     
-    def execute(self) -> Dict[str, Any]:
-        """Execute the transformation plan"""
+    def execute(self, on_progress: Callable[[int, int], None] = None) -> Dict[str, Any]:
+        """Execute the transformation plan
+        
+        on_progress, if given, is called with (slides_done, total_slides)
+        after each slide of the plan.
+        """
         preview_pngs = []
+        total = len(self.plan["slides"])
         report = {
             "greens": 0,
             "yellows": 0,
             "issues_by_type": {}
         }
         
-        for slide_plan in self.plan["slides"]:
+        for done, slide_plan in enumerate(self.plan["slides"], start=1):
             idx = slide_plan["idx"]
             layout_id = slide_plan["chosen_layout_id"]
             issues = slide_plan["issues"]
@@ -52,20 +62,22 @@ class TransformationExecutor:
                 else:
                     layout = self.template_prs.slide_layouts[0]
                 
-                # Create new slide with template layout
-                new_slide = self.output_prs.slides.add_slide(layout)
-                
-                # Recompose content
-                overflow_text = self._recompose_slide(source_slide, new_slide, layout)
+                with self.timer.stage("recompose"):
+                    # Create new slide with template layout
+                    new_slide = self.output_prs.slides.add_slide(layout)
+                    
+                    # Recompose content
+                    overflow_text = self._recompose_slide(source_slide, new_slide, layout)
+                    
+                    # Handle overflow by creating continuation slides
+                    if overflow_text:
+                        issues.append("overflow")
+                        self._create_continuation_slides(overflow_text, layout)
                 
-                # Handle overflow by creating continuation slides
-                if overflow_text:
-                    issues.append("overflow")
-                    self._create_continuation_slides(overflow_text, layout)
-                
-                # Generate preview PNG (simplified)
-                preview = self._generate_preview(new_slide, issues)
-                preview_pngs.append(preview)
+                with self.timer.stage("preview"):
+                    # Generate preview PNG (simplified), stored by content hash
+                    preview = self._generate_preview(new_slide, issues)
+                    preview_pngs.append(StorageManager.save_preview(self.job_id, preview))
             
             # Update report
             if not issues:
@@ -76,16 +88,25 @@ class TransformationExecutor:
                     if issue not in report["issues_by_type"]:
                         report["issues_by_type"][issue] = 0
                     report["issues_by_type"][issue] += 1
+            
+            if on_progress:
+                on_progress(done, total)
         
         # Save output
-        output_path = Path(f"data/jobs/{self.job_id}/output.pptx")
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        self.output_prs.save(str(output_path))
+        with self.timer.stage("save"):
+            output_path = StorageManager.get_job_output_path(self.job_id)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            self.output_prs.save(str(output_path))
+            artifact_sha256, artifact_size = file_digest(output_path)
+            StorageManager.publish(output_path)
+        self.timer.observe()
         
         return {
             "job_id": self.job_id,
             "status": "done",
-            "artifact_url": f"/jobs/{self.job_id}/output.pptx",
+            "artifact_url": f"/jobs/{self.job_id}/download",
+            "artifact_sha256": artifact_sha256,
+            "artifact_size": artifact_size,
             "preview_pngs": preview_pngs,
             "report": report
         }
@@ -153,8 +174,8 @@ class TransformationExecutor:
             except Exception:
                 continue
     
-    def _generate_preview(self, slide, issues: List[str]) -> str:
-        """Generate a simple preview PNG as base64"""
+    def _generate_preview(self, slide, issues: List[str]) -> bytes:
+        """Generate a simple preview PNG"""
         # Create a simple preview image
         img = Image.new('RGB', (400, 300), color='white')
         draw = ImageDraw.Draw(img)
@@ -182,9 +203,6 @@ class TransformationExecutor:
             draw.rectangle([350, 260, 390, 290], fill='green')
             draw.text((360, 265), "OK", fill='white', font=font)
         
-        # Convert to base64
         buffer = io.BytesIO()
         img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
-        return f"data:image/png;base64,{img_str}"
\ No newline at end of file
+        return buffer.getvalue()
\ No newline at end of file
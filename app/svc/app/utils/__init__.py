@@ -1,4 +1,10 @@
 """Utility modules"""
 from .storage import StorageManager, validate_file_type
+from .uploads import SpooledUpload, UploadError, UploadTooLarge, UploadReceiver, receive_upload
+from .downloads import file_digest, file_download, immutable_file, stream_zip
 
-__all__ = ["StorageManager", "validate_file_type"]
\ No newline at end of file
+__all__ = [
+    "StorageManager", "validate_file_type",
+    "SpooledUpload", "UploadError", "UploadTooLarge", "UploadReceiver", "receive_upload",
+    "file_digest", "file_download", "immutable_file", "stream_zip"
+]
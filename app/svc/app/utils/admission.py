@@ -0,0 +1,96 @@
+"""Admission control: reject work early instead of queueing it without bound"""
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator
+
+
+class Overloaded(Exception):
+    """Request rejected because a capacity limit is reached"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(backlog: float, drain_per_second: float, fallback: float,
+                        minimum: int = 1, maximum: int = 300) -> int:
+    """Seconds until `backlog` units drain at the observed rate, clamped"""
+    seconds = backlog / drain_per_second if drain_per_second > 0 else fallback
+    return int(min(maximum, max(minimum, math.ceil(seconds))))
+
+
+class AdmissionController:
+    """Cap concurrent requests and the bytes they hold, with drain-rate Retry-After.
+
+    Requests past either limit are rejected immediately with 503, so
+    admitted requests keep their latency instead of everyone slowing down
+    together. Only used from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_inflight: int, max_bytes: int, window_seconds: float = 60):
+        self.max_inflight = max_inflight
+        self.max_bytes = max_bytes
+        self.window_seconds = window_seconds
+        self.inflight = 0
+        self.bytes = 0
+        self.rejected = 0
+        self._completions: Deque[float] = deque()
+        self._duration_avg = 0.0
+
+    def drain_rate(self) -> float:
+        """Requests completed per second over the recent window"""
+        cutoff = time.monotonic() - self.window_seconds
+        while self._completions and self._completions[0] < cutoff:
+            self._completions.popleft()
+        if not self._completions:
+            return 0.0
+        return len(self._completions) / self.window_seconds
+
+    def retry_after(self) -> int:
+        # One slot has to free up. Right after a burst starts the window holds
+        # few completions, so also estimate the rate from the requests in
+        # flight and their typical duration, and use the faster of the two
+        rate = self.drain_rate()
+        if self._duration_avg:
+            rate = max(rate, self.inflight / self._duration_avg)
+        return retry_after_seconds(1, rate, fallback=5, maximum=60)
+
+    @contextmanager
+    def admit(self, nbytes: int) -> Iterator[None]:
+        """Hold one slot and nbytes for the duration of the block, or raise Overloaded"""
+        if self.inflight >= self.max_inflight:
+            self.rejected += 1
+            raise Overloaded(503, "Too many documents being processed, retry later", self.retry_after())
+        # A single request over the byte limit is still admitted when idle
+        if self.bytes > 0 and self.bytes + nbytes > self.max_bytes:
+            self.rejected += 1
+            raise Overloaded(503, "Too much data being processed, retry later", self.retry_after())
+
+        self.inflight += 1
+        self.bytes += nbytes
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self.bytes -= nbytes
+            now = time.monotonic()
+            self._completions.append(now)
+            # Exponentially weighted so the estimate follows the current load
+            duration = now - started
+            self._duration_avg = duration if not self._duration_avg else 0.8 * self._duration_avg + 0.2 * duration
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "rejected": self.rejected,
+            "drain_per_second": self.drain_rate(),
+            "avg_seconds": self._duration_avg,
+        }
@@ -0,0 +1,67 @@
+"""Bounded in-process LRU cache"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .metrics import CACHE_REQUESTS
+
+
+class LRUCache:
+    """Least-recently-used cache bounded by entry count and total size.
+
+    Sizes are supplied by the caller (for decoded database records, the
+    length of the JSON they were decoded from). Values are shared between
+    callers, so they must not be modified. Thread-safe.
+    """
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = CACHE_REQUESTS.labels(cache=name, result="hit")
+        self._misses = CACHE_REQUESTS.labels(cache=name, result="miss")
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses.inc()
+                return None
+            self._entries.move_to_end(key)
+        self._hits.inc()
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        """Add or replace an entry; entries larger than max_bytes are not cached"""
+        if size > self.max_bytes or self.max_entries == 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def pop(self, key: Hashable) -> None:
+        """Drop an entry, if cached"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
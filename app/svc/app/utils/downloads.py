@@ -0,0 +1,181 @@
+"""Conditional and ranged file downloads, and streamed zip archives"""
+import hashlib
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+import aiofiles
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+# Read size for hashing and streaming files
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: Path) -> Tuple[str, int]:
+    """Return the SHA-256 hex digest and size of a file"""
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+            size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+class RangeNotSatisfiable(Exception):
+    """Requested byte range lies outside the file"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a Range header into an inclusive (start, end) pair.
+
+    Returns None when the whole file should be sent: no header, a header
+    that is not a byte range, or several ranges (which servers may ignore).
+    Raises RangeNotSatisfiable for a well-formed range outside the file.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match / If-Range header against a strong ETag"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes still match
+    candidates = (tag.strip() for tag in header.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+async def _read_range(path: Path, start: int, end: int):
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_download(request: Request, path: Path, etag: str, size: int,
+                  media_type: str, filename: str) -> Response:
+    """Serve a file with a strong ETag, If-None-Match and single byte ranges.
+
+    `etag` is the file's content hash and `size` its length; both are
+    recorded when the file is written so they need not be recomputed here.
+    """
+    etag = f'"{etag}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is outdated: send it all
+    if if_range is None or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        _read_range(path, start, end), status_code=status_code,
+        media_type=media_type, headers=headers
+    )
+
+
+def immutable_file(request: Request, path: Path, etag: str, media_type: str) -> Response:
+    """Serve a content-addressed file that browsers may cache indefinitely"""
+    etag = f'"{etag}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+class _ZipOutput:
+    """Write-only, non-seekable sink that zipfile writes archive bytes into"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries: Iterable[Tuple[str, Path]]) -> Iterator[bytes]:
+    """Yield a zip archive of (archive name, file path) entries piece by piece.
+
+    Members are stored uncompressed (PPTX files are already deflated) and
+    read in CHUNK_SIZE pieces, so memory use does not grow with the number
+    or size of files. Because the output is not seekable, sizes and CRCs are
+    written in data descriptors after each member.
+    """
+    output = _ZipOutput()
+    with zipfile.ZipFile(output, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for name, path in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname=name)
+            info.compress_type = zipfile.ZIP_STORED
+            # Very large members need zip64 headers chosen before writing
+            force_zip64 = info.file_size > zipfile.ZIP64_LIMIT
+            with open(path, "rb") as src, archive.open(info, "w", force_zip64=force_zip64) as dest:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    dest.write(chunk)
+                    yield output.drain()
+    # Remaining data descriptor and the central directory
+    yield output.drain()
@@ -0,0 +1,186 @@
+"""Prometheus metrics for ingest, planning, execution and the database
+
+Metrics live in a dedicated registry exposed at /metrics. When several
+processes record metrics (uvicorn workers, standalone job workers), set
+PROMETHEUS_MULTIPROC_DIR to a shared empty directory before they start;
+the exposition then aggregates every process's values.
+
+Services that restart independently (the API and the job workers) each
+get their own PROMETHEUS_MULTIPROC_DIR under a shared
+PROMETHEUS_MULTIPROC_ROOT, so one can clear its files on start without
+touching the others'; the exposition then aggregates the whole root.
+"""
+import asyncio
+import glob
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+
+registry = CollectorRegistry(auto_describe=True)
+
+# Parsing takes from milliseconds (small PPTX) to minutes (large scanned PDF)
+PARSE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+PAGE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+PARSE_SECONDS = Histogram(
+    "pptx_parse_seconds", "Time to parse an ingested document, by parser class",
+    ["parser"], buckets=PARSE_BUCKETS, registry=registry
+)
+DOCUMENT_PAGES = Histogram(
+    "pptx_document_pages", "Pages per parsed source document",
+    ["parser"], buckets=PAGE_BUCKETS, registry=registry
+)
+PAGES_PARSED = Counter(
+    "pptx_pages_parsed", "Source pages parsed",
+    ["parser"], registry=registry
+)
+PLAN_SECONDS = Histogram(
+    "pptx_plan_seconds", "Time to plan slide-to-layout mappings",
+    buckets=STAGE_BUCKETS, registry=registry
+)
+EXECUTOR_STAGE_SECONDS = Histogram(
+    "pptx_executor_stage_seconds",
+    "Time per job spent in each executor stage (load, recompose, preview, save)",
+    ["stage"], buckets=STAGE_BUCKETS, registry=registry
+)
+DB_QUERY_SECONDS = Histogram(
+    "pptx_db_query_seconds", "SQLite statement and transaction latency",
+    ["operation"], buckets=DB_BUCKETS, registry=registry
+)
+DB_WRITE_BATCH_SIZE = Histogram(
+    "pptx_db_write_batch_size", "API writes committed together by the database writer thread",
+    buckets=BATCH_BUCKETS, registry=registry
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "pptx_event_loop_lag_seconds", "How late the API event loop ran a timer",
+    buckets=LAG_BUCKETS, registry=registry
+)
+CACHE_REQUESTS = Counter(
+    "pptx_cache_requests", "In-process cache lookups, by cache and hit or miss",
+    ["cache", "result"], registry=registry
+)
+RETENTION_DELETED = Counter(
+    "pptx_retention_deleted", "Expired records deleted by the retention sweeper",
+    ["kind"], registry=registry
+)
+
+REQUESTS_REJECTED = Counter(
+    "pptx_requests_rejected", "Requests turned away by admission control",
+    ["endpoint"], registry=registry
+)
+
+
+class StageTimer:
+    """Accumulate time per stage across a loop, then observe each total once"""
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.totals: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - start
+
+    def observe(self) -> None:
+        for name, seconds in self.totals.items():
+            self.histogram.labels(stage=name).observe(seconds)
+
+
+class LoopLagMonitor:
+    """Measure event-loop lag: how late a timer fires past its deadline.
+
+    Anything that blocks the loop (a synchronous query, heavy CPU work)
+    delays every connection by the same amount, and shows up here.
+    """
+
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - start - self.interval)
+            self.max = max(self.max, self.last)
+            EVENT_LOOP_LAG_SECONDS.observe(self.last)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"lag_seconds": self.last, "max_lag_seconds": self.max}
+
+
+class _JobStatusCollector:
+    """Report jobs by status from the database at scrape time"""
+
+    def __init__(self, count_jobs: Callable[[], Dict[str, int]]):
+        self.count_jobs = count_jobs
+
+    def collect(self):
+        gauge = GaugeMetricFamily("pptx_jobs", "Jobs by status", labels=["status"])
+        for status, count in sorted(self.count_jobs().items()):
+            gauge.add_metric([status], count)
+        yield gauge
+
+
+class _RegistryCollector:
+    """Expose another registry's metrics alongside per-scrape collectors"""
+
+    def __init__(self, source: CollectorRegistry):
+        self.source = source
+
+    def collect(self):
+        return self.source.collect()
+
+
+class _MultiProcessRootCollector:
+    """Aggregate the metric files of every service directory under a root"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def collect(self):
+        from prometheus_client.multiprocess import MultiProcessCollector
+        files = glob.glob(os.path.join(self.root, "**", "*.db"), recursive=True)
+        return MultiProcessCollector.merge(files, accumulate=True)
+
+
+def exposition_registry(count_jobs: Callable[[], Dict[str, int]] = None) -> CollectorRegistry:
+    """Registry to scrape: this process's metrics, or all processes' in multiprocess mode"""
+    exposition = CollectorRegistry()
+    if os.environ.get("PROMETHEUS_MULTIPROC_ROOT"):
+        exposition.register(_MultiProcessRootCollector(os.environ["PROMETHEUS_MULTIPROC_ROOT"]))
+    elif os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.MultiProcessCollector(exposition)
+    else:
+        exposition.register(_RegistryCollector(registry))
+    if count_jobs is not None:
+        exposition.register(_JobStatusCollector(count_jobs))
+    return exposition
+
+
+def render_metrics(count_jobs: Callable[[], Dict[str, int]] = None) -> Tuple[bytes, str]:
+    """Render all metrics in the Prometheus text format"""
+    return generate_latest(exposition_registry(count_jobs)), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int) -> None:
+    """Serve metrics over HTTP from a background thread (for standalone workers)"""
+    from prometheus_client import start_http_server
+    start_http_server(port, registry=exposition_registry())
@@ -0,0 +1,245 @@
+"""Storage backends behind StorageManager
+
+StorageManager always works on files under its local BASE_PATH, because
+parsers and the executor need real files. A backend decides where those
+files live for good:
+
+- LocalStorage: BASE_PATH itself is the store (single node, or nodes
+  sharing a filesystem). Every hook is a no-op.
+- S3Storage: objects live in an S3-compatible bucket under the same
+  relative keys, and BASE_PATH is a read-through cache of them, trimmed to
+  S3_CACHE_MB. Nodes share nothing but the bucket and the database.
+
+boto3 is only imported when an S3Storage is created.
+"""
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Optional
+
+from .. import config
+
+# Directories under BASE_PATH holding stored objects (as opposed to the
+# database, metrics and fixtures, which are never uploaded)
+CACHED_DIRECTORIES = ("templates", "sources", "plans", "jobs", "profiles")
+
+
+class StorageBackend:
+    """Where stored files live; keys are paths relative to BASE_PATH, '/'-separated"""
+
+    def upload(self, key: str, path: Path) -> None:
+        """Publish the local file at path under key"""
+
+    def fetch(self, key: str, path: Path) -> bool:
+        """Make sure path holds the object stored under key; False if there is none"""
+        return path.exists()
+
+    def exists(self, key: str, path: Path) -> bool:
+        return path.exists()
+
+    def copy(self, src_key: str, dst_key: str) -> None:
+        """Store the object under src_key under dst_key as well"""
+
+    def delete(self, prefix: str) -> None:
+        """Delete every object whose key starts with prefix"""
+
+    def download_url(self, key: str, filename: str = None, content_type: str = None) -> Optional[str]:
+        """URL clients can download the object from directly, if the backend has one"""
+        return None
+
+    def maybe_trim_cache(self, root: Path) -> None:
+        """Drop local copies past the cache limit, if it is time to check"""
+
+
+class LocalStorage(StorageBackend):
+    """Files under BASE_PATH are the stored objects"""
+
+
+class S3Storage(StorageBackend):
+    """Objects in an S3-compatible bucket (AWS S3, MinIO, ...)
+
+    Files larger than one part are uploaded in parts, so no single request
+    carries a whole large file. `client` is a boto3 S3 client, or anything
+    with the same methods (tests pass a fake); by default one is created
+    from S3_ENDPOINT_URL and S3_REGION on first use.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", client: Any = None,
+                 part_size: int = None, cache_bytes: int = None, url_seconds: int = None):
+        if client is None:
+            # Fail at startup rather than on the first upload
+            try:
+                import boto3
+            except ImportError as e:
+                raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install -r requirements.txt)") from e
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self._client = client
+        self.part_size = part_size or config.S3_PART_MB * 1024 * 1024
+        self.cache_bytes = config.S3_CACHE_MB * 1024 * 1024 if cache_bytes is None else cache_bytes
+        self.url_seconds = url_seconds or config.S3_URL_SECONDS
+        self._trim_lock = threading.Lock()
+        self._last_trim = 0.0
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            import boto3
+            self._client = boto3.client(
+                "s3", endpoint_url=config.S3_ENDPOINT_URL, region_name=config.S3_REGION
+            )
+        return self._client
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def upload(self, key: str, path: Path) -> None:
+        size = path.stat().st_size
+        if size <= self.part_size:
+            with open(path, "rb") as f:
+                self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=f.read())
+            return
+
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self._key(key))["UploadId"]
+        try:
+            parts = []
+            with open(path, "rb") as f:
+                number = 1
+                while True:
+                    chunk = f.read(self.part_size)
+                    if not chunk:
+                        break
+                    response = self.client.upload_part(
+                        Bucket=self.bucket, Key=self._key(key), UploadId=upload_id,
+                        PartNumber=number, Body=chunk
+                    )
+                    parts.append({"PartNumber": number, "ETag": response["ETag"]})
+                    number += 1
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self._key(key), UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            # Parts of an unfinished upload are billed until aborted
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self._key(key), UploadId=upload_id)
+            raise
+
+    def fetch(self, key: str, path: Path) -> bool:
+        if path.exists():
+            # Mark as recently used so cache trimming keeps hot files
+            os.utime(path)
+            return True
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            if _is_not_found(e):
+                return False
+            raise
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter(lambda: response["Body"].read(1024 * 1024), b""):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return True
+
+    def exists(self, key: str, path: Path) -> bool:
+        if path.exists():
+            return True
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except Exception as e:
+            if _is_not_found(e):
+                return False
+            raise
+
+    def copy(self, src_key: str, dst_key: str) -> None:
+        self.client.copy_object(
+            Bucket=self.bucket, Key=self._key(dst_key),
+            CopySource={"Bucket": self.bucket, "Key": self._key(src_key)}
+        )
+
+    def delete(self, prefix: str) -> None:
+        token = None
+        while True:
+            kwargs = {"Bucket": self.bucket, "Prefix": self._key(prefix)}
+            if token:
+                kwargs["ContinuationToken"] = token
+            listing = self.client.list_objects_v2(**kwargs)
+            objects = [{"Key": item["Key"]} for item in listing.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True})
+            if not listing.get("IsTruncated"):
+                return
+            token = listing["NextContinuationToken"]
+
+    def download_url(self, key: str, filename: str = None, content_type: str = None) -> Optional[str]:
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if filename:
+            params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+        if content_type:
+            params["ResponseContentType"] = content_type
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=self.url_seconds)
+
+    def maybe_trim_cache(self, root: Path) -> None:
+        # Trimming walks the cache, so do it at most once a minute
+        now = time.monotonic()
+        if now - self._last_trim < 60:
+            return
+        self._last_trim = now
+        self.trim_cache(root)
+
+    def trim_cache(self, root: Path) -> None:
+        """Delete the least recently used local copies until the cache fits.
+
+        Files modified in the last ten minutes are kept: they may still be
+        being written, before their upload.
+        """
+        if not self._trim_lock.acquire(blocking=False):
+            return
+        try:
+            files, total = [], 0
+            for kind in CACHED_DIRECTORIES:
+                for dirpath, dirnames, filenames in os.walk(root / kind):
+                    # Spooled uploads are not cached objects
+                    dirnames[:] = [d for d in dirnames if d != ".spool"]
+                    for name in filenames:
+                        path = Path(dirpath) / name
+                        try:
+                            stat = path.stat()
+                        except FileNotFoundError:
+                            continue
+                        files.append((stat.st_mtime, stat.st_size, path))
+                        total += stat.st_size
+            cutoff = time.time() - 600
+            for mtime, size, path in sorted(files):
+                if total <= self.cache_bytes:
+                    break
+                if mtime > cutoff:
+                    continue
+                path.unlink(missing_ok=True)
+                total -= size
+        finally:
+            self._trim_lock.release()
+
+
+def _is_not_found(error: Exception) -> bool:
+    """Whether an S3 client error means the object does not exist"""
+    response = getattr(error, "response", None) or {}
+    code = str(response.get("Error", {}).get("Code", ""))
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+def create_backend() -> StorageBackend:
+    """Backend selected by STORAGE_BACKEND"""
+    if config.STORAGE_BACKEND == "s3":
+        if not config.S3_BUCKET:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        return S3Storage(config.S3_BUCKET, config.S3_PREFIX)
+    return LocalStorage()
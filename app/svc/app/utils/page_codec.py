@@ -0,0 +1,112 @@
+"""Compact encoding of source page signatures for the database
+
+Pages used to be stored as JSON text, repeating every key on every page and
+costing a full json.loads per read. They are now stored as a blob: a magic
+prefix and format byte, then a zlib-compressed body.
+
+- Format 1: one fixed-width record per page (see PAGE_RECORD), followed by
+  the warnings of the pages that have any, as JSON.
+- Format 2: the pages as JSON, for pages that do not fit the fixed record
+  (unexpected keys or value types), so encoding is always lossless.
+
+decode_pages also accepts the JSON text of rows written before this
+encoding, so callers never need to know which one a row holds.
+"""
+import json
+import struct
+import zlib
+from typing import Any, Dict, List, Union
+
+MAGIC = b"PG"
+FORMAT_RECORDS = 1
+FORMAT_JSON = 2
+
+# idx, title, bullets, columns, images, table, image coverage, text coverage.
+# Coverage stays float64 so decoded signatures compare equal to parsed ones
+PAGE_RECORD = struct.Struct("<I?IBI?dd")
+_COUNT = struct.Struct("<I")
+
+# Roughly what a page took as JSON, to size caches of decoded pages the way
+# they were sized before; the encoded blob is far smaller than its decoded form
+PAGE_SIZE_ESTIMATE = 180
+
+_PAGE_KEYS = {"idx", "signature", "warnings"}
+_SIGNATURE_TYPES = {"title": bool, "bullets": int, "columns": int, "images": int, "table": bool}
+
+
+def encode_pages(pages: List[Dict[str, Any]]) -> bytes:
+    """Encode page signatures as parsed by the source parsers"""
+    # Warnings are keyed by idx, so records also need distinct indexes
+    if all(_fits_record(page) for page in pages) and len({page["idx"] for page in pages}) == len(pages):
+        body = bytearray(_COUNT.pack(len(pages)))
+        warnings = {}
+        for page in pages:
+            signature = page["signature"]
+            body += PAGE_RECORD.pack(
+                page["idx"], signature["title"], signature["bullets"], signature["columns"],
+                signature["images"], signature["table"],
+                signature["coverage"]["image"], signature["coverage"]["text"]
+            )
+            if page["warnings"]:
+                warnings[page["idx"]] = page["warnings"]
+        body += json.dumps(warnings, separators=(",", ":")).encode()
+        return MAGIC + bytes([FORMAT_RECORDS]) + zlib.compress(bytes(body))
+    body = json.dumps(pages, separators=(",", ":")).encode()
+    return MAGIC + bytes([FORMAT_JSON]) + zlib.compress(body)
+
+
+def decode_pages(data: Union[bytes, str]) -> List[Dict[str, Any]]:
+    """Pages from encode_pages output, or from legacy JSON text"""
+    if isinstance(data, str):
+        return json.loads(data)
+    if data[:2] != MAGIC:
+        raise ValueError("Not an encoded page list")
+    body = zlib.decompress(data[3:])
+    if data[2] == FORMAT_JSON:
+        return json.loads(body)
+    if data[2] != FORMAT_RECORDS:
+        raise ValueError(f"Unknown page encoding format {data[2]}")
+
+    (count,) = _COUNT.unpack_from(body)
+    end = _COUNT.size + count * PAGE_RECORD.size
+    warnings = json.loads(body[end:])
+    pages = []
+    for idx, title, bullets, columns, images, table, image, text in PAGE_RECORD.iter_unpack(body[_COUNT.size:end]):
+        pages.append({
+            "idx": idx,
+            "signature": {
+                "title": title,
+                "bullets": bullets,
+                "columns": columns,
+                "images": images,
+                "table": table,
+                "coverage": {"image": image, "text": text}
+            },
+            "warnings": warnings.get(str(idx), [])
+        })
+    return pages
+
+
+def _fits_record(page: Any) -> bool:
+    """Whether a page round-trips exactly through a fixed-width record"""
+    if not isinstance(page, dict) or page.keys() != _PAGE_KEYS:
+        return False
+    signature = page["signature"]
+    if not isinstance(signature, dict) or signature.keys() != {*_SIGNATURE_TYPES, "coverage"}:
+        return False
+    # type() rather than isinstance(): bool is an int, and must stay a bool
+    if any(type(signature[key]) is not kind for key, kind in _SIGNATURE_TYPES.items()):
+        return False
+    coverage = signature["coverage"]
+    if not isinstance(coverage, dict) or coverage.keys() != {"image", "text"}:
+        return False
+    if any(type(value) is not float for value in coverage.values()):
+        return False
+    warnings = page["warnings"]
+    if not isinstance(warnings, list) or not all(isinstance(w, str) for w in warnings):
+        return False
+    return (
+        type(page["idx"]) is int and 0 <= page["idx"] < 2 ** 32
+        and 0 <= signature["bullets"] < 2 ** 32 and 0 <= signature["images"] < 2 ** 32
+        and 0 <= signature["columns"] < 2 ** 8
+    )
@@ -0,0 +1,24 @@
+"""Opaque cursors for keyset-paginated listings"""
+import base64
+import json
+from typing import Optional, Tuple
+
+
+def encode_cursor(key: Optional[Tuple[str, str]]) -> Optional[str]:
+    """Cursor for the page after `key`, or None when there is no next page"""
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Key encoded in a cursor; raises ValueError for malformed cursors"""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+    if not (isinstance(key, list) and len(key) == 2 and all(isinstance(part, str) for part in key)):
+        raise ValueError("Invalid cursor")
+    return key[0], key[1]
@@ -0,0 +1,95 @@
+"""Opt-in sampling profiler that writes collapsed stacks
+
+Collapsed stacks are one line per distinct stack, frames joined by ';' and
+followed by a sample count. They load directly into speedscope or
+flamegraph.pl to produce a flamegraph.
+"""
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .storage import StorageManager
+
+PROFILE_FILENAME = "stacks.collapsed"
+
+# Profile IDs become directory names, so only accept uuid-like IDs
+_PROFILE_ID = re.compile(r"^[0-9a-f-]{8,64}$")
+
+
+class SamplingProfiler:
+    """Sample one thread's stack at a fixed interval from a background thread.
+
+    Sampling keeps overhead low enough to profile production inputs, unlike
+    tracing every call with cProfile.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: int = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Samples in collapsed-stack format, most frequent first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def valid_profile_id(profile_id: str) -> bool:
+    return bool(_PROFILE_ID.match(profile_id))
+
+
+def get_profile_path(profile_id: str) -> Path:
+    """Get the collapsed-stack file of a profile"""
+    return StorageManager.BASE_PATH / "profiles" / profile_id / PROFILE_FILENAME
+
+
+@contextmanager
+def profiled(profile_id: Optional[str], interval: float = 0.005) -> Iterator[None]:
+    """Profile the current thread and save the result under profile_id.
+
+    Does nothing when profile_id is None, so call sites need no branching.
+    """
+    if profile_id is None:
+        yield
+        return
+
+    profiler = SamplingProfiler(interval)
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        path = get_profile_path(profile_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(profiler.collapsed())
+        StorageManager.publish(path)
+        print(f"Profile {profile_id}: {sum(profiler.samples.values())} samples "
+              f"over {time.perf_counter() - started:.2f}s")
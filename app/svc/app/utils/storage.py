@@ -1,15 +1,63 @@
 """Storage management utilities"""
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
+import os
 import shutil
+import uuid
 import hashlib
+import io
 import json
+import zipfile
+
+from .object_storage import StorageBackend, create_backend
 
 class StorageManager:
-    """Manage file storage operations"""
+    """Manage file storage operations
+    
+    Files are read and written under BASE_PATH; the storage backend
+    (STORAGE_BACKEND) publishes written files and fetches missing ones, so
+    BASE_PATH is either the store itself or a local cache of it.
+    """
     
     BASE_PATH = Path("data")
     
+    # Created from STORAGE_BACKEND on first use; assign to use another one
+    backend: Optional[StorageBackend] = None
+    
+    @classmethod
+    def get_backend(cls) -> StorageBackend:
+        if cls.backend is None:
+            cls.backend = create_backend()
+        return cls.backend
+    
+    @classmethod
+    def _key(cls, path: Path) -> str:
+        return path.relative_to(cls.BASE_PATH).as_posix()
+    
+    @classmethod
+    def publish(cls, path: Path) -> None:
+        """Store a file written under BASE_PATH with the backend"""
+        cls.get_backend().upload(cls._key(path), path)
+    
+    @classmethod
+    def fetch(cls, path: Path) -> Optional[Path]:
+        """Local copy of a stored file under BASE_PATH, or None if it is not stored"""
+        backend = cls.get_backend()
+        if not backend.fetch(cls._key(path), path):
+            return None
+        backend.maybe_trim_cache(cls.BASE_PATH)
+        return path
+    
+    @classmethod
+    def exists(cls, path: Path) -> bool:
+        """Whether a file under BASE_PATH is stored, without fetching it"""
+        return cls.get_backend().exists(cls._key(path), path)
+    
+    @classmethod
+    def _delete_tree(cls, path: Path) -> None:
+        shutil.rmtree(path, ignore_errors=True)
+        cls.get_backend().delete(cls._key(path) + "/")
+    
     @classmethod
     def ensure_directories(cls):
         """Ensure all required directories exist"""
@@ -18,82 +66,187 @@ class StorageManager:
             (cls.BASE_PATH / dir_name).mkdir(parents=True, exist_ok=True)
     
     @classmethod
-    def save_template(cls, file_content: bytes, template_id: str) -> Path:
-        """Save template file"""
+    def new_spool_path(cls, kind: str) -> Path:
+        """Unique spool path inside the final storage directory for `kind`.
+
+        Spooling next to the final location keeps the later commit a rename
+        on the same filesystem instead of a copy.
+        """
+        path = cls.BASE_PATH / kind / ".spool" / f"{uuid.uuid4()}.part"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+    
+    @classmethod
+    def commit_template(cls, spool_path: Path, template_id: str) -> Path:
+        """Move a spooled upload into place as a template file"""
         path = cls.BASE_PATH / "templates" / template_id / "template.pptx"
         path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_bytes(file_content)
+        os.replace(spool_path, path)
+        cls.publish(path)
         return path
     
     @classmethod
-    def save_source(cls, file_content: bytes, source_id: str, ext: str) -> Path:
-        """Save source file"""
+    def commit_source(cls, spool_path: Path, source_id: str, ext: str) -> Path:
+        """Move a spooled upload into place as a source file"""
         path = cls.BASE_PATH / "sources" / source_id / f"source.{ext}"
         path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_bytes(file_content)
+        os.replace(spool_path, path)
+        cls.publish(path)
+        return path
+    
+    @classmethod
+    def link_source(cls, existing_source_id: str, source_id: str, ext: str) -> Optional[Path]:
+        """Store a source under a new ID by hardlinking (or copying) an identical existing file"""
+        existing = cls.BASE_PATH / "sources" / existing_source_id / f"source.{ext}"
+        if not cls.exists(existing):
+            return None
+        path = cls.BASE_PATH / "sources" / source_id / f"source.{ext}"
+        if existing.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(existing, path)
+            except OSError:
+                # Filesystem without hardlink support
+                shutil.copyfile(existing, path)
+        cls.get_backend().copy(cls._key(existing), cls._key(path))
         return path
     
+    @classmethod
+    def delete_source(cls, source_id: str) -> None:
+        """Remove a source's stored files"""
+        cls._delete_tree(cls.BASE_PATH / "sources" / source_id)
+    
+    @classmethod
+    def delete_template(cls, template_id: str) -> None:
+        """Remove a template's stored files"""
+        cls._delete_tree(cls.BASE_PATH / "templates" / template_id)
+    
     @classmethod
     def get_template_path(cls, template_id: str) -> Optional[Path]:
         """Get template file path"""
-        path = cls.BASE_PATH / "templates" / template_id / "template.pptx"
-        return path if path.exists() else None
+        return cls.fetch(cls.BASE_PATH / "templates" / template_id / "template.pptx")
+    
+    @classmethod
+    def template_exists(cls, template_id: str) -> bool:
+        """Whether a template file is stored, without fetching it"""
+        return cls.exists(cls.BASE_PATH / "templates" / template_id / "template.pptx")
+    
+    @classmethod
+    def source_exists(cls, source_id: str, ext: str) -> bool:
+        """Whether a source file is stored, without fetching it"""
+        return cls.exists(cls.BASE_PATH / "sources" / source_id / f"source.{ext}")
     
     @classmethod
     def get_source_path(cls, source_id: str) -> Optional[Path]:
         """Get source file path"""
         for ext in ["pptx", "pdf"]:
-            path = cls.BASE_PATH / "sources" / source_id / f"source.{ext}"
-            if path.exists():
+            path = cls.fetch(cls.BASE_PATH / "sources" / source_id / f"source.{ext}")
+            if path:
                 return path
         return None
     
     @classmethod
     def save_plan(cls, plan_id: str, plan_data: dict) -> Path:
-        """Save plan as JSON"""
+        """Export a plan as JSON (the database holds the plan itself)"""
         path = cls.BASE_PATH / "plans" / f"{plan_id}.json"
         path.parent.mkdir(parents=True, exist_ok=True)
         path.write_text(json.dumps(plan_data, indent=2))
+        cls.publish(path)
         return path
     
     @classmethod
     def get_plan(cls, plan_id: str) -> Optional[dict]:
-        """Load plan from JSON"""
-        path = cls.BASE_PATH / "plans" / f"{plan_id}.json"
-        if path.exists():
+        """Load an exported plan; only a fallback for plans missing from the database"""
+        path = cls.fetch(cls.BASE_PATH / "plans" / f"{plan_id}.json")
+        if path:
             return json.loads(path.read_text())
         return None
     
+    @classmethod
+    def delete_plan(cls, plan_id: str) -> None:
+        """Remove a plan's JSON file"""
+        path = cls.BASE_PATH / "plans" / f"{plan_id}.json"
+        path.unlink(missing_ok=True)
+        cls.get_backend().delete(cls._key(path))
+    
+    @classmethod
+    def delete_job(cls, job_id: str) -> None:
+        """Remove a job's output, previews and profile"""
+        cls._delete_tree(cls.BASE_PATH / "jobs" / job_id)
+        cls._delete_tree(cls.BASE_PATH / "profiles" / job_id)
+    
     @classmethod
     def get_job_output_path(cls, job_id: str) -> Path:
-        """Get job output file path"""
+        """Get job output file path (local; call publish() once written)"""
         return cls.BASE_PATH / "jobs" / job_id / "output.pptx"
+    
+    @classmethod
+    def fetch_job_output(cls, job_id: str) -> Optional[Path]:
+        """Local copy of a job's output, or None if there is none"""
+        return cls.fetch(cls.get_job_output_path(job_id))
+    
+    @classmethod
+    def download_url(cls, path: Path, filename: str = None, content_type: str = None) -> Optional[str]:
+        """Direct download URL of a stored file, when the backend serves files itself"""
+        return cls.get_backend().download_url(cls._key(path), filename, content_type)
+    
+    @classmethod
+    def save_preview(cls, job_id: str, png: bytes) -> str:
+        """Store a preview PNG under its content hash and return the hash.
+        
+        Identical previews within a job share one file.
+        """
+        digest = hashlib.sha256(png).hexdigest()
+        path = cls.get_preview_path(job_id, digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.part")
+            tmp_path.write_bytes(png)
+            os.replace(tmp_path, path)
+            cls.publish(path)
+        return digest
+    
+    @classmethod
+    def get_preview_path(cls, job_id: str, digest: str) -> Path:
+        """Get the path of a job's preview PNG by content hash"""
+        return cls.BASE_PATH / "jobs" / job_id / "previews" / f"{digest}.png"
+
+def validate_file_type(file_content: Union[bytes, Path], expected_types: list) -> tuple[bool, str]:
+    """Validate file type using simple checks.
 
-def validate_file_type(file_content: bytes, expected_types: list) -> tuple[bool, str]:
-    """Validate file type using simple checks"""
+    Accepts the file bytes or a path; for a path only the header and the ZIP
+    central directory are read.
+    """
     try:
+        if isinstance(file_content, Path):
+            with open(file_content, "rb") as f:
+                header = f.read(4)
+            archive = file_content
+        else:
+            header = file_content[:4]
+            # BytesIO shares the buffer of the upload bytes rather than copying them
+            archive = io.BytesIO(file_content)
+        
         # Check for PPTX (ZIP signature with specific structure)
         if "pptx" in expected_types:
             # PPTX files start with PK (ZIP signature)
-            if file_content[:2] == b'PK':
-                # Additional check: try to find PPTX-specific content
-                import zipfile
-                import io
+            if header[:2] == b'PK':
+                # Only the central directory is read
                 try:
-                    with zipfile.ZipFile(io.BytesIO(file_content)) as zf:
-                        if any('ppt/' in name for name in zf.namelist()):
+                    with zipfile.ZipFile(archive) as zf:
+                        if any(name.startswith('ppt/') for name in zf.namelist()):
                             return True, "pptx"
-                except:
+                except zipfile.BadZipFile:
                     pass
         
         # Check for PDF
         if "pdf" in expected_types:
             # PDF files start with %PDF
-            if file_content[:4] == b'%PDF':
+            if header == b'%PDF':
                 return True, "pdf"
         
         # If we get here, file type not recognized
         return False, "unknown"
         
     except Exception as e:
-        return False, str(e)
\ No newline at end of file
+        return False, str(e)
@@ -0,0 +1,302 @@
+"""Streaming multipart upload handling"""
+import hashlib
+import tarfile
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiofiles
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+# Request body documentation for endpoints that stream their uploads
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+# Request body documentation for endpoints that accept several files
+BATCH_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "file": {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                            "description": "PPTX/PDF files, or zip/tar archives of them"
+                        }
+                    },
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+class UploadError(Exception):
+    """Malformed upload request"""
+
+
+class UploadTooLarge(UploadError):
+    """Upload exceeded the configured size limit"""
+
+
+@dataclass
+class SpooledUpload:
+    """An uploaded file streamed to a spool path"""
+    path: Path
+    filename: str
+    size: int = 0
+    sha256: str = ""
+    _hasher: "hashlib._Hash" = field(default_factory=hashlib.sha256, repr=False)
+
+    def discard(self) -> None:
+        """Remove the spool file if it is still there"""
+        self.path.unlink(missing_ok=True)
+
+
+class UploadReceiver:
+    """Stream multipart file parts to spool files with incremental hashing.
+
+    Only one network chunk per upload is held in memory at a time. Each file
+    part is hashed and size-checked as it arrives, so an oversized upload is
+    rejected as soon as it crosses the limit instead of after it is buffered.
+    """
+
+    def __init__(self, request: Request, spool_factory: Callable[[], Path],
+                 max_size: int, max_files: int = 1, field_name: str = "file"):
+        self.request = request
+        self.spool_factory = spool_factory
+        self.max_size = max_size
+        self.max_files = max_files
+        self.field_name = field_name
+        self.uploads: List[SpooledUpload] = []
+        self._current: Optional[SpooledUpload] = None
+        self._pending: List[Tuple[SpooledUpload, bytes]] = []
+        self._finished: List[SpooledUpload] = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+
+    def on_part_begin(self) -> None:
+        self._current = None
+        self._disposition = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        if name != self.field_name or b"filename" not in options:
+            # Non-file form fields are skipped
+            return
+        if len(self.uploads) >= self.max_files:
+            raise UploadError(f"Too many files. Maximum is {self.max_files}")
+        self._current = SpooledUpload(
+            path=self.spool_factory(),
+            filename=options[b"filename"].decode("utf-8", "replace")
+        )
+        self.uploads.append(self._current)
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        upload = self._current
+        if upload is None:
+            return
+        chunk = data[start:end]
+        upload.size += len(chunk)
+        if upload.size > self.max_size:
+            raise UploadTooLarge(f"File too large. Maximum size is {self.max_size // (1024 * 1024)}MB")
+        upload._hasher.update(chunk)
+        self._pending.append((upload, chunk))
+
+    def on_part_end(self) -> None:
+        if self._current is not None:
+            self._current.sha256 = self._current._hasher.hexdigest()
+            self._finished.append(self._current)
+        self._current = None
+
+    async def receive(self) -> List[SpooledUpload]:
+        """Consume the request body and return the spooled uploads"""
+        content_type = self.request.headers.get("content-type", "")
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not content_type.startswith("multipart/form-data") or not boundary:
+            raise UploadError("Expected a multipart/form-data upload")
+
+        # Reject obviously oversized bodies before reading anything
+        content_length = self.request.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            # Allow a little room for multipart framing per file
+            limit = (self.max_size + 64 * 1024) * self.max_files
+            if int(content_length) > limit:
+                raise UploadTooLarge(f"File too large. Maximum size is {self.max_size // (1024 * 1024)}MB")
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        })
+
+        files: Dict[Path, object] = {}
+        try:
+            async for chunk in self.request.stream():
+                parser.write(chunk)
+                await self._flush(files)
+            parser.finalize()
+            await self._flush(files)
+        except Exception:
+            for f in files.values():
+                await f.close()
+            for upload in self.uploads:
+                upload.discard()
+            raise
+        finally:
+            self._pending.clear()
+
+        if not self.uploads:
+            raise UploadError(f"Missing file field '{self.field_name}'")
+        if any(not upload.sha256 for upload in self.uploads):
+            for upload in self.uploads:
+                upload.discard()
+            raise UploadError("Incomplete multipart upload")
+        return self.uploads
+
+    async def _flush(self, files: Dict[Path, object]) -> None:
+        """Write chunks queued by the parser callbacks to their spool files.
+
+        Callbacks cannot await, so data is queued per network chunk and
+        written here; finished parts are closed right away.
+        """
+        for upload, chunk in self._pending:
+            await (await self._open(files, upload)).write(chunk)
+        self._pending.clear()
+        for upload in self._finished:
+            await (await self._open(files, upload)).close()
+            del files[upload.path]
+        self._finished.clear()
+
+    async def _open(self, files: Dict[Path, object], upload: SpooledUpload):
+        f = files.get(upload.path)
+        if f is None:
+            upload.path.parent.mkdir(parents=True, exist_ok=True)
+            f = files[upload.path] = await aiofiles.open(upload.path, "wb")
+        return f
+
+
+# Document types accepted inside batch archives
+ARCHIVE_DOCUMENT_EXTENSIONS = (".pptx", ".pdf")
+
+
+def expand_archive(upload: SpooledUpload, spool_factory: Callable[[], Path], max_size: int,
+                   max_files: int) -> Optional[Tuple[List[SpooledUpload], List[str]]]:
+    """Extract the documents of a zip or tar upload into their own spool files.
+
+    Returns the extracted documents and the names of members skipped for
+    not being PPTX or PDF, or None when the upload is not an archive (a PPTX
+    is a zip too, but one with ppt/ entries). Members are copied in chunks
+    with the same hashing and size limit as direct uploads. Blocking; call
+    from a thread.
+    """
+    with open(upload.path, "rb") as f:
+        if f.read(4) == b"%PDF":
+            return None
+
+    if zipfile.is_zipfile(upload.path):
+        with zipfile.ZipFile(upload.path) as zf:
+            names = zf.namelist()
+            if any(name.startswith("ppt/") for name in names):
+                return None
+            members = [
+                (info.filename, info.file_size, lambda info=info: zf.open(info))
+                for info in zf.infolist() if not info.is_dir()
+            ]
+            return _extract_members(members, spool_factory, max_size, max_files)
+
+    if tarfile.is_tarfile(upload.path):
+        with tarfile.open(upload.path) as tf:
+            members = [
+                (info.name, info.size, lambda info=info: tf.extractfile(info))
+                for info in tf.getmembers() if info.isfile()
+            ]
+            return _extract_members(members, spool_factory, max_size, max_files)
+
+    return None
+
+
+def _extract_members(members: list, spool_factory: Callable[[], Path], max_size: int,
+                     max_files: int) -> Tuple[List[SpooledUpload], List[str]]:
+    documents = []
+    skipped = []
+    for name, size, opener in members:
+        # macOS resource forks and hidden files are archiver metadata, not uploads
+        if Path(name).name.startswith((".", "__MACOSX")) or "__MACOSX/" in name:
+            continue
+        if name.lower().endswith(ARCHIVE_DOCUMENT_EXTENSIONS):
+            documents.append((name, size, opener))
+        else:
+            skipped.append(Path(name).name)
+    if len(documents) > max_files:
+        raise UploadError(f"Too many files. Maximum is {max_files}")
+
+    extracted: List[SpooledUpload] = []
+    try:
+        for name, size, opener in documents:
+            if size > max_size:
+                raise UploadTooLarge(f"File too large: {name}")
+            upload = SpooledUpload(path=spool_factory(), filename=Path(name).name)
+            extracted.append(upload)
+            with opener() as src, open(upload.path, "wb") as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    upload.size += len(chunk)
+                    if upload.size > max_size:
+                        # Declared sizes can lie; enforce the limit on actual bytes
+                        raise UploadTooLarge(f"File too large: {name}")
+                    upload._hasher.update(chunk)
+                    dst.write(chunk)
+            upload.sha256 = upload._hasher.hexdigest()
+    except BaseException:
+        for upload in extracted:
+            upload.discard()
+        raise
+    return extracted, skipped
+
+
+async def receive_upload(request: Request, spool_factory: Callable[[], Path],
+                         max_size: int) -> SpooledUpload:
+    """Stream a single multipart file upload to a spool file"""
+    uploads = await UploadReceiver(request, spool_factory, max_size).receive()
+    return uploads[0]
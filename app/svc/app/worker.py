@@ -0,0 +1,212 @@
+"""Job queue worker: claims leased jobs from the database and executes them
+
+Run standalone worker processes with:
+
+    python -m app.worker --processes 4
+
+The parent process also runs the retention sweeper (see app.retention).
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from . import config
+from .events import job_event_bus
+from .models import DBManager
+from .retention import start_retention_sweeper
+from .utils import StorageManager
+from .utils.metrics import start_metrics_server
+from .utils.profiling import profiled
+
+
+class ProgressReporter:
+    """Record per-slide progress events, throttled to JOB_PROGRESS_INTERVAL_MS"""
+
+    def __init__(self, db: DBManager, job_id: str, interval: float = None):
+        self.db = db
+        self.job_id = job_id
+        self.interval = config.JOB_PROGRESS_INTERVAL_MS / 1000 if interval is None else interval
+        self._last = 0.0
+
+    def __call__(self, completed: int, total: int) -> None:
+        now = time.monotonic()
+        if completed < total and now - self._last < self.interval:
+            return
+        self._last = now
+        self.db.add_job_event(self.job_id, "progress", {"completed": completed, "total": total})
+        job_event_bus.notify(self.job_id)
+
+
+def execute_job(job_id: str, plan: Dict,
+                on_progress: Callable[[int, int], None] = None) -> Dict[str, Any]:
+    """Run the transformation for a job and return its results"""
+    from .transformers import TransformationExecutor
+
+    template_path = StorageManager.get_template_path(plan["template_id"])
+    source_path = StorageManager.get_source_path(plan["source_id"])
+
+    if not template_path or not source_path:
+        raise Exception(f"Files not found - Template: {template_path}, Source: {source_path}")
+
+    executor = TransformationExecutor(plan, template_path, source_path, job_id=job_id)
+    return executor.execute(on_progress=on_progress)
+
+
+class JobWorker:
+    """Claim jobs with a lease, keep the lease alive while running, record results.
+
+    If a worker dies mid-job its lease stops being renewed; once it expires
+    another worker claims the job again, up to JOB_MAX_ATTEMPTS attempts.
+    """
+
+    def __init__(self, db: DBManager = None, worker_id: str = None,
+                 lease_seconds: float = None, max_attempts: int = None,
+                 poll_interval: float = None):
+        self.db = db or DBManager()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds or config.JOB_LEASE_SECONDS
+        self.max_attempts = max_attempts or config.JOB_MAX_ATTEMPTS
+        self.poll_interval = poll_interval or config.JOB_POLL_INTERVAL_MS / 1000
+
+    def run_once(self) -> bool:
+        """Claim and run one job; returns False when the queue is empty"""
+        job = self.db.claim_job(self.worker_id, self.lease_seconds, self.max_attempts)
+        if job is None:
+            return False
+
+        job_id = job["id"]
+        job_event_bus.notify(job_id)
+        print(f"Starting job {job_id} (attempt {job['attempts']}) on {self.worker_id}")
+
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, done), daemon=True)
+        heartbeat.start()
+        error = None
+        try:
+            plan = self.db.get_plan(job["plan_id"]) or StorageManager.get_plan(job["plan_id"])
+            if not plan:
+                raise Exception(f"Plan {job['plan_id']} not found")
+
+            profile_id = job_id if job["profile"] else None
+            with profiled(profile_id, config.PROFILE_INTERVAL_MS / 1000):
+                result = execute_job(job_id, plan, ProgressReporter(self.db, job_id))
+            if profile_id:
+                result["report"]["profile_url"] = f"/profiles/{profile_id}"
+        except Exception as e:
+            error = e
+            print(f"Job {job_id} failed with error: {str(e)}")
+            traceback.print_exc()
+        finally:
+            done.set()
+            heartbeat.join()
+
+        if error is not None:
+            # Failures raised by the job itself are deterministic, so they are
+            # not retried; only jobs whose worker vanished are
+            self.db.fail_job(job_id, self.worker_id, str(error), retry=False)
+            job_event_bus.notify(job_id)
+            return True
+
+        if self.db.complete_job(job_id, self.worker_id, result["artifact_url"],
+                                result["preview_pngs"], result["report"],
+                                result["artifact_sha256"], result["artifact_size"]):
+            job_event_bus.notify(job_id)
+            print(f"Job {job_id} completed successfully")
+        else:
+            print(f"Job {job_id} finished after its lease was lost; result discarded")
+        return True
+
+    def run_forever(self, stop: threading.Event) -> None:
+        """Process jobs until `stop` is set, sleeping while the queue is empty"""
+        while not stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception:
+                # Database hiccups should not kill the worker
+                traceback.print_exc()
+            stop.wait(self.poll_interval)
+
+    def _heartbeat(self, job_id: str, done: threading.Event) -> None:
+        """Renew the lease every third of its length until the job finishes"""
+        while not done.wait(self.lease_seconds / 3):
+            if not self.db.heartbeat_job(job_id, self.worker_id, self.lease_seconds):
+                print(f"Lost lease on job {job_id}")
+                return
+
+
+def start_embedded_workers(count: int, db: DBManager = None) -> Optional[threading.Event]:
+    """Start worker threads, and the retention sweeper, inside the current process (development mode)
+    
+    The sweeper uses `db`, the API's DBManager, so its deletions evict the
+    API's caches.
+    """
+    if count <= 0:
+        return None
+    stop = threading.Event()
+    start_retention_sweeper(stop, db)
+    for i in range(count):
+        worker = JobWorker()
+        threading.Thread(
+            target=worker.run_forever, args=(stop,), name=f"job-worker-{i}", daemon=True
+        ).start()
+    return stop
+
+
+def _worker_process() -> None:
+    """Entry point of one standalone worker process"""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    JobWorker().run_forever(stop)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run transformation job workers")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on this port")
+    args = parser.parse_args()
+
+    StorageManager.ensure_directories()
+    DBManager()
+
+    if args.metrics_port:
+        if args.processes > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            print("Set PROMETHEUS_MULTIPROC_DIR to include worker processes in metrics")
+        start_metrics_server(args.metrics_port)
+
+    # One sweeper per worker deployment, in this (parent) process
+    start_retention_sweeper(threading.Event())
+
+    if args.processes <= 1:
+        _worker_process()
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_worker_process, name=f"job-worker-{i}")
+                 for i in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
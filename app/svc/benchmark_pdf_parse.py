@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Benchmark parallel PDF parsing against the sequential parser
+
+Generates a PDF (or uses the one given), parses it through a ParsePool of
+1, 2, 4, ... workers up to the core count, with as many page ranges in
+flight, and reports the speedup of each run and whether its signatures are
+identical to the sequential parse. Worker processes are started before the
+clock starts, as they are long-lived in the service.
+
+    python benchmark_pdf_parse.py --pages 400 --chunk-pages 50
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from app.parsers import ParsePool
+from app.parsers.pool import count_pdf_pages
+
+
+def create_benchmark_pdf(path: Path, pages: int) -> Path:
+    """Create a PDF cycling through title, bullet, two-column, image and table pages"""
+    c = canvas.Canvas(str(path), pagesize=letter)
+    width, height = letter
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 30), (200, 30, 30)).save(buf, "PNG")
+    image = ImageReader(io.BytesIO(buf.getvalue()))
+    for n in range(pages):
+        c.setFont("Helvetica-Bold", 28)
+        c.drawString(50, height - 60, f"Slide {n}")
+        c.setFont("Helvetica", 12)
+        kind = n % 5
+        if kind == 1:
+            for i in range(6):
+                c.drawString(70, height - 120 - 22 * i, f"• Point {i} on page {n}")
+        elif kind == 2:
+            for i in range(4):
+                c.drawString(50, height - 120 - 20 * i, f"- Left item {i}")
+                c.drawString(width / 2 + 50, height - 120 - 20 * i, f"- Right item {i}")
+        elif kind == 3:
+            c.drawImage(image, 50, height - 400, 200, 150)
+            c.drawImage(image, 300, height - 400, 120, 90)
+        elif kind == 4:
+            for row in range(5):
+                c.line(50, height - 120 - 25 * row, 450, height - 120 - 25 * row)
+                for col in range(4):
+                    c.drawString(55 + 100 * col, height - 138 - 25 * row, f"R{row}C{col}")
+            for col in range(5):
+                c.line(50 + 100 * col, height - 120, 50 + 100 * col, height - 220)
+        c.showPage()
+    c.save()
+    return path
+
+
+async def timed_parse(pool: ParsePool, path: Path) -> tuple:
+    """Start every worker, then time one parse; returns (seconds, pages)"""
+    await asyncio.gather(*(pool.run(count_pdf_pages, str(path)) for _ in range(pool.max_workers)))
+    started = time.perf_counter()
+    result = await pool.run_source(str(path), "benchmark", "pdf")
+    return time.perf_counter() - started, result["pages"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark parallel PDF parsing")
+    parser.add_argument("pdf", nargs="?", help="PDF to parse (default: a generated one)")
+    parser.add_argument("--pages", type=int, default=400, help="pages of the generated PDF")
+    parser.add_argument("--chunk-pages", type=int, default=50, help="pages per range")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1,
+                        help="largest worker count to try (default: CPU count)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(args.pdf) if args.pdf else create_benchmark_pdf(Path(tmp) / "benchmark.pdf", args.pages)
+
+        workers = [1]
+        while workers[-1] * 2 <= args.max_workers:
+            workers.append(workers[-1] * 2)
+        if workers[-1] != args.max_workers:
+            workers.append(args.max_workers)
+
+        print(f"{path.name}: {os.cpu_count()} cores, chunks of {args.chunk_pages} pages")
+        baseline = None
+        for count in workers:
+            pool = ParsePool(max_workers=count, max_concurrency=count,
+                             pdf_workers=count, pdf_chunk_pages=args.chunk_pages)
+            try:
+                seconds, pages = asyncio.run(timed_parse(pool, path))
+            finally:
+                pool.shutdown()
+            signatures = json.dumps(pages)
+            if baseline is None:
+                baseline = (seconds, signatures)
+            print(f"  {count:3d} workers  {len(pages):5d} pages  {seconds:7.2f}s  "
+                  f"speedup {baseline[0] / seconds:5.2f}x  identical: {signatures == baseline[1]}")
+
+
+if __name__ == "__main__":
+    main()
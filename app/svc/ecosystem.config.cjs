@@ -1,9 +1,11 @@
 module.exports = {
   apps: [
     {
+      // Multiple uvicorn workers on port 8000; jobs run in pptx-worker
       name: 'pptx-backend',
-      script: 'venv/bin/uvicorn',
-      args: 'app.main:app --host 0.0.0.0 --port 8000 --reload',
+      script: './start_backend.sh',
+      args: 'prod',
+      interpreter: 'bash',
       cwd: '/home/user/webapp/app/svc',
       env: {
         PYTHONUNBUFFERED: '1',
@@ -12,6 +14,19 @@ module.exports = {
       watch: false,
       instances: 1,
       exec_mode: 'fork'
+    },
+    {
+      name: 'pptx-worker',
+      script: './start_backend.sh',
+      args: 'worker',
+      interpreter: 'bash',
+      cwd: '/home/user/webapp/app/svc',
+      env: {
+        PYTHONUNBUFFERED: '1'
+      },
+      watch: false,
+      instances: 1,
+      exec_mode: 'fork'
     }
   ]
-}
+}
\ No newline at end of file
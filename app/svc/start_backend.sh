@@ -1,4 +1,46 @@
 #!/bin/bash
-cd /home/user/webapp/app/svc
-source venv/bin/activate
-uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
+# Usage: start_backend.sh [dev|prod|worker]
+#   dev     single uvicorn process with --reload and an embedded job worker (default)
+#   prod    WEB_CONCURRENCY uvicorn workers behind one port, no reload, no embedded job worker
+#   worker  standalone job worker processes (run alongside prod)
+set -e
+cd "$(dirname "$0")"
+if [ -f venv/bin/activate ]; then
+    source venv/bin/activate
+fi
+
+MODE="${1:-dev}"
+CORES="$(nproc 2>/dev/null || echo 2)"
+
+# Several processes share data/db.sqlite (WAL mode) and the data/ directory;
+# metrics from all of them are aggregated under PROMETHEUS_MULTIPROC_ROOT.
+# Each service (mode and host) writes its own subdirectory and clears only
+# that one on start, so restarting the API never wipes a running worker's
+# metric files (and vice versa)
+prod_env() {
+    export EMBEDDED_WORKERS=0
+    export PARSE_WORKERS="${PARSE_WORKERS:-2}"
+    export PROMETHEUS_MULTIPROC_ROOT="${PROMETHEUS_MULTIPROC_ROOT:-${PROMETHEUS_MULTIPROC_DIR:-data/prometheus}}"
+    export PROMETHEUS_MULTIPROC_DIR="$PROMETHEUS_MULTIPROC_ROOT/$MODE-$(hostname)"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    # Metric files of this service's previous run would be summed with the new ones
+    rm -f "$PROMETHEUS_MULTIPROC_DIR"/*.db
+}
+
+case "$MODE" in
+    dev)
+        exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+        ;;
+    prod)
+        prod_env
+        exec uvicorn app.main:app --host 0.0.0.0 --port "${PORT:-8000}" --workers "${WEB_CONCURRENCY:-$CORES}"
+        ;;
+    worker)
+        prod_env
+        exec python -m app.worker --processes "${JOB_WORKERS:-$CORES}"
+        ;;
+    *)
+        echo "Unknown mode: $MODE (expected dev, prod or worker)" >&2
+        exit 1
+        ;;
+esac
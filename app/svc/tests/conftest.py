@@ -0,0 +1,21 @@
+"""Shared fixtures: a database and storage directory per test"""
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import models
+from app.models import DBManager
+from app.utils import StorageManager
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Point the database and file storage at a temporary directory"""
+    monkeypatch.setattr(models, "DB_PATH", tmp_path / "db.sqlite")
+    monkeypatch.setattr(StorageManager, "BASE_PATH", tmp_path / "data")
+    return tmp_path
+
+@pytest.fixture
+def db(data_dir):
+    """Database manager on a fresh SQLite file, with storage in the same directory"""
+    return DBManager()
@@ -0,0 +1,56 @@
+"""Tests for ingest admission control"""
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils.admission import AdmissionController, Overloaded, retry_after_seconds
+
+def test_inflight_limit():
+    """Test requests past the in-flight limit are rejected until a slot frees"""
+    controller = AdmissionController(max_inflight=2, max_bytes=1000)
+
+    with controller.admit(10), controller.admit(10):
+        with pytest.raises(Overloaded) as e:
+            with controller.admit(10):
+                pass
+        assert e.value.status_code == 503
+        assert e.value.retry_after >= 1
+
+    with controller.admit(10):
+        assert controller.inflight == 1
+    assert controller.stats()["rejected"] == 1
+    assert controller.bytes == 0
+
+def test_byte_limit():
+    """Test the byte budget is shared, but one large request is admitted alone"""
+    controller = AdmissionController(max_inflight=10, max_bytes=100)
+
+    with controller.admit(500):
+        with pytest.raises(Overloaded):
+            with controller.admit(1):
+                pass
+
+    with controller.admit(60):
+        with controller.admit(40):
+            assert controller.bytes == 100
+
+def test_retry_after_follows_drain_rate():
+    """Test Retry-After is the backlog divided by the drain rate"""
+    assert retry_after_seconds(10, drain_per_second=2.0, fallback=30) == 5
+    assert retry_after_seconds(1, drain_per_second=100.0, fallback=30) == 1
+    assert retry_after_seconds(5, drain_per_second=0.0, fallback=30) == 30
+    assert retry_after_seconds(10000, drain_per_second=1.0, fallback=30, maximum=600) == 600
+
+def test_retry_after_uses_recent_completions():
+    """Test completions within the window raise the drain rate"""
+    controller = AdmissionController(max_inflight=1, max_bytes=1000, window_seconds=10)
+    for _ in range(20):
+        with controller.admit(1):
+            pass
+
+    assert controller.drain_rate() == pytest.approx(2.0)
+    assert controller.retry_after() == 1
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,431 @@
+"""End-to-end tests of the ingest and job endpoints"""
+import base64
+import io
+import json
+import pytest
+import time
+import zipfile
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+from starlette.websockets import WebSocketDisconnect
+
+from app import config
+from app.async_db import AsyncDBManager
+from app.events import job_event_bus
+from app.models import DBManager
+from app.parsers import ParsePool
+from app.utils import StorageManager
+from app.utils.object_storage import S3Storage
+from app.utils.downloads import file_digest
+from app.utils.admission import AdmissionController
+
+FIXTURES = Path(__file__).parent.parent / "data" / "fixtures"
+TEMPLATE = FIXTURES / "templates" / "brand_simple.pptx"
+SOURCE = FIXTURES / "sources" / "mini_5slide.pptx"
+PDF_SOURCE = FIXTURES / "sources" / "mini_pdf_5page.pdf"
+
+@pytest.fixture
+def client(data_dir, monkeypatch):
+    """API client on a temporary database and storage, without job workers"""
+    from app import main
+    monkeypatch.setattr(config, "EMBEDDED_WORKERS", 0)
+    monkeypatch.setattr(main, "db", AsyncDBManager(DBManager()))
+    # Its semaphore belongs to one event loop, and each client runs its own
+    monkeypatch.setattr(main, "parse_pool", ParsePool(max_workers=1))
+    with TestClient(main.app) as client:
+        yield client
+
+def ingest(client: TestClient, path: Path, endpoint: str, **params) -> dict:
+    """Upload a file and return the JSON response"""
+    response = client.post(endpoint, params=params, files={"file": (path.name, path.read_bytes())})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_reingested_template_returns_existing_id(client, data_dir):
+    """Test uploading the same template twice returns one template"""
+    first = ingest(client, TEMPLATE, "/templates/ingest")
+    second = ingest(client, TEMPLATE, "/templates/ingest")
+
+    assert second["template_id"] == first["template_id"]
+    assert second["layout_catalog"] == first["layout_catalog"]
+    assert len(client.get("/templates").json()["items"]) == 1
+    assert list((data_dir / "data" / "templates" / ".spool").iterdir()) == []
+
+def test_reingested_source_returns_existing_id(client):
+    """Test uploading the same source for the same template returns one source"""
+    template_id = ingest(client, TEMPLATE, "/templates/ingest")["template_id"]
+
+    first = ingest(client, SOURCE, "/sources/ingest", template_id=template_id)
+    second = ingest(client, SOURCE, "/sources/ingest", template_id=template_id)
+
+    assert second["source_id"] == first["source_id"]
+    assert second["pages"] == first["pages"]
+    assert len(client.get("/sources", params={"template_id": template_id}).json()["items"]) == 1
+
+def test_source_with_missing_file_parsed_again(client):
+    """Test a re-upload whose earlier stored file is gone is parsed and stored anew"""
+    template_id = ingest(client, TEMPLATE, "/templates/ingest")["template_id"]
+    first = ingest(client, SOURCE, "/sources/ingest", template_id=template_id)
+    StorageManager.delete_source(first["source_id"])
+
+    second = ingest(client, SOURCE, "/sources/ingest", template_id=template_id)
+    third = ingest(client, SOURCE, "/sources/ingest", template_id=template_id)
+
+    assert second["source_id"] != first["source_id"]
+    assert StorageManager.get_source_path(second["source_id"]) is not None
+    # Later uploads reuse the source that has its file
+    assert third["source_id"] == second["source_id"]
+
+def test_source_not_deduplicated_across_templates(client):
+    """Test the same source under another template gets its own ID and row"""
+    first_template = ingest(client, TEMPLATE, "/templates/ingest")["template_id"]
+    first = ingest(client, SOURCE, "/sources/ingest", template_id=first_template)
+    # A second template with different bytes
+    other = TEMPLATE.read_bytes() + b"\0"
+    response = client.post("/templates/ingest", files={"file": ("other.pptx", other)})
+    second_template = response.json()["template_id"]
+    assert second_template != first_template
+
+    second = ingest(client, SOURCE, "/sources/ingest", template_id=second_template)
+
+    assert second["source_id"] != first["source_id"]
+    assert second["pages"] == first["pages"]
+    for template_id, source_id in [(first_template, first["source_id"]),
+                                   (second_template, second["source_id"])]:
+        items = client.get("/sources", params={"template_id": template_id}).json()["items"]
+        assert [item["id"] for item in items] == [source_id]
+
+def ingest_batch(client: TestClient, template_id: str, files: list) -> list:
+    """Upload a batch and return its NDJSON lines"""
+    response = client.post("/sources/ingest:batch", params={"template_id": template_id},
+                           files=[("file", file) for file in files])
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_batch_ingest_streams_a_line_per_file(client, data_dir):
+    """Test a batch reports each file, parses duplicates once and ends with a summary"""
+    template_id = ingest(client, TEMPLATE, "/templates/ingest")["template_id"]
+    source = SOURCE.read_bytes()
+
+    lines = ingest_batch(client, template_id, [
+        ("a.pptx", source), ("copy.pptx", source), ("bad.pdf", b"not a document")
+    ])
+
+    results = {line["filename"]: line for line in lines[:-1]}
+    assert set(results) == {"a.pptx", "copy.pptx", "bad.pdf"}
+    assert results["a.pptx"]["source_id"] == results["copy.pptx"]["source_id"]
+    assert len(results["a.pptx"]["pages"]) == 5
+    assert "error" in results["bad.pdf"]
+    assert lines[-1] == {"summary": {"ingested": 2, "failed": 1}}
+    items = client.get("/sources", params={"template_id": template_id}).json()["items"]
+    assert [item["id"] for item in items] == [results["a.pptx"]["source_id"]]
+    assert list((data_dir / "data" / "sources" / ".spool").iterdir()) == []
+
+def test_batch_ingest_expands_archives(client, data_dir):
+    """Test archive members are ingested, and unsupported ones reported as failed"""
+    template_id = ingest(client, TEMPLATE, "/templates/ingest")["template_id"]
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("decks/a.pptx", SOURCE.read_bytes())
+        zf.writestr("b.pdf", PDF_SOURCE.read_bytes())
+        zf.writestr("c.txt", b"notes")
+        zf.writestr("__MACOSX/decks/._a.pptx", b"junk")
+
+    lines = ingest_batch(client, template_id, [("bundle.zip", archive.getvalue())])
+
+    results = {line["filename"]: line for line in lines[:-1]}
+    assert set(results) == {"a.pptx", "b.pdf", "c.txt"}
+    assert results["a.pptx"]["type"] == "pptx"
+    assert results["b.pdf"]["type"] == "pdf"
+    assert results["c.txt"]["error"] == "Invalid file type. Expected PPTX or PDF"
+    assert lines[-1] == {"summary": {"ingested": 2, "failed": 1}}
+    assert len(client.get("/sources", params={"template_id": template_id}).json()["items"]) == 2
+    assert list((data_dir / "data" / "sources" / ".spool").iterdir()) == []
+
+def test_full_job_queue_returns_429(client, monkeypatch):
+    """Test execute is rejected with Retry-After once the queue is full, without queueing"""
+    monkeypatch.setattr(config, "JOB_MAX_QUEUED", 1)
+    template_id = ingest(client, TEMPLATE, "/templates/ingest")["template_id"]
+    source_id = ingest(client, SOURCE, "/sources/ingest", template_id=template_id)["source_id"]
+    response = client.post("/transform/plan", json={"template_id": template_id, "source_id": source_id})
+    plan_id = response.json()["plan_id"]
+
+    assert client.post("/transform/execute", params={"plan_id": plan_id}).status_code == 200
+    response = client.post("/transform/execute", params={"plan_id": plan_id})
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert len(client.get("/jobs").json()["items"]) == 1
+
+def test_overloaded_ingest_returns_503(client, monkeypatch):
+    """Test ingest is rejected with Retry-After while every slot is taken"""
+    from app import main
+    monkeypatch.setattr(main, "ingest_admission", AdmissionController(1, 1024 * 1024))
+
+    with main.ingest_admission.admit(0):
+        response = client.post("/templates/ingest", files={"file": (TEMPLATE.name, TEMPLATE.read_bytes())})
+
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
+    assert client.get("/templates").json()["items"] == []
+
+def create_plan(client: TestClient) -> dict:
+    """Plan the fixture source onto the fixture template and return the plan"""
+    template_id = ingest(client, TEMPLATE, "/templates/ingest")["template_id"]
+    source_id = ingest(client, SOURCE, "/sources/ingest", template_id=template_id)["source_id"]
+    response = client.post("/transform/plan", json={"template_id": template_id, "source_id": source_id})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def create_job(client: TestClient) -> str:
+    """Queue a job for a plan of the fixture source"""
+    response = client.post("/transform/execute", params={"plan_id": create_plan(client)["plan_id"]})
+    return response.json()["job_id"]
+
+def add_run_events(db, job_id: str) -> None:
+    """Record a worker running the job to completion"""
+    db.add_job_event(job_id, "running", {"status": "running"})
+    db.add_job_event(job_id, "progress", {"done": 1, "total": 2})
+    db.add_job_event(job_id, "done", {"status": "done"})
+
+def read_sse(response) -> list:
+    """Parse a Server-Sent Events body into (id, event, data) tuples"""
+    events = []
+    for message in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines())
+        events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return events
+
+def test_job_events_stream_until_done(client, db):
+    """Test the SSE stream sends events in order, resumes after an ID and ends on done"""
+    job_id = create_job(client)
+    add_run_events(db, job_id)
+
+    response = client.get(f"/jobs/{job_id}/events")
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = read_sse(response)
+    assert [event for _, event, _ in events] == ["queued", "running", "progress", "done"]
+    assert events[2][2] == {"done": 1, "total": 2}
+    running_id = events[1][0]
+    resumed = read_sse(client.get(f"/jobs/{job_id}/events", params={"after": running_id}))
+    assert [event for _, event, _ in resumed] == ["progress", "done"]
+    # A reconnecting EventSource's Last-Event-ID takes precedence
+    resumed = read_sse(client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": running_id}))
+    assert [event for _, event, _ in resumed] == ["progress", "done"]
+    assert client.get("/jobs/missing/events").status_code == 404
+
+def test_job_events_websocket_until_done(client, db):
+    """Test the WebSocket sends events in order, resumes after an ID and closes on done"""
+    job_id = create_job(client)
+    add_run_events(db, job_id)
+
+    for after, expected in [(0, ["queued", "running", "progress", "done"]), (2, ["progress", "done"])]:
+        events = []
+        with client.websocket_connect(f"/jobs/{job_id}/ws?after={after}") as websocket:
+            with pytest.raises(WebSocketDisconnect) as closed:
+                while True:
+                    events.append(websocket.receive_json())
+        assert [event["event"] for event in events] == expected
+        assert closed.value.code == 1000
+    assert events[0]["data"] == {"done": 1, "total": 2}
+
+def test_job_events_websocket_unknown_job(client):
+    """Test the WebSocket for an unknown job is closed with 4404"""
+    with client.websocket_connect("/jobs/missing/ws") as websocket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+
+    assert closed.value.code == 4404
+
+def test_job_events_websocket_stops_on_disconnect(client):
+    """Test a client leaving a quiet job's WebSocket stops its stream"""
+    job_id = create_job(client)
+
+    with client.websocket_connect(f"/jobs/{job_id}/ws") as websocket:
+        assert websocket.receive_json()["event"] == "queued"
+        assert job_id in job_event_bus._waiters
+
+    deadline = time.monotonic() + 5
+    while job_id in job_event_bus._waiters and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job_id not in job_event_bus._waiters
+
+def finish_job(db, job_id: str, output: bytes, previews: list = ()) -> None:
+    """Store a job's output and previews, and complete it as a worker would"""
+    path = StorageManager.get_job_output_path(job_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(output)
+    StorageManager.publish(path)
+    assert db.claim_job("w1", lease_seconds=60, max_attempts=1)["id"] == job_id
+    sha256, size = file_digest(StorageManager.get_job_output_path(job_id))
+    assert db.complete_job(job_id, "w1", f"/jobs/{job_id}/download", list(previews), {}, sha256, size)
+
+def test_download_supports_etag_and_ranges(client, db):
+    """Test downloads revalidate by ETag and serve single byte ranges"""
+    job_id = create_job(client)
+    assert client.get(f"/jobs/{job_id}/download").status_code == 400
+    finish_job(db, job_id, b"0123456789")
+
+    response = client.get(f"/jobs/{job_id}/download")
+
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    etag = response.headers["etag"]
+    assert etag == f'"{db.get_job(job_id)["artifact_sha256"]}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    response = client.get(f"/jobs/{job_id}/download", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    response = client.get(f"/jobs/{job_id}/download", headers={"Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 2-5/10"
+    assert response.content == b"2345"
+    response = client.get(f"/jobs/{job_id}/download", headers={"Range": "bytes=10-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */10"
+    assert client.get("/jobs/missing/download").status_code == 404
+
+def test_export_streams_outputs_as_zip(client, db):
+    """Test the export zip holds each job's output, named by job ID in request order"""
+    job_ids = [create_job(client), create_job(client)]
+    for n, job_id in enumerate(job_ids):
+        finish_job(db, job_id, f"output {n}".encode())
+
+    response = client.post("/jobs/export", json={"job_ids": job_ids[::-1]})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+        assert zf.namelist() == [f"{job_id}.pptx" for job_id in job_ids[::-1]]
+        assert zf.read(f"{job_ids[0]}.pptx") == b"output 0"
+    assert client.post("/jobs/export", json={"job_ids": [job_ids[0], "missing"]}).status_code == 404
+    queued = create_job(client)
+    assert client.post("/jobs/export", json={"job_ids": [queued]}).status_code == 400
+
+def test_previews_served_from_storage(client, db, monkeypatch):
+    """Test previews are listed by URL, served from local files or redirected to S3"""
+    job_id = create_job(client)
+    digest = StorageManager.save_preview(job_id, b"png bytes")
+    legacy = "data:image/png;base64," + base64.b64encode(b"old png").decode()
+    finish_job(db, job_id, b"output", [digest, legacy])
+
+    job = client.get(f"/jobs/{job_id}").json()
+
+    assert job["preview_pngs"] == [f"/jobs/{job_id}/previews/0.png", legacy]
+    response = client.get(job["preview_pngs"][0])
+    assert response.status_code == 200
+    assert response.content == b"png bytes"
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["etag"] == f'"{digest}"'
+    assert "immutable" in response.headers["cache-control"]
+    response = client.get(job["preview_pngs"][0], headers={"If-None-Match": f'"{digest}"'})
+    assert response.status_code == 304
+    assert client.get(f"/jobs/{job_id}/previews/1.png").content == b"old png"
+    assert client.get(f"/jobs/{job_id}/previews/2.png").status_code == 404
+    assert client.get("/jobs/missing/previews/0.png").status_code == 404
+
+    boto3 = pytest.importorskip("boto3")
+    s3 = boto3.client("s3", region_name="us-east-1",
+                      aws_access_key_id="test", aws_secret_access_key="test")
+    monkeypatch.setattr(StorageManager, "backend", S3Storage("bucket", "prefix", client=s3))
+    response = client.get(f"/jobs/{job_id}/previews/0.png", follow_redirects=False)
+    assert response.status_code == 307
+    location = response.headers["location"]
+    assert location.startswith(f"https://bucket.s3.amazonaws.com/prefix/jobs/{job_id}/previews/{digest}.png?")
+    assert "response-content-type=image%2Fpng" in location
+
+def test_swap_layout_updates_one_slide(client, db):
+    """Test a swap rewrites only its slide's row and returns the whole plan"""
+    plan = create_plan(client)
+    plan_id = plan["plan_id"]
+    layout_id = "swapped-layout"
+
+    response = client.post(f"/plans/{plan_id}/swap", json={"idx": 2, "layout_id": layout_id})
+
+    assert response.status_code == 200
+    slides = response.json()["slides"]
+    assert [slide["idx"] for slide in slides] == list(range(len(plan["slides"])))
+    assert slides[2]["chosen_layout_id"] == layout_id
+    assert slides[:2] + slides[3:] == plan["slides"][:2] + plan["slides"][3:]
+    rows = db.execute("SELECT idx FROM plan_slides WHERE plan_id = ? AND chosen_layout_id = ?",
+                      (plan_id, layout_id))
+    assert [row[0] for row in rows] == [2]
+    response = client.post(f"/plans/{plan_id}/swap", json={"idx": len(slides), "layout_id": layout_id})
+    assert response.status_code == 400
+    response = client.post("/plans/missing/swap", json={"idx": 0, "layout_id": layout_id})
+    assert response.status_code == 404
+
+def test_plan_slides_sliced_by_index(client):
+    """Test the slides endpoint returns the slides with start <= idx < end and the total"""
+    plan = create_plan(client)
+    plan_id = plan["plan_id"]
+
+    page = client.get(f"/plans/{plan_id}/slides", params={"start": 1, "end": 3}).json()
+
+    assert page == {"plan_id": plan_id, "total": 5, "start": 1, "slides": plan["slides"][1:3]}
+    page = client.get(f"/plans/{plan_id}/slides", params={"start": 3}).json()
+    assert page["slides"] == plan["slides"][3:]
+    page = client.get(f"/plans/{plan_id}/slides", params={"start": 9}).json()
+    assert (page["total"], page["slides"]) == (5, [])
+    assert client.get(f"/plans/{plan_id}/slides", params={"start": -1}).status_code == 422
+    assert client.get("/plans/missing/slides").status_code == 404
+
+def metric_value(client: TestClient, name: str, **labels) -> float:
+    """Read a sample from the /metrics exposition, 0 when absent"""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            if sample.name == name and sample.labels == labels:
+                return sample.value
+    return 0.0
+
+def test_metrics_include_parse_and_job_metrics(client, monkeypatch):
+    """Test /metrics reports parses by parser, planning time and jobs by status"""
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_ROOT", raising=False)
+    parses = metric_value(client, "pptx_parse_seconds_count", parser="PPTXParser")
+    pages = metric_value(client, "pptx_pages_parsed_total", parser="PPTXParser")
+    plans = metric_value(client, "pptx_plan_seconds_count")
+
+    create_job(client)
+
+    assert metric_value(client, "pptx_parse_seconds_count", parser="PPTXParser") == parses + 1
+    assert metric_value(client, "pptx_pages_parsed_total", parser="PPTXParser") == pages + 5
+    assert metric_value(client, "pptx_parse_seconds_count", parser="TemplateParser") >= 1
+    assert metric_value(client, "pptx_plan_seconds_count") == plans + 1
+    assert metric_value(client, "pptx_jobs", status="queued") == 1
+
+def test_profiles_require_admin_token(client, monkeypatch):
+    """Test profiling and profile downloads need ADMIN_TOKEN, and profile IDs are checked"""
+    from app.utils.profiling import get_profile_path
+    profile_id = "0123abcd-0000"
+    path = get_profile_path(profile_id)
+    path.parent.mkdir(parents=True)
+    path.write_text("main (main.py:1) 3\n")
+    response = client.post("/templates/ingest", params={"profile": "1"},
+                           files={"file": (TEMPLATE.name, TEMPLATE.read_bytes())})
+    assert response.status_code == 403
+    assert client.get(f"/profiles/{profile_id}", headers={"X-Admin-Token": ""}).status_code == 403
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    admin = {"X-Admin-Token": "secret"}
+
+    assert client.get(f"/profiles/{profile_id}").status_code == 403
+    assert client.get(f"/profiles/{profile_id}", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.get(f"/profiles/{profile_id}", headers=admin)
+    assert response.status_code == 200
+    assert response.text == "main (main.py:1) 3\n"
+    assert response.headers["content-type"].startswith("text/plain")
+    assert client.get("/profiles/0123abcd-ffff", headers=admin).status_code == 404
+    # IDs name directories, so anything but a uuid-like ID is not looked up
+    assert client.get("/profiles/not-a-profile", headers=admin).status_code == 404
+    assert client.get("/profiles/..%2F..%2Fdb.sqlite", headers=admin).status_code == 404
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
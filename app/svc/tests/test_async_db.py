@@ -0,0 +1,75 @@
+"""Tests for the awaitable database manager"""
+import asyncio
+import sqlite3
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import models
+from app.async_db import AsyncDBManager
+from app.utils.metrics import LoopLagMonitor
+
+@pytest.fixture
+def adb(data_dir):
+    """Async database manager on a fresh SQLite file"""
+    manager = AsyncDBManager(read_threads=2)
+    yield manager
+    manager.close()
+
+def test_reads_see_committed_writes(adb):
+    """Test awaited writes are visible to the reads that follow them"""
+    async def scenario():
+        await adb.insert_job("j1", "p1")
+        return await adb.get_job("j1")
+
+    assert asyncio.run(scenario())["status"] == "queued"
+
+def test_concurrent_writes_are_batched(adb):
+    """Test writes queued together commit in fewer transactions"""
+    commits = []
+    commit = adb._commit
+    adb._commit = lambda batch: (commits.append(len(batch)), commit(batch))
+
+    async def scenario():
+        await asyncio.gather(*(adb.insert_job(f"j{i}", "p1") for i in range(50)))
+        return await adb.count_jobs_by_status()
+
+    assert asyncio.run(scenario()) == {"queued": 50}
+    assert sum(commits) == 50
+    assert len(commits) < 50
+
+def test_failed_write_does_not_affect_batch(adb):
+    """Test a failing write raises alone while the rest of its batch commits"""
+    async def scenario():
+        return await asyncio.gather(
+            adb.insert_job("j1", "p1"),
+            adb.insert_job("j1", "p1"),
+            adb.insert_job("j2", "p1"),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert isinstance(results[1], sqlite3.IntegrityError)
+    assert adb.db.count_jobs_by_status() == {"queued": 2}
+
+def test_event_loop_responsive_while_database_locked(adb):
+    """Test the event loop keeps running while writes wait for the lock"""
+    blocker = sqlite3.connect(str(models.DB_PATH), isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+
+    async def scenario():
+        monitor = LoopLagMonitor(interval=0.01)
+        task = asyncio.create_task(monitor.run())
+        writes = asyncio.gather(*(adb.insert_job(f"j{i}", "p1") for i in range(20)))
+        await asyncio.sleep(0.3)
+        blocker.execute("COMMIT")
+        await writes
+        task.cancel()
+        return monitor.max
+
+    assert asyncio.run(scenario()) < 0.05
+    assert adb.db.count_jobs_by_status() == {"queued": 20}
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
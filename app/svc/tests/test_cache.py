@@ -0,0 +1,48 @@
+"""Tests for the LRU cache"""
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils.cache import LRUCache
+
+def test_evicts_least_recently_used():
+    """Test the least recently used entry is evicted past the entry limit"""
+    cache = LRUCache("test", max_entries=2, max_bytes=100)
+    cache.put("a", 1, 1)
+    cache.put("b", 2, 1)
+    assert cache.get("a") == 1
+    cache.put("c", 3, 1)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+def test_bounded_by_bytes():
+    """Test entries are evicted to stay within the byte limit"""
+    cache = LRUCache("test", max_entries=10, max_bytes=100)
+    cache.put("a", "x", 60)
+    cache.put("b", "y", 30)
+    cache.put("c", "z", 30)
+
+    assert cache.get("a") is None
+    assert cache.bytes == 60
+    cache.put("huge", "w", 101)
+    assert cache.get("huge") is None
+    assert len(cache) == 2
+
+def test_replace_and_pop():
+    """Test replacing an entry updates the size and pop removes it"""
+    cache = LRUCache("test", max_entries=10, max_bytes=100)
+    cache.put("a", 1, 10)
+    cache.put("a", 2, 20)
+    assert cache.get("a") == 2
+    assert cache.bytes == 20
+
+    cache.pop("a")
+    cache.pop("missing")
+    assert cache.get("a") is None
+    assert cache.bytes == 0
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,129 @@
+"""Tests for conditional, ranged and zipped downloads"""
+import hashlib
+import io
+import pytest
+import zipfile
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.utils import StorageManager
+from app.utils.downloads import (
+    RangeNotSatisfiable, file_digest, file_download, immutable_file, parse_range, stream_zip
+)
+
+def create_test_app(path: Path):
+    """Create an app that serves one file with its digest as ETag"""
+    app = FastAPI()
+    sha256, size = file_digest(path)
+
+    @app.get("/file")
+    async def get_file(request: Request):
+        return file_download(request, path, sha256, size, "application/octet-stream", "out.bin")
+
+    return TestClient(app), f'"{sha256}"'
+
+def test_parse_range():
+    """Test Range header parsing"""
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+def test_full_download_has_validators(tmp_path):
+    """Test a plain GET returns the file with ETag and Accept-Ranges"""
+    content = bytes(range(256)) * 10
+    path = tmp_path / "out.bin"
+    path.write_bytes(content)
+    client, etag = create_test_app(path)
+
+    response = client.get("/file")
+
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["etag"] == etag
+    assert response.headers["accept-ranges"] == "bytes"
+
+def test_if_none_match_returns_304(tmp_path):
+    """Test a matching If-None-Match returns 304 without a body"""
+    path = tmp_path / "out.bin"
+    path.write_bytes(b"abc")
+    client, etag = create_test_app(path)
+
+    response = client.get("/file", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/file", headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_range_request(tmp_path):
+    """Test byte ranges return 206 with the requested slice"""
+    content = bytes(range(256)) * 10
+    path = tmp_path / "out.bin"
+    path.write_bytes(content)
+    client, etag = create_test_app(path)
+
+    response = client.get("/file", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == content[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(content)}"
+
+    # A stale If-Range sends the whole file again
+    response = client.get("/file", headers={"Range": "bytes=100-199", "If-Range": '"old"'})
+    assert response.status_code == 200
+    assert response.content == content
+
+    response = client.get("/file", headers={"Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(content)}"
+
+def test_stream_zip(tmp_path):
+    """Test streamed zip archives hold every member intact"""
+    files = {}
+    for i in range(3):
+        path = tmp_path / f"{i}.pptx"
+        path.write_bytes(hashlib.sha256(str(i).encode()).digest() * (i * 50000 + 1))
+        files[f"job-{i}.pptx"] = path
+
+    data = b"".join(stream_zip(files.items()))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == list(files)
+        for name, path in files.items():
+            assert archive.read(name) == path.read_bytes()
+
+def test_previews_are_content_addressed(tmp_path, monkeypatch):
+    """Test identical previews share a file served with immutable caching"""
+    monkeypatch.setattr(StorageManager, "BASE_PATH", tmp_path)
+    first = StorageManager.save_preview("j1", b"png-a")
+    again = StorageManager.save_preview("j1", b"png-a")
+    other = StorageManager.save_preview("j1", b"png-b")
+
+    assert first == again == hashlib.sha256(b"png-a").hexdigest()
+    assert first != other
+    assert len(list((tmp_path / "jobs" / "j1" / "previews").iterdir())) == 2
+
+    app = FastAPI()
+
+    @app.get("/preview")
+    async def get_preview(request: Request):
+        return immutable_file(request, StorageManager.get_preview_path("j1", first), first, "image/png")
+
+    client = TestClient(app)
+    response = client.get("/preview")
+    assert response.content == b"png-a"
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["etag"] == f'"{first}"'
+    assert client.get("/preview", headers={"If-None-Match": f'"{first}"'}).status_code == 304
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
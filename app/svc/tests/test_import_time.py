@@ -0,0 +1,56 @@
+"""Tests that the API module starts without loading parsing libraries"""
+import json
+import subprocess
+import pytest
+from pathlib import Path
+import sys
+
+SVC_DIR = Path(__file__).parent.parent
+
+# Modules only parse workers and job workers need
+HEAVY_MODULES = ["pdfplumber", "pdfminer", "pytesseract", "PIL", "pptx"]
+
+# Time to import app.main once the web framework is loaded; it was about
+# 0.35s while the parsers and executor were imported eagerly
+IMPORT_BUDGET_SECONDS = 0.2
+
+MEASURE = """
+import json, sys, time
+import fastapi, pydantic, starlette.responses
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+def import_app(cwd: Path) -> dict:
+    """Import app.main in a fresh interpreter and report time and modules"""
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE], cwd=cwd, capture_output=True, text=True,
+        env={"PYTHONPATH": str(SVC_DIR), "EMBEDDED_WORKERS": "0"}, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_heavy_modules_not_imported(tmp_path):
+    """Test importing the API does not load parsing or imaging libraries"""
+    modules = set(import_app(tmp_path)["modules"])
+
+    assert [m for m in HEAVY_MODULES if m in modules] == []
+
+def test_import_time_budget(tmp_path):
+    """Test the API module imports within budget (best of three runs)"""
+    elapsed = min(import_app(tmp_path)["elapsed"] for _ in range(3))
+
+    assert elapsed < IMPORT_BUDGET_SECONDS
+
+def test_lazy_attributes_resolve():
+    """Test lazily imported classes are still importable from their packages"""
+    sys.path.append(str(SVC_DIR))
+    from app.parsers import PDFParser, PPTXParser, TemplateParser
+    from app.transformers import TransformationExecutor
+
+    assert PDFParser.__name__ == "PDFParser"
+    assert TransformationExecutor.__module__ == "app.transformers.executor"
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
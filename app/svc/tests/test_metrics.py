@@ -0,0 +1,69 @@
+"""Tests for the Prometheus metrics registry"""
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils import metrics
+from app.utils.metrics import StageTimer, render_metrics
+
+def sample(name: str, **labels) -> float:
+    """Read a sample value from the metrics registry"""
+    return metrics.registry.get_sample_value(name, labels) or 0.0
+
+def test_stage_timer_observes_totals():
+    """Test stage times are summed across a loop and observed once per stage"""
+    before = sample("pptx_executor_stage_seconds_count", stage="recompose")
+    timer = StageTimer(metrics.EXECUTOR_STAGE_SECONDS)
+    for _ in range(3):
+        with timer.stage("recompose"):
+            pass
+
+    timer.observe()
+
+    assert sample("pptx_executor_stage_seconds_count", stage="recompose") == before + 1
+    assert timer.totals["recompose"] >= 0
+
+def test_render_metrics_includes_jobs_by_status(monkeypatch):
+    """Test exposition includes histograms and the jobs gauge"""
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_ROOT", raising=False)
+    metrics.PARSE_SECONDS.labels(parser="PDFParser").observe(0.3)
+
+    body, content_type = render_metrics(lambda: {"done": 2, "queued": 1})
+    text = body.decode()
+
+    assert content_type.startswith("text/plain")
+    assert 'pptx_parse_seconds_bucket{le="0.5",parser="PDFParser"}' in text
+    assert 'pptx_jobs{status="done"} 2.0' in text
+    assert 'pptx_jobs{status="queued"} 1.0' in text
+
+def test_service_directories_are_aggregated(tmp_path, monkeypatch):
+    """Test metrics written by services in separate directories under the root add up"""
+    import os
+    import subprocess
+    svc_dir = str(Path(__file__).parent.parent)
+    for service, pages in [("prod-host", 3), ("worker-host", 4)]:
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path / service)}
+        (tmp_path / service).mkdir()
+        subprocess.run(
+            [sys.executable, "-c",
+             f"from app.utils.metrics import PAGES_PARSED; PAGES_PARSED.labels(parser='PDFParser').inc({pages})"],
+            cwd=svc_dir, env=env, check=True
+        )
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_ROOT", str(tmp_path))
+
+    text = render_metrics()[0].decode()
+
+    assert 'pptx_pages_parsed_total{parser="PDFParser"} 7.0' in text
+
+def test_db_queries_are_timed(db):
+    """Test DBManager.execute records query latency"""
+    before = sample("pptx_db_query_seconds_count", operation="execute")
+
+    db.count_jobs_by_status()
+
+    assert sample("pptx_db_query_seconds_count", operation="execute") == before + 1
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,325 @@
+"""Tests for the SQLite database manager"""
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import models
+from app.models import DBManager
+
+def create_test_pages(count: int = 3):
+    """Create test page signatures"""
+    return [
+        {
+            "idx": i,
+            "signature": {
+                "title": i == 0,
+                "bullets": i,
+                "columns": 1,
+                "images": 0,
+                "table": False,
+                "coverage": {"image": 0.0, "text": 0.25}
+            },
+            "warnings": []
+        }
+        for i in range(count)
+    ]
+
+def test_find_template_by_hash(db):
+    """Test templates can be found by content hash"""
+    db.insert_template("t1", {"fonts": {}}, [{"layout_id": "layout_0"}], content_hash="abc")
+
+    found = db.find_template_by_hash("abc")
+    assert found["id"] == "t1"
+    assert found["layout_catalog"] == [{"layout_id": "layout_0"}]
+    assert db.find_template_by_hash("missing") is None
+
+def test_find_source_by_hash_prefers_template(db):
+    """Test source lookup prefers a source ingested for the same template"""
+    pages = create_test_pages()
+    db.insert_source("s1", "t1", "pdf", pages, content_hash="abc")
+    db.insert_source("s2", "t2", "pdf", pages, content_hash="abc")
+
+    assert db.find_source_by_hash("abc", "t2")["id"] == "s2"
+    assert db.find_source_by_hash("abc", "t1")["id"] == "s1"
+    assert db.find_source_by_hash("abc", "t3")["pages"] == pages
+    assert db.find_source_by_hash("missing", "t1") is None
+
+def test_templates_and_sources_are_cached(db):
+    """Test decoded records are served from the cache until deleted"""
+    db.insert_template("t1", {"fonts": {}}, [{"layout_id": "layout_0"}])
+    db.insert_source("s1", "t1", "pdf", create_test_pages(), content_hash="abc")
+
+    template = db.get_template("t1")
+    assert db.get_template("t1") is template
+    assert db.find_source_by_hash("abc") is db.get_source("s1")
+    assert len(db.source_cache) == 1
+
+    db.delete_template("t1")
+    db.delete_source("s1")
+    assert db.get_template("t1") is None
+    assert db.get_source("s1") is None
+
+def test_schema_upgrade_adds_columns(tmp_path, monkeypatch):
+    """Test databases created before content hashing gain the new columns"""
+    import sqlite3
+    db_path = tmp_path / "db.sqlite"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE templates (id TEXT PRIMARY KEY, created_at TIMESTAMP, theme_meta TEXT, layout_catalog TEXT)")
+    conn.execute("INSERT INTO templates (id, theme_meta, layout_catalog) VALUES ('old', '{}', '[]')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(models, "DB_PATH", db_path)
+    db = DBManager()
+
+    assert db.get_template("old")["layout_catalog"] == []
+    db.insert_template("new", {}, [], content_hash="abc")
+    assert db.find_template_by_hash("abc")["id"] == "new"
+
+def create_test_slides(count: int = 3):
+    """Create test plan slides"""
+    return [
+        {"idx": i, "chosen_layout_id": f"layout_{i}", "score": 0.5, "issues": ["no table"] if i else []}
+        for i in range(count)
+    ]
+
+def test_plan_slides_read_and_swap(db):
+    """Test plan slides are stored per row, readable by range and swapped singly"""
+    slides = create_test_slides(5)
+    db.insert_plan("p1", "t1", "s1", slides)
+
+    assert db.get_plan("p1")["slides"] == slides
+    assert db.get_plan_slides("p1", 1, 3) == slides[1:3]
+    assert db.get_plan_slides("p1", 4) == slides[4:]
+    assert db.count_plan_slides("p1") == 5
+    assert db.count_plan_slides("missing") is None
+
+    assert db.update_plan_slide("p1", 2, "layout_9", 0.75)
+    assert not db.update_plan_slide("p1", 5, "layout_9", 0.75)
+    swapped = db.get_plan_slides("p1", 2, 3)[0]
+    assert swapped["chosen_layout_id"] == "layout_9"
+    assert swapped["score"] == 0.75
+    assert swapped["issues"] == ["no table"]
+
+def test_schema_upgrade_moves_plan_slides(tmp_path, monkeypatch):
+    """Test plans stored as a JSON array are moved into plan_slides"""
+    import json
+    import sqlite3
+    db_path = tmp_path / "db.sqlite"
+    slides = create_test_slides(3)
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE plans (id TEXT PRIMARY KEY, template_id TEXT, source_id TEXT, created_at TIMESTAMP, slides TEXT)")
+    conn.execute("INSERT INTO plans (id, template_id, source_id, slides) VALUES ('old', 't1', 's1', ?)",
+                 (json.dumps(slides),))
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(models, "DB_PATH", db_path)
+    db = DBManager()
+
+    assert db.get_plan("old")["slides"] == slides
+    assert db.execute("SELECT slides FROM plans WHERE id = 'old'")[0][0] is None
+
+def test_schema_upgrade_encodes_source_pages(tmp_path, monkeypatch):
+    """Test sources stored as JSON text are re-encoded and read back unchanged"""
+    import json
+    import sqlite3
+    db_path = tmp_path / "db.sqlite"
+    pages = create_test_pages(3)
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE sources (id TEXT PRIMARY KEY, template_id TEXT, type TEXT, created_at TIMESTAMP, pages TEXT)")
+    conn.execute("INSERT INTO sources (id, template_id, type, pages) VALUES ('old', 't1', 'pdf', ?)",
+                 (json.dumps(pages),))
+    conn.execute("PRAGMA user_version = 4")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(models, "DB_PATH", db_path)
+    db = DBManager()
+
+    assert db.get_source("old")["pages"] == pages
+    assert db.execute("SELECT typeof(pages) FROM sources WHERE id = 'old'")[0][0] == "blob"
+
+def test_wal_and_schema_version(db):
+    """Test the database uses WAL and records its schema version"""
+    import sqlite3
+    conn = sqlite3.connect(str(models.DB_PATH))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == models.SCHEMA_VERSION
+    conn.close()
+
+def test_concurrent_startup_and_writes(data_dir):
+    """Test many workers can migrate and write at once without lock errors"""
+    import threading
+    errors = []
+
+    def worker(n):
+        try:
+            db = DBManager()
+            for i in range(20):
+                db.insert_job(f"j{n}-{i}", "p1")
+                db.get_job(f"j{n}-{i}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert DBManager().count_jobs_by_status() == {"queued": 160}
+
+def test_connections_persist_per_thread(db):
+    """Test each thread reuses one tuned connection"""
+    import threading
+    conn = models.thread_connection()
+    assert models.thread_connection() is conn
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(models.thread_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+def test_nested_transaction_rolls_back_together(db):
+    """Test statements in nested transactions commit or roll back as one"""
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.insert_job("j1", "p1")
+            db.execute("UPDATE jobs SET status = 'running' WHERE id = 'j1'")
+            raise RuntimeError("abort")
+
+    assert db.get_job("j1") is None
+    assert not models.thread_connection().in_transaction
+
+def test_forked_child_opens_own_connection(db):
+    """Test a forked process does not reuse its parent's connection"""
+    import os
+    parent = models.thread_connection()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ok = models.thread_connection() is not parent and db.count_jobs_by_status() == {}
+        os.write(write, b"1" if ok else b"0")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b"1"
+
+def test_list_jobs_keyset_pages(db):
+    """Test listings walk every row once, newest first, using the indexes"""
+    for i in range(7):
+        db.insert_job(f"j{i}", "p1")
+    db.execute("UPDATE jobs SET status = 'done' WHERE id IN ('j1', 'j4', 'j5')")
+
+    seen, after = [], None
+    while True:
+        items, after = db.list_jobs(after=after, limit=3)
+        seen.extend(item["id"] for item in items)
+        if after is None:
+            break
+    assert sorted(seen) == [f"j{i}" for i in range(7)]
+    assert len(seen) == 7
+
+    items, after = db.list_jobs(status="done", limit=2)
+    rest, end = db.list_jobs(status="done", after=after, limit=2)
+    assert [item["id"] for item in items + rest] == ["j5", "j4", "j1"]
+    assert end is None
+    assert "report" not in items[0]
+
+    plan = db.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM jobs WHERE status = ? AND (created_at, id) < (?, ?) "
+        "ORDER BY created_at DESC, id DESC LIMIT 3", ("done", "z", "z")
+    )
+    assert "idx_jobs_status" in plan[0]["detail"]
+
+def test_claim_job_in_order(db):
+    """Test jobs are leased oldest first and only once"""
+    db.insert_job("j1", "p1")
+    db.insert_job("j2", "p1")
+
+    first = db.claim_job("w1", lease_seconds=60, max_attempts=3)
+    second = db.claim_job("w2", lease_seconds=60, max_attempts=3)
+
+    assert first["id"] == "j1"
+    assert second["id"] == "j2"
+    assert db.claim_job("w3", lease_seconds=60, max_attempts=3) is None
+    assert db.get_job("j1")["status"] == "running"
+
+def test_expired_lease_is_retried(db):
+    """Test a job whose worker stopped heartbeating is claimed again"""
+    db.insert_job("j1", "p1")
+    db.claim_job("w1", lease_seconds=-1, max_attempts=2)
+
+    retried = db.claim_job("w2", lease_seconds=60, max_attempts=2)
+    assert retried["id"] == "j1"
+    assert retried["attempts"] == 2
+
+    # The original worker lost its lease and can no longer record results
+    assert not db.heartbeat_job("j1", "w1", 60)
+    assert not db.complete_job("j1", "w1", "/url", [], {})
+    assert db.heartbeat_job("j1", "w2", 60)
+    assert db.complete_job("j1", "w2", "/url", [], {"greens": 1})
+    assert db.get_job("j1")["status"] == "done"
+
+def test_expired_lease_gives_up_after_max_attempts(db):
+    """Test a job is marked as an error once its attempts are used up"""
+    db.insert_job("j1", "p1")
+    db.claim_job("w1", lease_seconds=-1, max_attempts=1)
+
+    assert db.claim_job("w2", lease_seconds=60, max_attempts=1) is None
+    job = db.get_job("j1")
+    assert job["status"] == "error"
+    assert "lease expired" in job["error"]
+
+def test_fail_job_and_queue_stats(db):
+    """Test failed jobs are recorded and queue stats count statuses"""
+    db.insert_job("j1", "p1")
+    db.insert_job("j2", "p1")
+    db.claim_job("w1", lease_seconds=60, max_attempts=3)
+    db.fail_job("j1", "w1", "boom", retry=False)
+
+    job = db.get_job("j1")
+    assert job["status"] == "error"
+    assert job["error"] == "boom"
+
+    stats = db.queue_stats()
+    assert stats["depth"] == 1
+    assert stats["by_status"] == {"error": 1, "queued": 1}
+    assert db.count_queued_jobs() == 1
+    plan = db.execute("EXPLAIN QUERY PLAN SELECT COUNT(*) FROM jobs WHERE status = 'queued'")
+    assert "USING COVERING INDEX" in plan[0]["detail"]
+    assert stats["started_in_window"] == 1
+    assert stats["oldest_wait_seconds"] >= 0
+
+def test_complete_job_records_artifact_digest(db):
+    """Test output hash and size are stored on completion"""
+    db.insert_job("j1", "p1")
+    db.claim_job("w1", lease_seconds=60, max_attempts=3)
+    db.complete_job("j1", "w1", "/jobs/j1/download", [], {}, "abc", 42)
+
+    job = db.get_job("j1")
+    assert job["artifact_sha256"] == "abc"
+    assert job["artifact_size"] == 42
+    assert [j["id"] for j in db.get_jobs(["missing", "j1"])] == ["j1"]
+
+def test_job_events_follow_transitions(db):
+    """Test job state transitions are recorded as ordered events"""
+    db.insert_job("j1", "p1")
+    db.claim_job("w1", lease_seconds=60, max_attempts=3)
+    db.add_job_event("j1", "progress", {"completed": 1, "total": 2})
+    db.complete_job("j1", "w1", "/jobs/j1/download", [], {"greens": 2})
+
+    events = db.get_job_events("j1")
+    assert [e["event"] for e in events] == ["queued", "running", "progress", "done"]
+    assert events[-1]["data"]["artifact_url"] == "/jobs/j1/download"
+
+    after = db.get_job_events("j1", after_id=events[1]["id"])
+    assert [e["event"] for e in after] == ["progress", "done"]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
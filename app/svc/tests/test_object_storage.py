@@ -0,0 +1,245 @@
+"""Tests for storage backends, using an in-memory S3 stand-in and a stubbed boto3 client"""
+import io
+import os
+import time
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils import StorageManager
+from app.utils.object_storage import LocalStorage, S3Storage
+
+class FakeS3Error(Exception):
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+class FakeS3:
+    """The subset of the boto3 S3 client the backend uses, kept in memory"""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.calls = []
+
+    def put_object(self, Bucket, Key, Body):
+        self.calls.append("put_object")
+        self.objects[Key] = bytes(Body)
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise FakeS3Error("NoSuchKey")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise FakeS3Error("404")
+        return {"ContentLength": len(self.objects[Key])}
+
+    def copy_object(self, Bucket, Key, CopySource):
+        self.objects[Key] = self.objects[CopySource["Key"]]
+
+    def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+        # Pages of two keys; the token is the last key listed, like S3's
+        keys = sorted(k for k in self.objects if k.startswith(Prefix) and k > (ContinuationToken or ""))
+        page = keys[:2]
+        truncated = len(keys) > 2
+        return {"Contents": [{"Key": k} for k in page], "IsTruncated": truncated,
+                "NextContinuationToken": page[-1] if truncated else None}
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.objects.pop(item["Key"], None)
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.uploads["u1"] = {}
+        return {"UploadId": "u1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.calls.append("upload_part")
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    """StorageManager on an S3 stand-in, with tmp_path as the local cache"""
+    client = FakeS3()
+    monkeypatch.setattr(StorageManager, "BASE_PATH", tmp_path)
+    monkeypatch.setattr(StorageManager, "backend", S3Storage("bucket", "prefix", client=client, part_size=10))
+    return client
+
+def store_source(content: bytes, source_id: str) -> Path:
+    """Store a PDF source the way ingest does: spool, then commit"""
+    spool = StorageManager.new_spool_path("sources")
+    spool.write_bytes(content)
+    return StorageManager.commit_source(spool, source_id, "pdf")
+
+def test_local_backend_keeps_files_in_place(tmp_path, monkeypatch):
+    """Test the local backend stores files under BASE_PATH only"""
+    monkeypatch.setattr(StorageManager, "BASE_PATH", tmp_path)
+    monkeypatch.setattr(StorageManager, "backend", LocalStorage())
+
+    store_source(b"pdf", "s1")
+
+    assert StorageManager.get_source_path("s1") == tmp_path / "sources" / "s1" / "source.pdf"
+    assert StorageManager.download_url(StorageManager.get_job_output_path("j1")) is None
+    StorageManager.delete_source("s1")
+    assert StorageManager.get_source_path("s1") is None
+
+def test_files_are_uploaded_and_fetched_back(s3, tmp_path):
+    """Test stored files reach the bucket and are fetched when not cached locally"""
+    spool = StorageManager.new_spool_path("templates")
+    spool.write_bytes(b"small")
+    StorageManager.commit_template(spool, "t1")
+    StorageManager.save_plan("p1", {"plan_id": "p1"})
+
+    assert s3.objects["prefix/templates/t1/template.pptx"] == b"small"
+    (tmp_path / "templates" / "t1" / "template.pptx").unlink()
+    (tmp_path / "plans" / "p1.json").unlink()
+
+    assert StorageManager.template_exists("t1")
+    assert StorageManager.get_template_path("t1").read_bytes() == b"small"
+    assert StorageManager.get_plan("p1") == {"plan_id": "p1"}
+    assert StorageManager.get_template_path("missing") is None
+
+def test_large_files_use_multipart_upload(s3):
+    """Test files over one part are uploaded in parts and reassembled"""
+    content = bytes(range(256)) * 2
+    store_source(content, "s1")
+
+    assert s3.calls.count("upload_part") == 52
+    assert "put_object" not in s3.calls
+    assert s3.objects["prefix/sources/s1/source.pdf"] == content
+    assert s3.uploads == {}
+
+def test_link_copy_delete_and_presigned_url(s3, tmp_path):
+    """Test linked sources are copied in the bucket and deletes remove every object"""
+    store_source(b"abc", "s1")
+    (tmp_path / "sources" / "s1" / "source.pdf").unlink()
+
+    assert StorageManager.link_source("s1", "s2", "pdf")
+    assert s3.objects["prefix/sources/s2/source.pdf"] == b"abc"
+    assert StorageManager.link_source("missing", "s3", "pdf") is None
+
+    for n in range(5):
+        StorageManager.save_preview("j1", bytes([n]))
+    StorageManager.delete_job("j1")
+    assert not [key for key in s3.objects if key.startswith("prefix/jobs/")]
+
+    url = StorageManager.download_url(StorageManager.get_job_output_path("j2"), "out.pptx")
+    assert url.startswith("https://s3.test/bucket/prefix/jobs/j2/output.pptx")
+
+def test_cache_trimmed_least_recently_used_first(s3, tmp_path):
+    """Test trimming drops the least recently used local copies, keeping recent writes"""
+    for n in range(3):
+        store_source(b"x" * 8, f"s{n}")
+        old = time.time() - 3600 + n
+        os.utime(tmp_path / "sources" / f"s{n}" / "source.pdf", (old, old))
+    store_source(b"x" * 8, "new")
+    StorageManager.backend.cache_bytes = 16
+    StorageManager.get_source_path("s0")
+
+    StorageManager.backend.trim_cache(tmp_path)
+
+    cached = sorted(p.parent.name for p in (tmp_path / "sources").glob("*/source.pdf"))
+    assert cached == ["new", "s0"]
+    assert StorageManager.get_source_path("s1").read_bytes() == b"x" * 8
+
+def test_s3_backend_requires_boto3(monkeypatch):
+    """Test creating the S3 backend without boto3 fails with a clear error"""
+    monkeypatch.setitem(sys.modules, "boto3", None)
+
+    with pytest.raises(RuntimeError, match="requires boto3"):
+        S3Storage("bucket")
+
+@pytest.fixture
+def stubber(tmp_path, monkeypatch):
+    """StorageManager on a real boto3 client whose responses are stubbed
+
+    The stubber checks each call's parameters against the S3 API model, so
+    this catches argument shapes the in-memory stand-in would accept.
+    """
+    boto3 = pytest.importorskip("boto3")
+    from botocore.stub import Stubber
+    client = boto3.client("s3", region_name="us-east-1",
+                          aws_access_key_id="test", aws_secret_access_key="test")
+    monkeypatch.setattr(StorageManager, "BASE_PATH", tmp_path)
+    monkeypatch.setattr(StorageManager, "backend", S3Storage("bucket", "prefix", client=client, part_size=5 * 1024 * 1024))
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+def test_boto3_uploads(stubber):
+    """Test single and multipart uploads with the real client's parameters"""
+    stubber.add_response("put_object", {}, {
+        "Bucket": "bucket", "Key": "prefix/sources/s1/source.pdf", "Body": b"small"
+    })
+    store_source(b"small", "s1")
+
+    part = b"x" * (5 * 1024 * 1024)
+    key = "prefix/sources/s2/source.pdf"
+    stubber.add_response("create_multipart_upload", {"UploadId": "u1"}, {"Bucket": "bucket", "Key": key})
+    for number, body in [(1, part), (2, b"tail")]:
+        stubber.add_response("upload_part", {"ETag": f'"{number}"'}, {
+            "Bucket": "bucket", "Key": key, "UploadId": "u1", "PartNumber": number, "Body": body
+        })
+    stubber.add_response("complete_multipart_upload", {}, {
+        "Bucket": "bucket", "Key": key, "UploadId": "u1",
+        "MultipartUpload": {"Parts": [{"PartNumber": 1, "ETag": '"1"'}, {"PartNumber": 2, "ETag": '"2"'}]}
+    })
+    store_source(part + b"tail", "s2")
+
+def test_boto3_fetch_exists_copy_and_delete(stubber, tmp_path):
+    """Test reads, copies and prefix deletes with the real client's parameters"""
+    from botocore.response import StreamingBody
+    key = "prefix/templates/t1/template.pptx"
+    stubber.add_response("get_object", {"Body": StreamingBody(io.BytesIO(b"pptx"), 4)},
+                         {"Bucket": "bucket", "Key": key})
+    assert StorageManager.get_template_path("t1").read_bytes() == b"pptx"
+
+    stubber.add_client_error("head_object", service_error_code="404", http_status_code=404,
+                             expected_params={"Bucket": "bucket", "Key": "prefix/templates/t2/template.pptx"})
+    assert not StorageManager.template_exists("t2")
+
+    (tmp_path / "sources" / "s1").mkdir(parents=True)
+    stubber.add_response("head_object", {"ContentLength": 3},
+                         {"Bucket": "bucket", "Key": "prefix/sources/s1/source.pdf"})
+    stubber.add_response("copy_object", {}, {
+        "Bucket": "bucket", "Key": "prefix/sources/s2/source.pdf",
+        "CopySource": {"Bucket": "bucket", "Key": "prefix/sources/s1/source.pdf"}
+    })
+    assert StorageManager.link_source("s1", "s2", "pdf")
+
+    stubber.add_response("list_objects_v2", {
+        "Contents": [{"Key": "prefix/jobs/j1/output.pptx"}], "IsTruncated": True, "NextContinuationToken": "t"
+    }, {"Bucket": "bucket", "Prefix": "prefix/jobs/j1/"})
+    stubber.add_response("delete_objects", {}, {
+        "Bucket": "bucket", "Delete": {"Objects": [{"Key": "prefix/jobs/j1/output.pptx"}], "Quiet": True}
+    })
+    stubber.add_response("list_objects_v2", {"IsTruncated": False},
+                         {"Bucket": "bucket", "Prefix": "prefix/jobs/j1/", "ContinuationToken": "t"})
+    stubber.add_response("list_objects_v2", {"IsTruncated": False},
+                         {"Bucket": "bucket", "Prefix": "prefix/profiles/j1/"})
+    StorageManager.delete_job("j1")
+
+def test_boto3_presigned_url(stubber):
+    """Test presigned download URLs carry the download name and type"""
+    url = StorageManager.download_url(StorageManager.get_job_output_path("j1"), "out.pptx", "application/zip")
+
+    assert url.startswith("https://bucket.s3.amazonaws.com/prefix/jobs/j1/output.pptx?")
+    assert "response-content-disposition=attachment" in url
+    assert "response-content-type=application%2Fzip" in url
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,74 @@
+"""Tests for the compact page signature encoding"""
+import json
+import time
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils.page_codec import FORMAT_JSON, FORMAT_RECORDS, decode_pages, encode_pages
+
+def make_pages(count: int):
+    """Page signatures shaped like the parsers' output"""
+    return [
+        {
+            "idx": i,
+            "signature": {
+                "title": i % 3 == 0,
+                "bullets": i % 7,
+                "columns": 1 + i % 2,
+                "images": i % 4,
+                "table": i % 5 == 0,
+                "coverage": {"image": (i % 11) / 13.0, "text": min(1.0, i / 997.0)}
+            },
+            "warnings": ["Page might be scanned image (OCR not enabled)"] if i % 50 == 0 else []
+        }
+        for i in range(count)
+    ]
+
+def test_round_trip_is_exact():
+    """Test decoded pages equal the encoded ones, types included"""
+    pages = make_pages(200)
+    encoded = encode_pages(pages)
+
+    assert encoded[2] == FORMAT_RECORDS
+    decoded = decode_pages(encoded)
+    assert decoded == pages
+    assert json.dumps(decoded) == json.dumps(pages)
+    assert decode_pages(encode_pages([])) == []
+
+def test_unexpected_pages_fall_back_to_json():
+    """Test pages that do not fit a fixed record are still stored losslessly"""
+    pages = make_pages(3)
+    pages[1]["signature"]["coverage"]["text"] = 1
+    pages[2]["extra"] = {"ocr": True}
+
+    encoded = encode_pages(pages)
+
+    assert encoded[2] == FORMAT_JSON
+    assert decode_pages(encoded) == pages
+
+def test_legacy_json_text_is_decoded():
+    """Test rows written as JSON text before the encoding still decode"""
+    pages = make_pages(3)
+    assert decode_pages(json.dumps(pages)) == pages
+
+def test_smaller_and_faster_than_json():
+    """Test a 1000-page source encodes several times smaller and decodes faster"""
+    pages = make_pages(1000)
+    text = json.dumps(pages)
+    encoded = encode_pages(pages)
+
+    def best_of(fn):
+        times = []
+        for _ in range(5):
+            started = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - started)
+        return min(times)
+
+    assert len(encoded) * 4 < len(text)
+    assert best_of(lambda: decode_pages(encoded)) < best_of(lambda: json.loads(text))
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,61 @@
+"""Tests for the parse process pool"""
+import asyncio
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.parsers import ParsePool, parse_template
+from pptx import Presentation
+
+def create_test_template(path: Path) -> Path:
+    """Create a test template PPTX"""
+    prs = Presentation()
+    prs.save(str(path))
+    return path
+
+def test_parse_in_pool(tmp_path):
+    """Test parsing runs in a worker process and records stats"""
+    test_path = create_test_template(tmp_path / "template.pptx")
+    pool = ParsePool(max_workers=2, max_concurrency=2)
+
+    async def run_parses():
+        return await asyncio.gather(
+            pool.run(parse_template, str(test_path)),
+            pool.run(parse_template, str(test_path)),
+            pool.run(parse_template, str(test_path))
+        )
+
+    try:
+        results = asyncio.run(run_parses())
+    finally:
+        pool.shutdown()
+
+    assert len(results) == 3
+    assert all(len(r["layout_catalog"]) > 0 for r in results)
+    assert len({r["template_id"] for r in results}) == 3
+
+    stats = pool.stats()
+    assert stats["submitted"] == 3
+    assert stats["completed"] == 3
+    assert stats["failed"] == 0
+    assert stats["waiting"] == 0
+    assert stats["running"] == 0
+    assert stats["run_seconds_max"] > 0
+
+def test_parse_failure_counted(tmp_path):
+    """Test parser errors propagate and are counted as failures"""
+    pool = ParsePool(max_workers=1, max_concurrency=1)
+
+    try:
+        with pytest.raises(Exception):
+            asyncio.run(pool.run(parse_template, str(tmp_path / "missing.pptx")))
+    finally:
+        pool.shutdown()
+
+    stats = pool.stats()
+    assert stats["failed"] == 1
+    assert stats["completed"] == 0
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
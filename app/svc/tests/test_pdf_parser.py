@@ -0,0 +1,87 @@
+"""Tests for PDF signature extraction"""
+import io
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+import pdfplumber.page
+from PIL import Image
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from app.parsers import PDFParser
+
+def create_test_pdf(path: Path, pages: int) -> Path:
+    """Create a PDF cycling through text, image and ruled-table pages"""
+    c = canvas.Canvas(str(path), pagesize=letter)
+    width, height = letter
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 30), (200, 30, 30)).save(buf, "PNG")
+    image = ImageReader(io.BytesIO(buf.getvalue()))
+    for n in range(pages):
+        c.setFont("Helvetica-Bold", 28)
+        c.drawString(50, height - 60, f"Slide {n}")
+        c.setFont("Helvetica", 12)
+        if n % 3 == 0:
+            for i in range(4):
+                c.drawString(70, height - 120 - 22 * i, f"• Point {i}")
+        elif n % 3 == 1:
+            c.drawImage(image, 50, height - 400, 200, 150)
+            c.drawImage(image, 300, height - 400, 120, 90)
+        else:
+            for row in range(5):
+                c.line(50, height - 120 - 25 * row, 450, height - 120 - 25 * row)
+            for col in range(5):
+                c.line(50 + 100 * col, height - 120, 50 + 100 * col, height - 220)
+        c.showPage()
+    c.save()
+    return path
+
+def test_pdf_signatures(tmp_path):
+    """Test images, image coverage and tables are detected per page"""
+    path = create_test_pdf(tmp_path / "source.pdf", 3)
+
+    pages = PDFParser(path, "template_123").parse()["pages"]
+
+    assert [page["idx"] for page in pages] == [0, 1, 2]
+    assert pages[1]["signature"]["images"] == 2
+    assert pages[1]["signature"]["coverage"]["image"] == (200 * 150 + 120 * 90) / (612 * 792)
+    assert [page["signature"]["table"] for page in pages] == [False, False, True]
+    assert all(page["warnings"] == ["pdf_reliability_medium"] for page in pages)
+
+def test_each_page_laid_out_once(tmp_path, monkeypatch):
+    """Test pages are interpreted once each, not once more per page for layout analysis"""
+    path = create_test_pdf(tmp_path / "source.pdf", 12)
+    processed = []
+    process_page = pdfplumber.page.PDFPageInterpreter.process_page
+    monkeypatch.setattr(pdfplumber.page.PDFPageInterpreter, "process_page",
+                        lambda self, page: (processed.append(page), process_page(self, page))[1])
+
+    pages = PDFParser(path.read_bytes(), "template_123").parse()["pages"]
+
+    assert len(pages) == 12
+    assert len(processed) == 12
+
+def test_parallel_parse_matches_sequential(tmp_path):
+    """Test page ranges parsed by pool workers merge into the sequential result"""
+    import asyncio
+    import json
+    from app.parsers import ParsePool
+    path = create_test_pdf(tmp_path / "source.pdf", 10)
+    sequential = PDFParser(path, "template_123").parse()["pages"]
+    pool = ParsePool(max_workers=2, max_concurrency=2, pdf_workers=2, pdf_chunk_pages=3)
+
+    try:
+        result = asyncio.run(pool.run_source(str(path), "template_123", "pdf"))
+    finally:
+        pool.shutdown()
+
+    assert json.dumps(result["pages"]) == json.dumps(sequential)
+    assert result["type"] == "pdf"
+    # The page count, then ranges 0-3, 3-6, 6-9 and 9-10
+    assert pool.stats()["completed"] == 5
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,56 @@
+"""Tests for the write-behind plan export"""
+import time
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.plan_export import PlanExporter
+from app.utils import StorageManager
+
+SLIDES = [{"idx": i, "chosen_layout_id": "layout_0", "score": 1.0, "issues": []} for i in range(3)]
+
+@pytest.fixture
+def db(db):
+    """Database with one plan"""
+    db.insert_plan("p1", "t1", "s1", SLIDES)
+    return db
+
+def test_swaps_are_coalesced_into_one_export(db, monkeypatch):
+    """Test a burst of changes is exported once, with the latest state"""
+    writes = []
+    save_plan = StorageManager.save_plan
+    monkeypatch.setattr(StorageManager, "save_plan",
+                        lambda plan_id, plan: (writes.append(plan_id), save_plan(plan_id, plan)))
+    exporter = PlanExporter(db, delay=0.2)
+
+    exporter.schedule("p1")
+    for idx in range(3):
+        db.update_plan_slide("p1", idx, "layout_9", 0.75)
+        exporter.schedule("p1")
+    assert StorageManager.get_plan("p1") is None
+
+    deadline = time.monotonic() + 5
+    while not writes and time.monotonic() < deadline:
+        time.sleep(0.02)
+    time.sleep(0.3)
+    exporter.close()
+
+    assert writes == ["p1"]
+    assert StorageManager.get_plan("p1") == db.get_plan("p1")
+    assert {slide["chosen_layout_id"] for slide in StorageManager.get_plan("p1")["slides"]} == {"layout_9"}
+
+def test_close_exports_pending_plans(db):
+    """Test plans still waiting for their delay are exported on close"""
+    exporter = PlanExporter(db, delay=60)
+    exporter.schedule("p1")
+    exporter.schedule("missing")
+
+    exporter.close()
+
+    assert exporter.exported == 1
+    assert StorageManager.get_plan("p1")["slides"] == SLIDES
+    assert StorageManager.get_plan("missing") is None
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,48 @@
+"""Tests for the opt-in sampling profiler"""
+import time
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils import StorageManager
+from app.utils.profiling import get_profile_path, profiled, valid_profile_id
+
+def busy_wait(seconds: float):
+    """Spin so the profiler has something to sample"""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def test_profiled_writes_collapsed_stacks(tmp_path, monkeypatch):
+    """Test a profiled block saves stacks that include the profiled function"""
+    monkeypatch.setattr(StorageManager, "BASE_PATH", tmp_path)
+
+    with profiled("0123abcd", interval=0.001):
+        busy_wait(0.1)
+
+    lines = get_profile_path("0123abcd").read_text().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("busy_wait (test_profiling.py" in line for line in lines)
+    # Root frame first, innermost frame last
+    assert stack.index("test_profiled_writes_collapsed_stacks") < stack.index("busy_wait")
+
+def test_profiled_disabled_without_id(tmp_path, monkeypatch):
+    """Test nothing is written when profiling is not requested"""
+    monkeypatch.setattr(StorageManager, "BASE_PATH", tmp_path)
+
+    with profiled(None):
+        busy_wait(0.01)
+
+    assert not (tmp_path / "profiles").exists()
+
+def test_profile_ids_are_validated():
+    """Test profile IDs cannot escape the profiles directory"""
+    assert valid_profile_id("3f2b8c1e-0000-4000-8000-000000000000")
+    assert not valid_profile_id("../../etc")
+    assert not valid_profile_id("")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,140 @@
+"""Tests for retention of jobs, plans, sources and templates"""
+import os
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import models
+from app.models import DBManager
+from app.retention import RetentionSweeper
+from app.utils import StorageManager
+
+HOURS = {"jobs": 24, "plans": 24, "sources": 24, "templates": 24}
+
+def age(db, table: str, ids, days: int = 2):
+    """Backdate rows so they look `days` old"""
+    for id_ in ids:
+        db.execute(f"UPDATE {table} SET created_at = datetime('now', ?) WHERE id = ?", (f"-{days} days", id_))
+
+def create_chain(db, n: int):
+    """Template, source, plan and finished job with stored files, all expired"""
+    db.insert_template(f"t{n}", {}, [])
+    db.insert_source(f"s{n}", f"t{n}", "pdf", [])
+    db.insert_plan(f"p{n}", f"t{n}", f"s{n}", [{"chosen_layout_id": "layout_0", "score": 1.0}])
+    db.insert_job(f"j{n}", f"p{n}")
+    db.execute("UPDATE jobs SET status = 'done' WHERE id = ?", (f"j{n}",))
+    for kind, id_ in [("templates", f"t{n}"), ("sources", f"s{n}"), ("jobs", f"j{n}")]:
+        path = StorageManager.BASE_PATH / kind / id_ / "file"
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"x" * 1000)
+    StorageManager.save_plan(f"p{n}", {"plan_id": f"p{n}"})
+    for table, prefix in [("templates", "t"), ("sources", "s"), ("plans", "p"), ("jobs", "j")]:
+        age(db, table, [f"{prefix}{n}"])
+
+def test_sweep_deletes_expired_chain_and_files(db):
+    """Test a fully expired chain is deleted in one sweep, files included"""
+    for n in range(5):
+        create_chain(db, n)
+
+    deleted = RetentionSweeper(db, HOURS, batch=2, vacuum_pages=0).sweep()
+
+    assert deleted == {"jobs": 5, "plans": 5, "sources": 5, "templates": 5}
+    assert db.list_templates()[0] == []
+    assert db.execute("SELECT COUNT(*) FROM job_events")[0][0] == 0
+    assert db.execute("SELECT COUNT(*) FROM plan_slides")[0][0] == 0
+    assert list((StorageManager.BASE_PATH / "jobs").iterdir()) == []
+    assert list((StorageManager.BASE_PATH / "plans").iterdir()) == []
+    assert not (StorageManager.BASE_PATH / "templates" / "t0").exists()
+
+def test_sweep_keeps_referenced_and_recent_records(db):
+    """Test records still referenced or within their retention period are kept"""
+    create_chain(db, 0)
+    # A recent plan still uses the expired source and template
+    db.insert_plan("recent", "t0", "s0", [])
+    # A running job is never deleted, so its plan stays too
+    create_chain(db, 1)
+    db.execute("UPDATE jobs SET status = 'running' WHERE id = 'j1'")
+
+    deleted = RetentionSweeper(db, HOURS, vacuum_pages=0).sweep()
+
+    assert deleted == {"jobs": 1, "plans": 1, "sources": 0, "templates": 0}
+    assert db.get_plan("p0") is None
+    assert db.get_source("s0") is not None
+    assert db.get_template("t0") is not None
+    assert db.get_plan("p1") is not None
+    assert (StorageManager.BASE_PATH / "sources" / "s0" / "file").exists()
+
+def test_jobs_expire_by_finishing_time(db):
+    """Test a job that queued for long is kept until max age after it finished"""
+    import time
+    for n in range(3):
+        create_chain(db, n)
+    now = time.time()
+    # Created two days ago, but finished an hour ago: just downloadable
+    db.execute("UPDATE jobs SET finished_at = ? WHERE id = 'j0'", (now - 3600,))
+    # Finished two days ago
+    db.execute("UPDATE jobs SET finished_at = ? WHERE id = 'j1'", (now - 2 * 86400,))
+    # j2 has no finished_at, so its creation time counts
+
+    deleted = db.delete_expired_jobs(24, 10)
+
+    assert sorted(deleted) == ["j1", "j2"]
+    assert db.get_job("j0") is not None
+    plan = db.execute("EXPLAIN QUERY PLAN SELECT id FROM jobs WHERE status IN ('done', 'error') "
+                      "AND finished_at < 0 ORDER BY finished_at")
+    assert "idx_jobs_finished" in " ".join(row[-1] for row in plan)
+
+def test_sweep_by_another_manager_invalidates_cached_records(db):
+    """Test records swept through one manager are gone from another manager's cache"""
+    create_chain(db, 0)
+    assert db.get_source("s0") is not None
+    assert db.get_template("t0") is not None
+
+    deleted = RetentionSweeper(DBManager(), HOURS, vacuum_pages=0).sweep()
+
+    assert deleted["sources"] == 1 and deleted["templates"] == 1
+    assert db.get_source("s0") is None
+    assert db.get_template("t0") is None
+    assert len(db.source_cache) == 0
+
+def test_disabled_retention_and_vacuum(db):
+    """Test a zero retention period keeps records and vacuum returns free pages"""
+    create_chain(db, 0)
+    db.insert_sources([
+        {"source_id": f"big{i}", "template_id": None, "doc_type": "pdf", "pages": [{"text": os.urandom(2000).hex()}]}
+        for i in range(200)
+    ])
+    age(db, "sources", [f"big{i}" for i in range(200)])
+
+    deleted = RetentionSweeper(db, {**HOURS, "jobs": 0}, vacuum_pages=10000).sweep()
+
+    assert deleted["jobs"] == 0
+    assert deleted["sources"] == 200
+    assert deleted["vacuumed_pages"] > 100
+    assert db.execute("PRAGMA freelist_count")[0][0] == 0
+
+def test_older_database_not_vacuumed_until_converted(data_dir):
+    """Test sweeps never run a full VACUUM; the conversion is an explicit step"""
+    import sqlite3
+    conn = sqlite3.connect(str(models.DB_PATH))
+    conn.execute("CREATE TABLE legacy (x)")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+    db = DBManager()
+    db.insert_sources([
+        {"source_id": f"big{i}", "template_id": None, "doc_type": "pdf", "pages": [{"text": os.urandom(2000).hex()}]}
+        for i in range(50)
+    ])
+    db.execute("DELETE FROM sources")
+    free = db.execute("PRAGMA freelist_count")[0][0]
+
+    assert RetentionSweeper(db, HOURS, vacuum_pages=10000).sweep()["vacuumed_pages"] == 0
+    assert db.execute("PRAGMA freelist_count")[0][0] == free > 0
+
+    assert db.enable_incremental_vacuum()
+    assert db.incremental_vacuum_enabled()
+    assert not db.enable_incremental_vacuum()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
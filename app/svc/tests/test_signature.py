@@ -120,5 +120,17 @@ def test_bullet_detection():
     finally:
         test_path.unlink()
 
+def test_pptx_parse_from_bytes():
+    """Test parsing from in-memory bytes matches parsing from a path"""
+    test_path = create_test_source()
+    try:
+        from_path = PPTXParser(test_path, "template_123").parse()
+        from_bytes = PPTXParser(test_path.read_bytes(), "template_123").parse()
+        
+        assert from_bytes["pages"] == from_path["pages"]
+        
+    finally:
+        test_path.unlink()
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
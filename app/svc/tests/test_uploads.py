@@ -0,0 +1,142 @@
+"""Tests for streaming upload handling"""
+import hashlib
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from app.utils.uploads import SpooledUpload, UploadError, UploadReceiver, expand_archive
+
+def create_test_app(spool_dir: Path, max_size: int, max_files: int = 1):
+    """Create an app that spools uploads and reports what it received"""
+    app = FastAPI()
+    counter = iter(range(1000))
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        receiver = UploadReceiver(
+            request, lambda: spool_dir / f"{next(counter)}.part", max_size, max_files
+        )
+        try:
+            uploads = await receiver.receive()
+        except UploadError as e:
+            raise HTTPException(400, str(e))
+        return [
+            {
+                "filename": u.filename,
+                "size": u.size,
+                "sha256": u.sha256,
+                "on_disk": hashlib.sha256(u.path.read_bytes()).hexdigest()
+            }
+            for u in uploads
+        ]
+
+    return TestClient(app)
+
+def test_upload_streamed_and_hashed(tmp_path):
+    """Test upload is spooled to disk with matching size and hash"""
+    client = create_test_app(tmp_path, max_size=1024 * 1024)
+    content = bytes(range(256)) * 1000
+
+    response = client.post("/upload", files={"file": ("deck.pptx", content)})
+
+    assert response.status_code == 200
+    [upload] = response.json()
+    assert upload["filename"] == "deck.pptx"
+    assert upload["size"] == len(content)
+    assert upload["sha256"] == hashlib.sha256(content).hexdigest()
+    assert upload["on_disk"] == upload["sha256"]
+
+def test_oversize_upload_rejected(tmp_path):
+    """Test upload over the limit is rejected and its spool file removed"""
+    client = create_test_app(tmp_path, max_size=1000)
+
+    response = client.post("/upload", files={"file": ("deck.pptx", b"x" * 5000)})
+
+    assert response.status_code == 400
+    assert "too large" in response.json()["detail"]
+    assert list(tmp_path.iterdir()) == []
+
+def test_multiple_files(tmp_path):
+    """Test several file parts land in separate spool files"""
+    client = create_test_app(tmp_path, max_size=1024, max_files=3)
+
+    response = client.post("/upload", files=[
+        ("file", ("a.pdf", b"%PDF-a")),
+        ("file", ("b.pdf", b"%PDF-bb")),
+        ("other", ("ignored.txt", b"zzz")),
+    ])
+
+    assert response.status_code == 200
+    uploads = response.json()
+    assert [u["filename"] for u in uploads] == ["a.pdf", "b.pdf"]
+    assert [u["size"] for u in uploads] == [6, 7]
+    assert all(u["sha256"] == u["on_disk"] for u in uploads)
+
+def test_missing_file_field(tmp_path):
+    """Test request without a file part is rejected"""
+    client = create_test_app(tmp_path, max_size=1024)
+
+    response = client.post("/upload", data={"name": "value"}, files={"other": ("x", b"1")})
+
+    assert response.status_code == 400
+
+def create_spooled(path: Path, content: bytes) -> SpooledUpload:
+    """Create a spooled upload from bytes"""
+    path.write_bytes(content)
+    return SpooledUpload(path=path, filename=path.name, size=len(content),
+                         sha256=hashlib.sha256(content).hexdigest())
+
+def test_expand_zip_archive(tmp_path):
+    """Test documents are extracted from a zip and other members reported as skipped"""
+    import zipfile
+    archive = tmp_path / "bundle.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("decks/a.pdf", b"%PDF-a")
+        zf.writestr("__MACOSX/decks/._a.pdf", b"junk")
+        zf.writestr("notes.txt", b"skip")
+    counter = iter(range(100))
+
+    members, skipped = expand_archive(
+        create_spooled(archive, archive.read_bytes()),
+        lambda: tmp_path / f"{next(counter)}.part", max_size=1024, max_files=10
+    )
+
+    assert [m.filename for m in members] == ["a.pdf"]
+    assert members[0].path.read_bytes() == b"%PDF-a"
+    assert members[0].sha256 == hashlib.sha256(b"%PDF-a").hexdigest()
+    assert skipped == ["notes.txt"]
+
+def test_expand_archive_ignores_documents(tmp_path):
+    """Test a PPTX (itself a zip) or PDF is not treated as an archive"""
+    import zipfile
+    pptx = tmp_path / "deck.pptx"
+    with zipfile.ZipFile(pptx, "w") as zf:
+        zf.writestr("ppt/presentation.xml", b"<xml/>")
+    pdf = create_spooled(tmp_path / "doc.pdf", b"%PDF-1.4")
+
+    assert expand_archive(create_spooled(pptx, pptx.read_bytes()), None, 1024, 10) is None
+    assert expand_archive(pdf, None, 1024, 10) is None
+
+def test_expand_archive_enforces_limits(tmp_path):
+    """Test oversize members are rejected and partial output removed"""
+    import tarfile
+    import io
+    archive = tmp_path / "bundle.tar"
+    with tarfile.open(archive, "w") as tf:
+        for name, data in [("a.pdf", b"%PDF-ok"), ("b.pdf", b"%PDF-" + b"x" * 2000)]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    counter = iter(range(100))
+
+    with pytest.raises(UploadError):
+        expand_archive(create_spooled(archive, archive.read_bytes()),
+                       lambda: tmp_path / f"{next(counter)}.part", max_size=1024, max_files=10)
+    assert list(tmp_path.glob("*.part")) == []
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
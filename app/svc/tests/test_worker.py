@@ -0,0 +1,82 @@
+"""Tests for job workers running queued transformations"""
+import shutil
+import pytest
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.parsers import PPTXParser, TemplateParser
+from app.transformers import TransformationPlanner
+from app.utils import StorageManager
+from app.worker import JobWorker
+
+FIXTURES = Path(__file__).parent.parent / "data" / "fixtures"
+
+def create_plan(db) -> str:
+    """Store the fixture template and source, and plan the source onto the template"""
+    template = TemplateParser(FIXTURES / "templates" / "brand_simple.pptx").parse()
+    template_id = template["template_id"]
+    spool = StorageManager.new_spool_path("templates")
+    shutil.copyfile(FIXTURES / "templates" / "brand_simple.pptx", spool)
+    StorageManager.commit_template(spool, template_id)
+    db.insert_template(template_id, template["theme_meta"], template["layout_catalog"])
+
+    source = PPTXParser(FIXTURES / "sources" / "mini_5slide.pptx", template_id).parse()
+    spool = StorageManager.new_spool_path("sources")
+    shutil.copyfile(FIXTURES / "sources" / "mini_5slide.pptx", spool)
+    StorageManager.commit_source(spool, source["source_id"], "pptx")
+    db.insert_source(source["source_id"], template_id, "pptx", source["pages"])
+
+    plan = TransformationPlanner(db.get_template(template_id), db.get_source(source["source_id"])).create_plan()
+    db.insert_plan(plan["plan_id"], template_id, source["source_id"], plan["slides"])
+    return plan["plan_id"]
+
+def test_run_once_executes_job(db):
+    """Test a queued job is claimed, reports progress and completes with its output"""
+    db.insert_job("j1", create_plan(db))
+    worker = JobWorker(db, worker_id="w1", poll_interval=0.01)
+
+    assert worker.run_once() is True
+
+    job = db.get_job("j1")
+    assert job["status"] == "done"
+    assert db.execute("SELECT attempts FROM jobs WHERE id = 'j1'")[0][0] == 1
+    assert job["artifact_sha256"]
+    assert StorageManager.fetch_job_output("j1") is not None
+    events = [event["event"] for event in db.get_job_events("j1")]
+    assert events[:2] == ["queued", "running"]
+    assert "progress" in events
+    assert events[-1] == "done"
+    assert worker.run_once() is False
+
+def test_run_once_records_job_error(db):
+    """Test a job whose files are missing fails without being retried"""
+    plan_id = create_plan(db)
+    StorageManager.delete_source(db.get_plan(plan_id)["source_id"])
+    db.insert_job("j1", plan_id)
+    worker = JobWorker(db, worker_id="w1")
+
+    assert worker.run_once() is True
+
+    job = db.get_job("j1")
+    assert job["status"] == "error"
+    assert "Files not found" in job["error"]
+    assert [event["event"] for event in db.get_job_events("j1")][-1] == "error"
+    assert worker.run_once() is False
+
+def test_expired_lease_is_run_by_another_worker(db):
+    """Test a job whose worker died is claimed again once its lease expires"""
+    db.insert_job("j1", create_plan(db))
+    # A worker claims the job, then dies without renewing its lease
+    db.claim_job("dead", lease_seconds=-1, max_attempts=3)
+
+    assert JobWorker(db, worker_id="w2", max_attempts=3).run_once() is True
+
+    job = db.get_job("j1")
+    assert job["status"] == "done"
+    assert db.execute("SELECT attempts FROM jobs WHERE id = 'j1'")[0][0] == 2
+    # The dead worker's late result is discarded
+    assert not db.complete_job("j1", "dead", "late", [], {})
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])